@@ -0,0 +1,119 @@
+import argparse
+import json
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+DEFAULT_HOPS = 5
+DEFAULT_COUNT = 10
+
+# the 08042025 manual round, rows convert from, columns convert to
+MANUAL_ROUND_RATES = [
+    [1, 1.45, 0.52, 0.72],
+    [0.7, 1, 0.31, 0.48],
+    [1.95, 3.1, 1, 1.49],
+    [1.34, 1.98, 0.64, 1],
+]
+
+
+# products along a path become sums, a missing conversion (rate 0) is -inf and never chosen
+def log_rates(rates: Sequence[Sequence[float]]) -> np.ndarray:
+    rates = np.asarray(rates, dtype=np.float64)
+    if rates.ndim != 2 or rates.shape[0] != rates.shape[1]:
+        raise ValueError(f"rates must be a square matrix, got shape {rates.shape}")
+    if (rates < 0).any():
+        raise ValueError("rates must not be negative")
+    with np.errstate(divide="ignore"):
+        return np.log(rates)
+
+
+# best `count` walks of exactly `hops` conversions from start to end (back to start by default), best first.
+# walks may repeat currencies, a rate of 1 on the diagonal lets them stand still so shorter ones count too.
+# k-best dynamic programming in log space: the best walks into a currency after h hops always extend one
+# of the best `count` walks into some currency after h - 1, so only that many are kept per currency and hop,
+# O(hops * n^2 * count) instead of the n^hops of trying every path
+def top_paths(rates: Sequence[Sequence[float]], hops: int = DEFAULT_HOPS, start: int = 0, end: Optional[int] = None, count: int = DEFAULT_COUNT) -> list[tuple[tuple[int, ...], float]]:
+    weights = log_rates(rates)
+    size = len(weights)
+    end = start if end is None else end
+    if hops < 1 or count < 1:
+        raise ValueError("hops and count must be positive")
+    if not (0 <= start < size and 0 <= end < size):
+        raise ValueError(f"start and end must be currencies 0..{size - 1}")
+
+    # scores[rank, currency], log multiplier of the rank-th best walk into currency so far
+    scores = np.full((count, size), -np.inf)
+    scores[0] = weights[start]
+    # per hop, which (rank, currency) each kept walk came from
+    parents = []
+    for _ in range(hops - 1):
+        # every kept walk extended by every conversion, flattened to [(rank, from currency), to currency]
+        candidates = (scores[:, :, None] + weights[None, :, :]).reshape(count * size, size)
+        if count < len(candidates):
+            best = np.argpartition(-candidates, count - 1, axis=0)[:count]
+        else:
+            best = np.broadcast_to(np.arange(len(candidates))[:, None], candidates.shape)
+        chosen = np.take_along_axis(candidates, best, axis=0)
+        # argpartition leaves the kept walks unordered
+        order = np.argsort(-chosen, axis=0, kind="stable")
+        best = np.take_along_axis(best, order, axis=0)
+        scores = np.take_along_axis(chosen, order, axis=0)
+        if len(best) < count:
+            scores = np.vstack([scores, np.full((count - len(best), size), -np.inf)])
+            best = np.vstack([best, np.zeros((count - len(best), size), dtype=best.dtype)])
+        parents.append(best)
+
+    paths = []
+    for rank in np.argsort(-scores[:, end], kind="stable").tolist():
+        score = float(scores[rank, end])
+        if score == -np.inf:
+            break
+        path = [end]
+        currency = end
+        for best in reversed(parents):
+            rank, currency = divmod(int(best[rank, currency]), size)
+            path.append(currency)
+        path.append(start)
+        paths.append((tuple(reversed(path)), float(np.exp(score))))
+    return paths
+
+
+def format_path(path: Sequence[int], multiplier: float, names: Optional[Sequence[str]] = None) -> str:
+    labels = [str(currency + 1) if names is None else names[currency] for currency in path]
+    return f"{' '.join(labels)} | {multiplier}"
+
+
+def load_rates(path: str) -> tuple[list[list[float]], Optional[list[str]]]:
+    # either a bare matrix or {"currencies": [...], "rates": [[...], ...]}
+    with open(path) as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        return data["rates"], data.get("currencies")
+    return data, None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="best currency conversion cycles of a fixed number of hops")
+    parser.add_argument("rates", nargs="?", default=None, help="json rate matrix, the 08042025 manual round if omitted")
+    parser.add_argument("--hops", type=int, default=DEFAULT_HOPS, help="conversions per path")
+    parser.add_argument("--start", type=int, default=None, help="currency held at the start, 1 based, the last one by default")
+    parser.add_argument("--end", type=int, default=None, help="currency wanted at the end, 1 based, the start by default")
+    parser.add_argument("--top", type=int, default=DEFAULT_COUNT, help="paths to print")
+    args = parser.parse_args()
+
+    rates, names = load_rates(args.rates) if args.rates else (MANUAL_ROUND_RATES, None)
+    start = (len(rates) if args.start is None else args.start) - 1
+    end = None if args.end is None else args.end - 1
+
+    started = time.perf_counter()
+    paths = top_paths(rates, args.hops, start, end, args.top)
+    finished = time.perf_counter()
+
+    for path, multiplier in paths:
+        print(format_path(path, multiplier, names))
+    print(f"{len(rates)} currencies, {args.hops} hops in {(finished - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
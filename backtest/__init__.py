@@ -0,0 +1,2 @@
+from backtest.data import MarketData, read_log
+from backtest.engine import Backtester, BacktestResult, load_trader
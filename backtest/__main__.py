@@ -0,0 +1,30 @@
+import argparse
+import time
+
+from backtest.data import read_log
+from backtest.engine import MATCH_TRADES_MODES, Backtester, load_trader
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="replay a trader against a prosperity activity log")
+    parser.add_argument("log", help="submission log with activities and trade history")
+    parser.add_argument("--trader", default="trader.py")
+    parser.add_argument("--match-trades", default="all", choices=MATCH_TRADES_MODES)
+    parser.add_argument("--cache", default=None, metavar="DIR", help="keep parsed columns in DIR between runs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = read_log(args.log, cache_dir=args.cache)
+    loaded = time.perf_counter()
+
+    trader_module = load_trader(args.trader)
+    limits = {product: params["position_limit"] for product, params in trader_module.PRODUCT_PARAMS.items()}
+    result = Backtester(data, limits, match_trades=args.match_trades).run(trader_module.Trader())
+    finished = time.perf_counter()
+
+    print(result.summary())
+    print(f"{len(data)} ticks, {len(data.products)} products, parsed in {loaded - start:.2f}s, replayed in {finished - loaded:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
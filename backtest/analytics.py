@@ -0,0 +1,274 @@
+import argparse
+import time
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.data import SUBMISSION, read_log
+from backtest.engine import MATCH_TRADES_MODES, Backtester, load_trader
+from logdecoder import OWN, DecodedLogs, decode_cached, decode_lines, decode_log
+
+# ticks after a fill at which the mid is compared with the mid the order was sent into
+DEFAULT_HORIZONS = (1, 10, 100)
+# tag given to units settled through the foreign market, they have no order behind them
+CONVERSION_STEP = "conversion"
+UNTAGGED_STEP = "untagged"
+
+
+# the trader method behind an order, taking is buy_mm or sell_mm depending on the side
+def step_names(tags: np.ndarray, sides: np.ndarray) -> np.ndarray:
+    steps = tags.astype(object)
+    take = tags == "take"
+    steps[take] = np.where(sides[take] > 0, "buy_mm", "sell_mm")
+    steps[tags == "liquidate"] = "handle_liquidation"
+    steps[tags == ""] = UNTAGGED_STEP
+    return steps
+
+
+# average cost accounting over one product's fills in execution order, the only part that has to walk the fills.
+# returns the pnl each fill realized and the average entry price of what is still held
+def average_cost(quantities: np.ndarray, prices: np.ndarray) -> tuple[np.ndarray, float]:
+    realized = np.zeros(len(quantities))
+    position, cost = 0, 0.0
+    for i, (quantity, price) in enumerate(zip(quantities.tolist(), prices.tolist())):
+        if position * quantity < 0:
+            closed = min(abs(quantity), abs(position))
+            realized[i] = closed * (price - cost) * (1 if position > 0 else -1)
+            if abs(quantity) > abs(position):
+                cost = price
+        else:
+            cost = (cost * abs(position) + price * abs(quantity)) / (abs(position) + abs(quantity))
+        position += quantity
+        if position == 0:
+            cost = 0.0
+    return realized, cost
+
+
+class ExecutionAnalytics:
+
+    # where a day's pnl came from, per product and per strategy step, from the decoded trader logs.
+    # every own trade is matched back to the order that produced it, then everything is column maths and group-bys
+    def __init__(self, decoded: DecodedLogs, horizons: Sequence[int] = DEFAULT_HORIZONS):
+        self.decoded = decoded
+        self.horizons = tuple(horizons)
+        self.symbols = decoded.symbols
+        self.timestamps = decoded.ticks["timestamp"]
+
+        # mid of the book each tick's orders were sent into, a one sided book keeps the last one
+        best_bid, best_ask = decoded.best_prices()
+        self.mid = pd.DataFrame((best_bid + best_ask) / 2).ffill().to_numpy()
+
+        self.orders = self._orders()
+        self.fills = self._fills()
+        self.positions = self._positions()
+
+    def _symbol_names(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, categories=self.symbols)
+
+    def _orders(self) -> pd.DataFrame:
+        orders = self.decoded.orders
+        sides = np.sign(orders["quantity"])
+        tags = np.array(self.decoded.tags, dtype=object)[orders["tag"]] if len(orders) else np.empty(0, dtype=object)
+        return pd.DataFrame({
+            "tick": orders["tick"],
+            "symbol": orders["symbol"],
+            "side": sides,
+            "price": orders["price"].astype(np.float64),
+            "quantity": np.abs(orders["quantity"]),
+            "step": step_names(tags, sides),
+        })
+
+    # own trades at the tick whose orders they filled, which is the tick before the state that reports them
+    def _trades(self) -> pd.DataFrame:
+        trades = self.decoded.trades[self.decoded.trades["kind"] == OWN]
+        buyer = self.decoded.traders.index(SUBMISSION) if SUBMISSION in self.decoded.traders else -1
+        ticks = np.searchsorted(self.timestamps, trades["timestamp"]).clip(0, max(len(self.timestamps) - 1, 0))
+        return pd.DataFrame({
+            "tick": ticks.astype(np.int32),
+            "symbol": trades["symbol"],
+            "side": np.where(trades["buyer"] == buyer, 1, -1),
+            "price": trades["price"],
+            "quantity": trades["quantity"],
+        })
+
+    # conversions the trader asked for, at the all-in price the backtester settles them at
+    def _conversions(self) -> pd.DataFrame:
+        conversions = self.decoded.ticks["conversions"]
+        observations = self.decoded.conversion_observations
+        # the exchange only converts when exactly one product is quoted
+        quoted = np.bincount(observations["tick"], minlength=len(conversions))
+        observations = observations[(conversions[observations["tick"]] != 0) & (quoted[observations["tick"]] == 1)]
+        requested = conversions[observations["tick"]]
+        importing = requested > 0
+        prices = np.where(
+            importing,
+            observations["askPrice"] + observations["transportFees"] + observations["importTariff"],
+            observations["bidPrice"] - observations["transportFees"] - observations["exportTariff"],
+        )
+        return pd.DataFrame({
+            "tick": observations["tick"],
+            "symbol": observations["product"],
+            "side": np.where(importing, 1, -1),
+            "price": prices,
+            "quantity": np.abs(requested),
+            "step": CONVERSION_STEP,
+        })
+
+    def _fills(self) -> pd.DataFrame:
+        trades = self._trades()
+        trades["sequence"] = np.arange(len(trades))
+        orders = self.orders.assign(order=np.arange(len(self.orders)))[["tick", "symbol", "side", "price", "order", "step"]]
+
+        # a buy fills at or below its order's price and a sell at or above, so each fill goes to the tightest
+        # order of its tick, symbol and side that reaches its price. resting fills land on their own order exactly
+        matched = []
+        for side, direction in ((1, "forward"), (-1, "backward")):
+            side_trades = trades[trades["side"] == side].sort_values("price", kind="stable")
+            side_orders = orders[orders["side"] == side].sort_values("price", kind="stable")
+            matched.append(pd.merge_asof(
+                side_trades, side_orders.drop(columns="side"), on="price", by=["tick", "symbol"], direction=direction,
+            ))
+        fills = pd.concat(matched, ignore_index=True)
+        fills["order"] = fills["order"].fillna(-1).astype(np.int64)
+        fills["step"] = fills["step"].fillna(UNTAGGED_STEP)
+
+        # conversions settle before the tick's orders match
+        conversions = self._conversions()
+        conversions["sequence"] = -1
+        conversions["order"] = -1
+        fills = pd.concat([conversions, fills], ignore_index=True)
+        fills = fills.sort_values(["tick", "sequence"], kind="stable", ignore_index=True).drop(columns="sequence")
+
+        ticks, symbols = fills["tick"].to_numpy(), fills["symbol"].to_numpy()
+        side, price, quantity = fills["side"].to_numpy(), fills["price"].to_numpy(), fills["quantity"].to_numpy()
+        mid = self.mid[ticks, symbols]
+        fills["timestamp"] = self.timestamps[ticks]
+        fills["mid"] = mid
+        # positive when we bought under or sold over the mid
+        fills["spread_capture"] = side * (mid - price) * quantity
+        last = len(self.mid) - 1
+        for horizon in self.horizons:
+            later = self.mid[np.minimum(ticks + horizon, last), symbols]
+            # positive when the mid then moved against the fill, what the counterparty knew that we did not
+            fills[f"adverse_{horizon}"] = -side * (later - mid) * quantity
+            fills[f"markout_{horizon}"] = fills["spread_capture"] - fills[f"adverse_{horizon}"]
+
+        fills["realized"] = 0.0
+        signed = side * quantity
+        for code in np.unique(symbols):
+            rows = np.flatnonzero(symbols == code)
+            realized, _ = average_cost(signed[rows], price[rows])
+            fills.loc[rows, "realized"] = realized
+        return fills
+
+    # [tick, symbol] position once each tick's orders have filled
+    def _positions(self) -> np.ndarray:
+        changes = np.zeros(self.mid.shape, dtype=np.int64)
+        np.add.at(changes, (self.fills["tick"].to_numpy(), self.fills["symbol"].to_numpy()), (self.fills["side"] * self.fills["quantity"]).to_numpy())
+        return changes.cumsum(axis=0)
+
+    # one row per (symbol, step): how much of what it asked for filled, and what those fills were worth
+    def by_step(self) -> pd.DataFrame:
+        matched = self.fills[self.fills["order"] >= 0]
+        orders = self.orders.assign(
+            symbol=self._symbol_names(self.orders["symbol"].to_numpy()),
+            filled=np.bincount(matched["order"], weights=matched["quantity"], minlength=len(self.orders)),
+        )
+        orders["hit"] = orders["filled"] > 0
+        sent = orders.groupby(["symbol", "step"], observed=True).agg(
+            orders=("quantity", "size"),
+            ordered=("quantity", "sum"),
+            filled_orders=("hit", "sum"),
+        )
+
+        values = ["spread_capture", *(f"adverse_{horizon}" for horizon in self.horizons), *(f"markout_{horizon}" for horizon in self.horizons), "realized"]
+        fills = self.fills.assign(symbol=self._symbol_names(self.fills["symbol"].to_numpy()))
+        filled = fills.groupby(["symbol", "step"], observed=True).agg(
+            fills=("quantity", "size"),
+            filled=("quantity", "sum"),
+            **{value: (value, "sum") for value in values},
+        )
+
+        table = sent.join(filled, how="outer")
+        table[["orders", "ordered", "filled_orders", "fills", "filled"]] = table[["orders", "ordered", "filled_orders", "fills", "filled"]].fillna(0).astype(np.int64)
+        table[values] = table[values].fillna(0.0)
+        # volume filled over volume sent, and orders with any fill over orders sent
+        table["fill_ratio"] = table["filled"] / table["ordered"].where(table["ordered"] > 0)
+        table["hit_rate"] = table["filled_orders"] / table["orders"].where(table["orders"] > 0)
+        table["capture_per_unit"] = table["spread_capture"] / table["filled"].where(table["filled"] > 0)
+        return table
+
+    # one row per symbol. realized + unrealized and spread_capture - inventory_cost both add up to total
+    def by_product(self) -> pd.DataFrame:
+        fills = self.fills
+        signed = (fills["side"] * fills["quantity"]).to_numpy()
+        codes = np.arange(len(self.symbols))
+        cash = np.bincount(fills["symbol"], weights=-signed * fills["price"].to_numpy(), minlength=len(codes))
+        final_mid = self.mid[-1] if len(self.mid) else np.full(len(codes), np.nan)
+        position = self.positions[-1] if len(self.positions) else np.zeros(len(codes), dtype=np.int64)
+        total = cash + position * np.nan_to_num(final_mid)
+
+        entry = np.zeros(len(codes))
+        for code in np.unique(fills["symbol"]):
+            rows = np.flatnonzero(fills["symbol"].to_numpy() == code)
+            _, entry[code] = average_cost(signed[rows], fills["price"].to_numpy()[rows])
+
+        # held inventory marked through every mid move, what carrying it cost (a gain when negative)
+        moves = np.nan_to_num(np.diff(self.mid, axis=0))
+        inventory_cost = -(self.positions[:-1] * moves).sum(axis=0)
+
+        table = pd.DataFrame({
+            "fills": np.bincount(fills["symbol"], minlength=len(codes)),
+            "volume": np.bincount(fills["symbol"], weights=fills["quantity"], minlength=len(codes)).astype(np.int64),
+            "position": position,
+            "mean_abs_position": np.abs(self.positions).mean(axis=0) if len(self.positions) else 0.0,
+            "realized": np.bincount(fills["symbol"], weights=fills["realized"], minlength=len(codes)),
+            "unrealized": np.where(position != 0, position * (np.nan_to_num(final_mid) - entry), 0.0),
+            "spread_capture": np.bincount(fills["symbol"], weights=fills["spread_capture"], minlength=len(codes)),
+            "inventory_cost": inventory_cost,
+            "total": total,
+        }, index=pd.Index(self.symbols, name="symbol"))
+        return table[table["fills"] > 0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="pnl attribution and execution quality per product and strategy step")
+    parser.add_argument("log", help="submission log with the trader's logger output, or an activity log with --replay")
+    parser.add_argument("--replay", action="store_true", help="backtest --trader over the log first and analyse that run")
+    parser.add_argument("--trader", default="trader.py")
+    parser.add_argument("--match-trades", default="all", choices=MATCH_TRADES_MODES)
+    parser.add_argument("--horizons", default=",".join(str(horizon) for horizon in DEFAULT_HORIZONS), help="comma separated ticks after a fill")
+    parser.add_argument("--cache", default=None, metavar="DIR", help="keep parsed columns in DIR between runs")
+    parser.add_argument("--out", default=None, metavar="CSV", help="also write every fill here")
+    args = parser.parse_args()
+    horizons = [int(horizon) for horizon in args.horizons.split(",")]
+
+    if args.replay:
+        data = read_log(args.log, cache_dir=args.cache)
+        trader_module = load_trader(args.trader)
+        limits = {product: params["position_limit"] for product, params in trader_module.PRODUCT_PARAMS.items()}
+        result = Backtester(data, limits, match_trades=args.match_trades, capture_logs=True).run(trader_module.Trader())
+        decoded = decode_lines(result.logs)
+    elif args.cache:
+        decoded = decode_cached(args.log, args.cache)
+    else:
+        decoded = decode_log(args.log)
+
+    start = time.perf_counter()
+    analytics = ExecutionAnalytics(decoded, horizons)
+    products = analytics.by_product()
+    steps = analytics.by_step()
+    finished = time.perf_counter()
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(products.to_string(float_format=lambda value: f"{value:,.1f}"))
+        print()
+        print(steps.to_string(float_format=lambda value: f"{value:,.2f}"))
+    if args.out:
+        analytics.fills.assign(symbol=analytics._symbol_names(analytics.fills["symbol"].to_numpy())).to_csv(args.out, index=False)
+    print(f"{len(analytics.fills)} fills over {len(decoded)} ticks analysed in {finished - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import copy
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from backtest.data import MarketData, read_log
+from backtest.engine import Backtester, load_trader
+from backtest.synthetic import DEFAULT_DEPTH, SyntheticMarket, default_specs
+
+# 2: medians over passes and a timed_seconds field, older baselines are timed too loosely to compare against
+BENCH_VERSION = 2
+DEFAULT_TICKS = 2000
+# ticks replayed under tracemalloc, it slows everything down too much for the timing pass
+MEMORY_TICKS = 200
+# relative slowdown (or memory growth) over the baseline that counts as a regression
+DEFAULT_THRESHOLD = 0.2
+# timing differences smaller than this are noise whatever the ratio, matters for the cheap scenarios
+MIN_REGRESSION_US = 25
+# same for memory, a few kb come and go with the interpreter's own caches
+MIN_REGRESSION_KB = 16
+# timing passes per scenario, the median of each statistic is kept so one unlucky pass cannot move it
+DEFAULT_REPEAT = 7
+# passes continue until a scenario has been timed for at least this long, short scenarios get more of them.
+# compare only judges timings that reached it on both sides, below it a p99 is a handful of samples
+MIN_TIMED_SECONDS = 2.0
+# extra products are clones of this one, renamed
+TEMPLATE_PRODUCT = "CROISSANTS"
+PRODUCT_COUNTS = (1, 8, 50)
+
+
+def scenario_products(count: int, base_params: dict[str, dict]) -> dict[str, dict]:
+    # the real products first, then renamed copies of the template
+    names = list(base_params)
+    if count <= len(names):
+        return {name: copy.deepcopy(base_params[name]) for name in names[:count]}
+    params = {name: copy.deepcopy(params) for name, params in base_params.items()}
+    for i in range(count - len(names)):
+        params[f"BENCH_{i:03d}"] = copy.deepcopy(base_params[TEMPLATE_PRODUCT])
+    return params
+
+
+# generated books named after the scenario's products
+def synthetic_market(products: list[str], ticks: int, depth: int = DEFAULT_DEPTH, seed: int = 0) -> MarketData:
+    specs = default_specs(len(products), depth, seed)
+    for spec, product in zip(specs, products):
+        spec.name = product
+    return SyntheticMarket(specs, ticks, seed).to_market_data()
+
+
+def _timed(function: Callable, samples: list[float]) -> Callable:
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        value = function(*args, **kwargs)
+        samples.append(time.perf_counter() - started)
+        return value
+    return timed
+
+
+def _latency(samples: list[float]) -> dict[str, float]:
+    micros = np.asarray(samples) * 1e6
+    return {
+        "mean_us": float(micros.mean()),
+        "p50_us": float(np.percentile(micros, 50)),
+        "p99_us": float(np.percentile(micros, 99)),
+        "max_us": float(micros.max()),
+    }
+
+
+def _load(trader_path: str, params: dict[str, dict]) -> Any:
+    module = load_trader(trader_path, module_name="bench_trader")
+    module.PRODUCT_PARAMS.clear()
+    module.PRODUCT_PARAMS.update(params)
+    return module
+
+
+# one scenario: fresh copies of the trader replayed over the whole stream
+def run_scenario(trader_path: str, params: dict[str, dict], data: MarketData, repeat: int = DEFAULT_REPEAT, min_seconds: float = MIN_TIMED_SECONDS) -> dict[str, Any]:
+    limits = {product: product_params["position_limit"] for product, product_params in params.items()}
+
+    passes = []
+    timed_seconds = 0.0
+    while len(passes) < repeat or timed_seconds < min_seconds:
+        module = _load(trader_path, params)
+        run_samples: list[float] = []
+        flush_samples: list[float] = []
+        trader = module.Trader()
+        trader.run = _timed(trader.run, run_samples)
+        module.logger.flush = _timed(module.logger.flush, flush_samples)
+        Backtester(data, limits).run(trader)
+        passes.append((len(run_samples) / sum(run_samples), _latency(run_samples), _latency(flush_samples)))
+        timed_seconds += sum(run_samples)
+
+    # memory on a short fresh replay, the trader's own allocations dominate
+    module = _load(trader_path, params)
+    memory_data = MarketData(data.products, data.timestamps[:MEMORY_TICKS])
+    memory_data.order_depths = data.order_depths[:MEMORY_TICKS]
+    memory_data.mid_prices = data.mid_prices[:MEMORY_TICKS]
+    tracemalloc.start()
+    Backtester(memory_data, limits).run(module.Trader())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "products": len(params),
+        "ticks": len(data),
+        "passes": len(passes),
+        "timed_seconds": timed_seconds,
+        "ticks_per_sec": float(np.median([ticks_per_sec for ticks_per_sec, _, _ in passes])),
+        "run": {key: float(np.median([run[key] for _, run, _ in passes])) for key in passes[0][1]},
+        "flush": {key: float(np.median([flush[key] for _, _, flush in passes])) for key in passes[0][2]},
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def run_suite(trader_path: str = "trader.py", ticks: int = DEFAULT_TICKS, counts: tuple[int, ...] = PRODUCT_COUNTS, log_path: Optional[str] = None, repeat: int = DEFAULT_REPEAT, min_seconds: float = MIN_TIMED_SECONDS) -> dict[str, Any]:
+    base_params = load_trader(trader_path, module_name="bench_trader").PRODUCT_PARAMS
+    base_params = copy.deepcopy(base_params)
+    results = {}
+    if log_path is not None:
+        data = read_log(log_path)
+        data.timestamps = data.timestamps[:ticks]
+        params = {product: params for product, params in base_params.items() if product in data.products}
+        results["recorded"] = run_scenario(trader_path, params, data, repeat, min_seconds)
+    for count in counts:
+        params = scenario_products(count, base_params)
+        results[f"{count}_products"] = run_scenario(trader_path, params, synthetic_market(list(params), ticks), repeat, min_seconds)
+    return {
+        "version": BENCH_VERSION,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "ticks": ticks,
+        "scenarios": results,
+    }
+
+
+# (scenario, metric, baseline, current) for everything that got worse by more than threshold.
+# timings are only judged when both runs timed the scenario for at least min_seconds, memory always is
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float = DEFAULT_THRESHOLD, min_seconds: float = MIN_TIMED_SECONDS) -> list[tuple[str, str, float, float]]:
+    if baseline.get("version") != current.get("version"):
+        raise ValueError(f"baseline is bench version {baseline.get('version')}, this is {current.get('version')}, save a new one")
+    regressions = []
+    for name, scenario in current["scenarios"].items():
+        reference = baseline["scenarios"].get(name)
+        if reference is None:
+            continue
+        # lower is better for all of these, (metric, before, after, smallest change that counts)
+        checks = [("peak_memory_kb", reference["peak_memory_kb"], scenario["peak_memory_kb"], MIN_REGRESSION_KB)]
+        if min(reference["timed_seconds"], scenario["timed_seconds"]) >= min_seconds:
+            checks += [
+                ("run.mean_us", reference["run"]["mean_us"], scenario["run"]["mean_us"], MIN_REGRESSION_US),
+                ("run.p99_us", reference["run"]["p99_us"], scenario["run"]["p99_us"], MIN_REGRESSION_US),
+                ("flush.p99_us", reference["flush"]["p99_us"], scenario["flush"]["p99_us"], MIN_REGRESSION_US),
+            ]
+        for metric, before, after, floor in checks:
+            if before > 0 and after > before * (1 + threshold) and after - before > floor:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def format_results(results: dict[str, Any]) -> str:
+    lines = [f"{'scenario':<14}{'passes':>8}{'ticks/s':>10}{'mean us':>10}{'p99 us':>10}{'max us':>10}{'flush p99':>11}{'peak kb':>10}"]
+    for name, scenario in results["scenarios"].items():
+        lines.append(
+            f"{name:<14}{scenario['passes']:>8}{scenario['ticks_per_sec']:>10.0f}{scenario['run']['mean_us']:>10.0f}{scenario['run']['p99_us']:>10.0f}"
+            f"{scenario['run']['max_us']:>10.0f}{scenario['flush']['p99_us']:>11.0f}{scenario['peak_memory_kb']:>10.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="time Trader.run over recorded and synthetic tick streams")
+    parser.add_argument("--trader", default="trader.py")
+    parser.add_argument("--log", default=None, help="also replay this recorded log")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS)
+    parser.add_argument("--products", default=",".join(str(count) for count in PRODUCT_COUNTS), help="comma separated product counts")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timing passes per scenario at least, the median of each is kept")
+    parser.add_argument("--min-seconds", type=float, default=MIN_TIMED_SECONDS, help="time every scenario for at least this long, and only compare timings that were")
+    parser.add_argument("--save", default=None, metavar="JSON", help="write the results as a baseline")
+    parser.add_argument("--compare", default=None, metavar="JSON", help="baseline to check the results against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative slowdown before it counts as a regression")
+    args = parser.parse_args()
+
+    counts = tuple(int(count) for count in args.products.split(","))
+    results = run_suite(args.trader, args.ticks, counts, args.log, args.repeat, args.min_seconds)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        try:
+            regressions = compare(baseline, results, args.threshold, args.min_seconds)
+        except ValueError as error:
+            sys.exit(str(error))
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}: {before:.0f} -> {after:.0f} (+{after / before - 1:.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
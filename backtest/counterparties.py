@@ -0,0 +1,145 @@
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.data import SUBMISSION
+from backtest.engine import load_trader
+from logcache import LogCache
+from logparser import parse_log
+
+# per (bot, symbol) sums that add up across days, everything reported is derived from these
+SUM_COLUMNS = ("trades", "volume", "net", "size_square_sum", "impact", "impact_volume", "impact_trades")
+
+
+# one row per bot side of a trade, positive quantity for the buyer. we are not a counterparty of ourselves
+def trade_legs(trades: pd.DataFrame) -> pd.DataFrame:
+    legs = pd.concat([
+        pd.DataFrame({"timestamp": trades["timestamp"], "bot": trades["buyer"], "symbol": trades["symbol"], "signed": trades["quantity"]}),
+        pd.DataFrame({"timestamp": trades["timestamp"], "bot": trades["seller"], "symbol": trades["symbol"], "signed": -trades["quantity"]}),
+    ], ignore_index=True)
+    legs = legs[legs["bot"].notna() & (legs["bot"] != "") & (legs["bot"] != SUBMISSION)]
+    return legs.reset_index(drop=True)
+
+
+# one day: the raw sums per (bot, symbol). a trade printed at tick i is marked from the mid at i to the mid at i + horizon,
+# a one sided book keeps the last mid, and trades too close to the end of the day have no impact yet, as live
+def flow_sums(activities: pd.DataFrame, trades: pd.DataFrame, horizon: int) -> pd.DataFrame:
+    mids = activities.pivot_table(index="timestamp", columns="product", values="mid_price", aggfunc="first")
+    # the exchange logs a mid of 0 when the book is empty
+    mids = mids.where(mids != 0).ffill()
+    timestamps = mids.index.to_numpy()
+    columns = {symbol: i for i, symbol in enumerate(mids.columns)}
+    mid = mids.to_numpy()
+
+    legs = trade_legs(trades)
+    legs = legs[legs["symbol"].isin(columns)]
+    ticks = np.searchsorted(timestamps, legs["timestamp"].to_numpy())
+    symbols = legs["symbol"].map(columns).to_numpy()
+    signed = legs["signed"].to_numpy()
+
+    inside = ticks + horizon < len(timestamps)
+    then = mid[np.minimum(ticks, len(mid) - 1), symbols]
+    later = mid[np.minimum(ticks + horizon, len(mid) - 1), symbols]
+    resolved = inside & ~np.isnan(then) & ~np.isnan(later)
+    size = np.abs(signed)
+
+    frame = pd.DataFrame({
+        "bot": legs["bot"].to_numpy(),
+        "symbol": legs["symbol"].to_numpy(),
+        "trades": 1,
+        "volume": size,
+        "net": signed,
+        "size_square_sum": size * size,
+        "impact": np.where(resolved, signed * (later - then), 0.0),
+        "impact_volume": np.where(resolved, size, 0),
+        "impact_trades": resolved.astype(np.int64),
+    })
+    return frame.groupby(["bot", "symbol"]).sum()
+
+
+# what a strategy would ask the live index, for every (bot, symbol) at once
+def summarise(sums: pd.DataFrame) -> pd.DataFrame:
+    table = sums.copy()
+    table["mean_size"] = table["volume"] / table["trades"]
+    table["size_std"] = np.sqrt(np.maximum(table["size_square_sum"] / table["trades"] - table["mean_size"] ** 2, 0.0))
+    # mid move in the bot's favour per unit it traded, positive means the price followed it
+    table["impact_per_unit"] = table["impact"] / table["impact_volume"].where(table["impact_volume"] > 0)
+    # share of its volume on the buy side, 1 is a pure buyer
+    table["buy_share"] = (table["volume"] + table["net"]) / (2 * table["volume"])
+    return table.drop(columns="size_square_sum")
+
+
+# how often each bot trades each size, the distribution behind mean_size and size_std
+def size_counts(trades: pd.DataFrame) -> pd.DataFrame:
+    legs = trade_legs(trades)
+    legs["size"] = legs["signed"].abs()
+    return legs.groupby(["bot", "symbol", "size"]).size().unstack("size", fill_value=0)
+
+
+class CounterpartyFlows:
+
+    # the offline twin of CounterpartyIndex over any number of days, each day's impact measured inside that day.
+    # the horizon and informed threshold default to the loaded trader's, so offline numbers read like the live ones
+    def __init__(self, log_paths: list[str], horizon: Optional[int] = None, cache_dir: Optional[str] = None, trader_path: str = "trader.py"):
+        trader = load_trader(trader_path, module_name="counterparties_trader")
+        self.horizon = horizon = trader.DEFAULT_IMPACT_HORIZON if horizon is None else horizon
+        self.min_trades = trader.DEFAULT_INFORMED_MIN_TRADES
+        sums, trades = [], []
+        for path in log_paths:
+            if cache_dir is not None:
+                parsed = LogCache(cache_dir).load(path)
+            else:
+                parsed = parse_log(path, decode=False)
+            sums.append(flow_sums(parsed.activities, parsed.trades, horizon))
+            trades.append(parsed.trades)
+        self.sums = pd.concat(sums).groupby(level=["bot", "symbol"]).sum()
+        self.trades = pd.concat(trades, ignore_index=True)
+
+    def table(self) -> pd.DataFrame:
+        return summarise(self.sums)
+
+    def sizes(self) -> pd.DataFrame:
+        return size_counts(self.trades)
+
+    # same rule as CounterpartyIndex.informed, per symbol, strongest first
+    def informed(self, min_impact: float = 0.0, min_trades: Optional[int] = None) -> pd.DataFrame:
+        min_trades = self.min_trades if min_trades is None else min_trades
+        table = self.table()
+        table = table[(table["impact_trades"] >= min_trades) & (table["impact_per_unit"] > min_impact)]
+        return table.sort_values(["symbol", "impact_per_unit"], ascending=[True, False])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="net flow, trade sizes and price impact per bot and product")
+    parser.add_argument("logs", nargs="+", help="submission or activity logs with named trades")
+    parser.add_argument("--horizon", type=int, default=None, help="ticks after a trade its impact is read, the trader's default if not given")
+    parser.add_argument("--symbol", default=None, help="only this product")
+    parser.add_argument("--informed", action="store_true", help="only bots the mid has followed")
+    parser.add_argument("--min-trades", type=int, default=None)
+    parser.add_argument("--sizes", action="store_true", help="also print the trade size distribution")
+    parser.add_argument("--cache", default=None, metavar="DIR", help="keep parsed columns in DIR between runs")
+    parser.add_argument("--trader", default="trader.py", help="trader whose horizon and informed threshold are the defaults")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    flows = CounterpartyFlows(args.logs, args.horizon, args.cache, args.trader)
+    table = flows.informed(min_trades=args.min_trades) if args.informed else flows.table().sort_values("impact_per_unit", ascending=False)
+    sizes = flows.sizes() if args.sizes else None
+    finished = time.perf_counter()
+
+    if args.symbol:
+        table = table[table.index.get_level_values("symbol") == args.symbol]
+        sizes = None if sizes is None else sizes[sizes.index.get_level_values("symbol") == args.symbol]
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_rows", None):
+        print(table.to_string(float_format=lambda value: f"{value:,.3f}"))
+        if sizes is not None:
+            print()
+            print(sizes.loc[:, (sizes != 0).any()].to_string())
+    print(f"{len(flows.sums)} (bot, product) pairs over {len(args.logs)} logs in {finished - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
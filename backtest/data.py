@@ -0,0 +1,105 @@
+from typing import Optional
+
+import pandas as pd
+
+from datamodel import Symbol
+from backtest.model import ConversionObservation, Listing, Observation, OrderDepth, Trade
+from logcache import LogCache
+from logparser import parse_log
+
+SUBMISSION = "SUBMISSION"
+
+# field order of the ConversionObservation constructor
+CONVERSION_FIELDS = ("bidPrice", "askPrice", "transportFees", "exportTariff", "importTariff", "sugarPrice", "sunlightIndex")
+
+
+class MarketData:
+
+    def __init__(self, products: list[Symbol], timestamps: list[int]):
+        self.products = products
+        self.timestamps = timestamps
+
+        # one entry per tick, built once so replays never touch the raw rows again
+        self.order_depths: list[dict[Symbol, OrderDepth]] = [{} for _ in timestamps]
+        self.market_trades: list[dict[Symbol, list[Trade]]] = [{} for _ in timestamps]
+        self.mid_prices: list[dict[Symbol, float]] = [{} for _ in timestamps]
+        self.observations: list[Observation] = [Observation({}, {}) for _ in timestamps]
+
+        self.listings = {product: Listing(product, product, "SEASHELLS") for product in products}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_frames(cls, activities: pd.DataFrame, trades: pd.DataFrame, observations: Optional[pd.DataFrame] = None) -> "MarketData":
+        timestamps = sorted(activities["timestamp"].unique().tolist())
+        products = list(dict.fromkeys(activities["product"].tolist()))
+        data = cls(products, timestamps)
+        tick_index = {timestamp: i for i, timestamp in enumerate(timestamps)}
+
+        # exchange logs carry three levels a side, synthetic ones can carry more
+        depth = 1
+        while f"bid_price_{depth + 1}" in activities.columns:
+            depth += 1
+
+        # the exchange logs a mid of 0 when the book is empty, the product keeps its last mid then (as in counterparties.flow_sums).
+        # rows come in time order, so only ticks before a product's first quote are left without one
+        mid_prices = activities["mid_price"].where(activities["mid_price"] != 0)
+        mid_prices = mid_prices.groupby(activities["product"], sort=False).ffill()
+        columns = [activities["timestamp"].tolist(), activities["product"].tolist(), mid_prices.tolist()]
+        for side in ("bid", "ask"):
+            for level in range(1, depth + 1):
+                columns.append(activities[f"{side}_price_{level}"].tolist())
+                columns.append(activities[f"{side}_volume_{level}"].tolist())
+
+        for timestamp, product, mid_price, *levels in zip(*columns):
+            buy_orders = {}
+            sell_orders = {}
+            for j in range(0, 2 * depth, 2):
+                # missing levels are nan, which never equals itself
+                if levels[j] == levels[j]:
+                    buy_orders[int(levels[j])] = int(levels[j + 1])
+            for j in range(2 * depth, 4 * depth, 2):
+                if levels[j] == levels[j]:
+                    # sell volumes are negative, same as the exchange
+                    sell_orders[int(levels[j])] = -abs(int(levels[j + 1]))
+            i = tick_index[timestamp]
+            data.order_depths[i][product] = OrderDepth.from_tuple((buy_orders, sell_orders))
+            if mid_price == mid_price:
+                data.mid_prices[i][product] = mid_price
+
+        if len(trades):
+            # our own fills are re-simulated, only bot trades are market data
+            bot_trades = trades[(trades["buyer"] != SUBMISSION) & (trades["seller"] != SUBMISSION)]
+            for timestamp, symbol, price, quantity, buyer, seller in zip(
+                bot_trades["timestamp"].tolist(),
+                bot_trades["symbol"].tolist(),
+                bot_trades["price"].tolist(),
+                bot_trades["quantity"].tolist(),
+                bot_trades["buyer"].tolist(),
+                bot_trades["seller"].tolist(),
+            ):
+                i = tick_index.get(timestamp)
+                if i is None:
+                    continue
+                data.market_trades[i].setdefault(symbol, []).append(Trade(symbol, int(price), int(quantity), buyer, seller, timestamp))
+
+        if observations is not None and len(observations):
+            for timestamp, product, *values in zip(
+                observations["timestamp"].tolist(),
+                observations["product"].tolist(),
+                *(observations[field].tolist() for field in CONVERSION_FIELDS),
+            ):
+                i = tick_index.get(timestamp)
+                if i is not None:
+                    data.observations[i].conversionObservations[product] = ConversionObservation(*values)
+
+        return data
+
+
+def read_log(path: str, cache_dir: Optional[str] = None) -> MarketData:
+    if cache_dir is not None:
+        cached = LogCache(cache_dir).load(path)
+        return MarketData.from_frames(cached.activities, cached.trades, cached.observations)
+    parsed = parse_log(path, decode=False)
+    return MarketData.from_frames(parsed.activities, parsed.trades, parsed.observations)
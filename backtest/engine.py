@@ -0,0 +1,263 @@
+import importlib.util
+import sys
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from types import ModuleType
+from typing import Any, Iterator
+
+from datamodel import Order, Symbol
+from backtest.data import SUBMISSION, MarketData
+from backtest.fills import QUEUE_PRIORITIES, QueueFillModel
+from backtest.model import Observation, OrderDepth, Trade, TradingState
+
+MATCH_TRADES_MODES = ("all", "worse", "none") + QUEUE_PRIORITIES
+
+
+# drop everything the trader prints unless we want the lambda logs
+class _NullWriter:
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+class _LogWriter:
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def write(self, text: str) -> int:
+        if text != "\n":
+            self.lines.append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+# the module level Logger of the trader records nothing while the run is not captured, its lines would only be dropped
+@contextmanager
+def _skip_logs(trader: Any) -> Iterator[None]:
+    logger = getattr(sys.modules.get(type(trader).__module__), "logger", None)
+    if not hasattr(logger, "verbosity"):
+        yield
+        return
+    verbosity, logger.verbosity = logger.verbosity, -1
+    try:
+        yield
+    finally:
+        logger.verbosity = verbosity
+
+
+def load_trader(path: str = "trader.py", module_name: str = "backtest_trader") -> ModuleType:
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class BacktestResult:
+
+    def __init__(self, products: list[Symbol]):
+        self.products = products
+        self.pnl: dict[Symbol, float] = {product: 0.0 for product in products}
+        self.positions: dict[Symbol, int] = {product: 0 for product in products}
+        self.own_trades: list[Trade] = []
+        # total pnl after every tick, handy for plotting drawdowns
+        self.pnl_history: list[float] = []
+        self.rejected_orders = 0
+        # units converted through the foreign market, positive imports, and requests the exchange would refuse
+        self.conversions = 0
+        self.rejected_conversions = 0
+        self.logs: list[str] = []
+
+    @property
+    def total_pnl(self) -> float:
+        return sum(self.pnl.values())
+
+    def summary(self) -> str:
+        lines = [f"{product}: {pnl:,.1f}" for product, pnl in self.pnl.items()]
+        lines.append(f"total: {self.total_pnl:,.1f}")
+        return "\n".join(lines)
+
+
+class Backtester:
+
+    # match_trades: "all" fills resting orders from market trades at or through our price,
+    # "worse" only from trades strictly through it, "none" ignores market trades,
+    # "queue" and "pro_rata" also model the displayed volume ahead of us (see backtest.fills)
+    def __init__(self, data: MarketData, position_limits: dict[Symbol, int], match_trades: str = "all", capture_logs: bool = False):
+        if match_trades not in MATCH_TRADES_MODES:
+            raise ValueError(f"unknown match_trades mode {match_trades!r}")
+        self.data = data
+        self.position_limits = position_limits
+        self.match_trades = match_trades
+        self.fill_model = QueueFillModel(match_trades) if match_trades in QUEUE_PRIORITIES else None
+        self.capture_logs = capture_logs
+
+    def run(self, trader: Any) -> BacktestResult:
+        data = self.data
+        result = BacktestResult(data.products)
+        position = result.positions
+        cash = {product: 0.0 for product in data.products}
+        last_mid = {product: 0.0 for product in data.products}
+
+        trader_data = ""
+        own_trades: dict[Symbol, list[Trade]] = {}
+        previous_market_trades: dict[Symbol, list[Trade]] = {}
+        writer = _LogWriter() if self.capture_logs else _NullWriter()
+
+        with redirect_stdout(writer), nullcontext() if self.capture_logs else _skip_logs(trader):
+            for i, timestamp in enumerate(data.timestamps):
+                order_depths = data.order_depths[i]
+                state = TradingState(
+                    trader_data,
+                    timestamp,
+                    data.listings,
+                    order_depths,
+                    own_trades,
+                    previous_market_trades,
+                    dict(position),
+                    data.observations[i],
+                )
+
+                orders, conversions, trader_data = trader.run(state)
+
+                # conversions settle first, against the position the trader was just shown
+                if conversions:
+                    self.convert(conversions, data.observations[i], position, cash, result)
+
+                own_trades = {}
+                for symbol, symbol_orders in orders.items():
+                    if symbol not in order_depths or not symbol_orders:
+                        continue
+                    if not self.within_limits(symbol, symbol_orders, position.get(symbol, 0)):
+                        result.rejected_orders += len(symbol_orders)
+                        continue
+                    fills = self.match_orders(symbol, symbol_orders, order_depths[symbol], data.market_trades[i].get(symbol, []), timestamp)
+                    for trade in fills:
+                        if trade.buyer == SUBMISSION:
+                            position[symbol] = position.get(symbol, 0) + trade.quantity
+                            cash[symbol] = cash.get(symbol, 0.0) - trade.price * trade.quantity
+                        else:
+                            position[symbol] = position.get(symbol, 0) - trade.quantity
+                            cash[symbol] = cash.get(symbol, 0.0) + trade.price * trade.quantity
+                    if fills:
+                        own_trades[symbol] = fills
+                        result.own_trades.extend(fills)
+
+                last_mid.update(data.mid_prices[i])
+                for product in data.products:
+                    result.pnl[product] = cash[product] + position.get(product, 0) * last_mid[product]
+                result.pnl_history.append(result.total_pnl)
+
+                previous_market_trades = data.market_trades[i]
+
+        if self.capture_logs:
+            result.logs = writer.lines
+        return result
+
+    # only towards flat and no further than the position, at the all-in price of the one product the foreign market quotes
+    def convert(self, conversions: int, observations: Observation, position: dict[Symbol, int], cash: dict[Symbol, float], result: BacktestResult) -> None:
+        quoted = observations.conversionObservations
+        if len(quoted) != 1:
+            result.rejected_conversions += abs(conversions)
+            return
+        product, observation = next(iter(quoted.items()))
+        held = position.get(product, 0)
+        if (conversions > 0 and conversions > -held) or (conversions < 0 and -conversions > held):
+            result.rejected_conversions += abs(conversions)
+            return
+        if conversions > 0:
+            price = observation.askPrice + observation.transportFees + observation.importTariff
+        else:
+            price = observation.bidPrice - observation.transportFees - observation.exportTariff
+        position[product] = held + conversions
+        cash[product] = cash.get(product, 0.0) - price * conversions
+        result.conversions += conversions
+
+    # the exchange cancels every order of a product if they could breach the limit when all filled
+    def within_limits(self, symbol: Symbol, orders: list[Order], position: int) -> bool:
+        limit = self.position_limits.get(symbol)
+        if limit is None:
+            return True
+        total_buy = sum(order.quantity for order in orders if order.quantity > 0)
+        total_sell = sum(-order.quantity for order in orders if order.quantity < 0)
+        return position + total_buy <= limit and position - total_sell >= -limit
+
+    def match_orders(self, symbol: Symbol, orders: list[Order], order_depth: OrderDepth, market_trades: list[Trade], timestamp: int) -> list[Trade]:
+        # local copies, the prebuilt depths are shared across runs
+        buy_orders = dict(order_depth.buy_orders)
+        sell_orders = dict(order_depth.sell_orders)
+        trade_volumes = [trade.quantity for trade in market_trades]
+        fills = []
+        # what is left after crossing the book, for the fill model to replay the market trades against
+        resting: list[tuple[Order, int]] = []
+
+        for order in orders:
+            if order.quantity > 0:
+                remaining = order.quantity
+                for price in sorted(sell_orders):
+                    if price > order.price or remaining == 0:
+                        break
+                    volume = min(remaining, -sell_orders[price])
+                    fills.append(Trade(symbol, price, volume, SUBMISSION, "", timestamp))
+                    remaining -= volume
+                    sell_orders[price] += volume
+                    if sell_orders[price] == 0:
+                        del sell_orders[price]
+                if remaining > 0:
+                    if self.fill_model is not None:
+                        resting.append((order, remaining))
+                    else:
+                        remaining = self.match_market_trades(symbol, order, remaining, market_trades, trade_volumes, timestamp, fills)
+
+            elif order.quantity < 0:
+                remaining = -order.quantity
+                for price in sorted(buy_orders, reverse=True):
+                    if price < order.price or remaining == 0:
+                        break
+                    volume = min(remaining, buy_orders[price])
+                    fills.append(Trade(symbol, price, volume, "", SUBMISSION, timestamp))
+                    remaining -= volume
+                    buy_orders[price] -= volume
+                    if buy_orders[price] == 0:
+                        del buy_orders[price]
+                if remaining > 0:
+                    if self.fill_model is not None:
+                        resting.append((order, remaining))
+                    else:
+                        remaining = self.match_market_trades(symbol, order, remaining, market_trades, trade_volumes, timestamp, fills)
+
+        if resting:
+            fills.extend(self.fill_model.match(symbol, resting, order_depth, market_trades, timestamp))
+        return fills
+
+    # resting remainder fills at our price against bot trades that print through it
+    def match_market_trades(self, symbol: Symbol, order: Order, remaining: int, market_trades: list[Trade], trade_volumes: list[int], timestamp: int, fills: list[Trade]) -> int:
+        if self.match_trades == "none":
+            return remaining
+
+        buying = order.quantity > 0
+        for j, trade in enumerate(market_trades):
+            if remaining == 0:
+                break
+            if trade_volumes[j] == 0:
+                continue
+            if self.match_trades == "all":
+                crosses = trade.price <= order.price if buying else trade.price >= order.price
+            else:
+                crosses = trade.price < order.price if buying else trade.price > order.price
+            if not crosses:
+                continue
+            volume = min(remaining, trade_volumes[j])
+            if buying:
+                fills.append(Trade(symbol, order.price, volume, SUBMISSION, trade.seller, timestamp))
+            else:
+                fills.append(Trade(symbol, order.price, volume, trade.buyer, SUBMISSION, timestamp))
+            trade_volumes[j] -= volume
+            remaining -= volume
+
+        return remaining
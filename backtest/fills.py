@@ -0,0 +1,81 @@
+import heapq
+
+from datamodel import Order, Symbol
+from backtest.data import SUBMISSION
+from backtest.model import OrderDepth, Trade
+
+# "queue": we join behind the volume already displayed at our price and prints there eat that first.
+# "pro_rata": every print at our price is shared with the displayed volume in proportion to size.
+# prints strictly through our price fill us first in both
+QUEUE_PRIORITIES = ("queue", "pro_rata")
+
+
+class RestingOrder:
+
+    __slots__ = ("price", "remaining", "ahead")
+
+    def __init__(self, price: int, remaining: int, ahead: int):
+        self.price = price
+        self.remaining = remaining
+        # displayed volume at our price that trades before us
+        self.ahead = ahead
+
+
+class QueueFillModel:
+
+    def __init__(self, priority: str = "queue"):
+        if priority not in QUEUE_PRIORITIES:
+            raise ValueError(f"unknown queue priority {priority!r}")
+        self.priority = priority
+
+    # replays one tick's bot trades of a symbol against what is left of our orders after they crossed the book.
+    # resting orders sit in price priority heaps and each print only touches the ones it reaches,
+    # so a tick costs O(trades + orders log orders) however deep the book is
+    def match(self, symbol: Symbol, resting: list[tuple[Order, int]], order_depth: OrderDepth, market_trades: list[Trade], timestamp: int) -> list[Trade]:
+        bids: list[tuple[int, int, RestingOrder]] = []
+        asks: list[tuple[int, int, RestingOrder]] = []
+        for sequence, (order, remaining) in enumerate(resting):
+            if order.quantity > 0:
+                bids.append((-order.price, sequence, RestingOrder(order.price, remaining, order_depth.buy_orders.get(order.price, 0))))
+            else:
+                asks.append((order.price, sequence, RestingOrder(order.price, remaining, -order_depth.sell_orders.get(order.price, 0))))
+        heapq.heapify(bids)
+        heapq.heapify(asks)
+
+        fills: list[Trade] = []
+        for trade in market_trades:
+            if not bids and not asks:
+                break
+            # the seller would have hit our bids at or above the print, the buyer lifted our asks at or below it
+            volume = self.consume(bids, trade, trade.quantity, True, fills, symbol, timestamp)
+            self.consume(asks, trade, volume, False, fills, symbol, timestamp)
+        return fills
+
+    # fill the best resting orders one side can reach with up to volume of the print, returns what is left of it
+    def consume(self, heap: list, trade: Trade, volume: int, buying: bool, fills: list[Trade], symbol: Symbol, timestamp: int) -> int:
+        while heap and volume > 0:
+            order = heap[0][2]
+            if (order.price < trade.price) if buying else (order.price > trade.price):
+                break
+
+            if order.price == trade.price:
+                if self.priority == "queue":
+                    others = min(order.ahead, volume)
+                else:
+                    share = volume * order.remaining // (order.remaining + order.ahead)
+                    others = min(order.ahead, volume - share)
+                order.ahead -= others
+                volume -= others
+            filled = min(order.remaining, volume)
+
+            if filled > 0:
+                if buying:
+                    fills.append(Trade(symbol, order.price, filled, SUBMISSION, trade.seller, timestamp))
+                else:
+                    fills.append(Trade(symbol, order.price, filled, trade.buyer, SUBMISSION, timestamp))
+                order.remaining -= filled
+                volume -= filled
+            if order.remaining > 0:
+                break
+            heapq.heappop(heap)
+        return volume
@@ -0,0 +1,311 @@
+import argparse
+import math
+import time
+from typing import Any, Callable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.data import MarketData, read_log
+from backtest.engine import load_trader
+
+DEFAULT_ALPHAS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+# trader constant behind each parameter a call leaves out, read from the loaded trader so the offline series
+# are the ones it sees without importing the submission file
+LIVE_DEFAULTS = {
+    "savgol": {"window": "DEFAULT_SMOOTHER_WINDOW", "degree": "DEFAULT_SMOOTHER_DEGREE"},
+    "kalman": {"process_variance": "DEFAULT_KALMAN_PROCESS_VARIANCE", "measurement_variance": "DEFAULT_KALMAN_MEASUREMENT_VARIANCE"},
+    "one_euro": {"min_cutoff": "DEFAULT_ONE_EURO_MIN_CUTOFF", "beta": "DEFAULT_ONE_EURO_BETA"},
+    "vwap": {"depth": "DEFAULT_FAIR_VALUE_DEPTH"},
+    "imbalance": {"depth": "DEFAULT_FAIR_VALUE_DEPTH", "weight": "DEFAULT_IMBALANCE_WEIGHT"},
+}
+
+
+class BookArrays:
+
+    # [tick, product] arrays pulled out of the order depths once, nan where a side is empty.
+    # the full book sits in [tick, product, level] arrays, best level first, price nan and volume 0 past the last level
+    def __init__(self, data: MarketData):
+        shape = (len(data), len(data.products))
+        self.products = list(data.products)
+        self.present = np.zeros(shape, dtype=bool)
+        self.best_bid = np.full(shape, np.nan)
+        self.best_ask = np.full(shape, np.nan)
+        self.popular_bid = np.full(shape, np.nan)
+        self.popular_ask = np.full(shape, np.nan)
+        self.mid_price = np.full(shape, np.nan)
+
+        depth = max((max(len(order_depth.buy_orders), len(order_depth.sell_orders)) for order_depths in data.order_depths for order_depth in order_depths.values()), default=0)
+        self.bid_prices = np.full(shape + (depth,), np.nan)
+        self.ask_prices = np.full(shape + (depth,), np.nan)
+        # ask volumes positive, as on the trader's OrderBook
+        self.bid_volumes = np.zeros(shape + (depth,))
+        self.ask_volumes = np.zeros(shape + (depth,))
+
+        for tick, (order_depths, mid_prices) in enumerate(zip(data.order_depths, data.mid_prices)):
+            for column, product in enumerate(self.products):
+                order_depth = order_depths.get(product)
+                if order_depth is None:
+                    continue
+                self.present[tick, column] = True
+                self.mid_price[tick, column] = mid_prices.get(product, np.nan)
+                if order_depth.buy_orders:
+                    self.best_bid[tick, column] = max(order_depth.buy_orders)
+                    # same level Product.find_popular_sum_length ends up on: the last one it walks, the deepest
+                    self.popular_bid[tick, column] = min(order_depth.buy_orders)
+                    prices = sorted(order_depth.buy_orders, reverse=True)
+                    self.bid_prices[tick, column, :len(prices)] = prices
+                    self.bid_volumes[tick, column, :len(prices)] = [order_depth.buy_orders[price] for price in prices]
+                if order_depth.sell_orders:
+                    self.best_ask[tick, column] = min(order_depth.sell_orders)
+                    self.popular_ask[tick, column] = max(order_depth.sell_orders)
+                    prices = sorted(order_depth.sell_orders)
+                    self.ask_prices[tick, column, :len(prices)] = prices
+                    self.ask_volumes[tick, column, :len(prices)] = [-order_depth.sell_orders[price] for price in prices]
+
+
+# exponential moving averages of every column for several alphas at once, shape [alpha, tick, product]
+def ema_series(values: np.ndarray, alphas: Sequence[float], present: np.ndarray = None) -> np.ndarray:
+    alphas = np.asarray(alphas, dtype=np.float64)[:, None]
+    ticks, columns = values.shape
+    result = np.empty((len(alphas), ticks, columns))
+    ema = np.full((len(alphas), columns), np.nan)
+    for tick in range(ticks):
+        value = values[tick]
+        # the first value seeds the average, same as Product.update_fair_values
+        updated = np.where(np.isnan(ema), value, alphas * value + (1 - alphas) * ema)
+        ema = updated if present is None else np.where(present[tick], updated, ema)
+        result[:, tick] = ema
+    return result
+
+
+# causal savitzky-golay weights by age, newest first: the fitted value at the newest of `count` points
+def savgol_weights(count: int, degree: int) -> np.ndarray:
+    degree = min(degree, count - 1)
+    powers = np.arange(degree + 1)
+    scaled = (np.arange(count) / count)[:, None] ** powers
+    return np.linalg.pinv(scaled)[0]
+
+
+def _savgol_column(values: np.ndarray, window: int, degree: int) -> np.ndarray:
+    result = np.empty(len(values))
+    # the first window - 1 fits only have the values seen so far
+    for count in range(1, min(window, len(values) + 1)):
+        result[count - 1] = savgol_weights(count, degree) @ values[count - 1::-1]
+    if len(values) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        result[window - 1:] = windows @ savgol_weights(window, degree)[::-1]
+    return result
+
+
+# the smoothers below are the whole day twins of the trader's streaming ones, shape [tick, product].
+# a product only moves on ticks where present is set (and it has a value), and holds its value otherwise
+def savgol_series(values: np.ndarray, present: np.ndarray = None, *, window: int, degree: int) -> np.ndarray:
+    updated = ~np.isnan(values) if present is None else present & ~np.isnan(values)
+    result = np.full(values.shape, np.nan)
+    for column in range(values.shape[1]):
+        rows = np.flatnonzero(updated[:, column])
+        result[rows, column] = _savgol_column(values[rows, column], window, degree)
+    return pd.DataFrame(result).ffill().to_numpy()
+
+
+def _recursive_series(values: np.ndarray, present: np.ndarray, step: Callable[[np.ndarray, np.ndarray, Any], tuple[np.ndarray, Any]], initial: Any) -> np.ndarray:
+    updated = ~np.isnan(values) if present is None else present & ~np.isnan(values)
+    result = np.empty(values.shape)
+    smoothed = np.full(values.shape[1], np.nan)
+    extra = initial
+    for tick in range(len(values)):
+        moved, moved_extra = step(values[tick], smoothed, extra)
+        mask = updated[tick]
+        smoothed = np.where(mask, moved, smoothed)
+        extra = tuple(np.where(mask, new, old) for new, old in zip(moved_extra, extra))
+        result[tick] = smoothed
+    return result
+
+
+def kalman_series(values: np.ndarray, present: np.ndarray = None, *, process_variance: float, measurement_variance: float) -> np.ndarray:
+    def step(value, smoothed, extra):
+        (variance,) = extra
+        first = np.isnan(smoothed)
+        predicted = variance + process_variance
+        gain = predicted / (predicted + measurement_variance)
+        return np.where(first, value, smoothed + gain * (value - smoothed)), (np.where(first, measurement_variance, (1 - gain) * predicted),)
+    return _recursive_series(values, present, step, (np.full(values.shape[1], np.nan),))
+
+
+def one_euro_series(values: np.ndarray, present: np.ndarray = None, *, min_cutoff: float, beta: float, derivative_cutoff: float = 1.0) -> np.ndarray:
+    def alpha(cutoff):
+        return 1 / (1 + 1 / (2 * math.pi * cutoff))
+    derivative_alpha = alpha(derivative_cutoff)
+
+    def step(value, smoothed, extra):
+        (derivative,) = extra
+        first = np.isnan(smoothed)
+        derivative = np.where(first, 0.0, derivative + derivative_alpha * (value - smoothed - derivative))
+        moved = smoothed + alpha(min_cutoff + beta * np.abs(derivative)) * (value - smoothed)
+        return np.where(first, value, moved), (derivative,)
+    return _recursive_series(values, present, step, (np.zeros(values.shape[1]),))
+
+
+SMOOTHERS = {"savgol": savgol_series, "kalman": kalman_series, "one_euro": one_euro_series}
+
+
+# price times volume and volume over the best `depth` levels of one side, [tick, product]
+def depth_sums(prices: np.ndarray, volumes: np.ndarray, depth: int) -> tuple[np.ndarray, np.ndarray]:
+    volumes = volumes[..., :depth]
+    return np.nansum(prices[..., :depth] * volumes, axis=2), volumes.sum(axis=2)
+
+
+def _two_sided(book: BookArrays, values: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(book.best_bid) | np.isnan(book.best_ask), np.nan, values)
+
+
+# the fair values below are the whole day twins of the trader's FAIR_VALUES, one value per tick and product,
+# nan where a side is empty (the trader then keeps its last popular_average)
+def popular_fair_values(book: BookArrays) -> np.ndarray:
+    return (book.popular_bid + book.popular_ask) / 2
+
+
+def microprice_fair_values(book: BookArrays) -> np.ndarray:
+    bid_volume, ask_volume = book.bid_volumes[..., 0], book.ask_volumes[..., 0]
+    return (book.best_bid * ask_volume + book.best_ask * bid_volume) / (bid_volume + ask_volume)
+
+
+def vwap_fair_values(book: BookArrays, *, depth: int) -> np.ndarray:
+    bid_value, bid_volume = depth_sums(book.bid_prices, book.bid_volumes, depth)
+    ask_value, ask_volume = depth_sums(book.ask_prices, book.ask_volumes, depth)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _two_sided(book, (bid_value / bid_volume + ask_value / ask_volume) / 2)
+
+
+def imbalance_fair_values(book: BookArrays, *, depth: int, weight: float) -> np.ndarray:
+    _, bid_volume = depth_sums(book.bid_prices, book.bid_volumes, depth)
+    _, ask_volume = depth_sums(book.ask_prices, book.ask_volumes, depth)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        imbalance = (bid_volume - ask_volume) / (bid_volume + ask_volume)
+    return (book.best_bid + book.best_ask) / 2 + weight * imbalance * (book.best_ask - book.best_bid) / 2
+
+
+def max_volume_fair_values(book: BookArrays) -> np.ndarray:
+    def side(prices: np.ndarray, volumes: np.ndarray) -> np.ndarray:
+        most = volumes == volumes.max(axis=2, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.nansum(np.where(most, prices, 0.0), axis=2) / most.sum(axis=2)
+    return _two_sided(book, (side(book.bid_prices, book.bid_volumes) + side(book.ask_prices, book.ask_volumes)) / 2)
+
+
+FAIR_VALUES = {
+    "popular": popular_fair_values,
+    "microprice": microprice_fair_values,
+    "vwap": vwap_fair_values,
+    "imbalance": imbalance_fair_values,
+    "max_volume": max_volume_fair_values,
+}
+
+
+class IndicatorSeries:
+
+    # whole day indicator series for every product, the offline twin of Product.update_fair_values
+    def __init__(self, data: MarketData, trader_path: str = "trader.py"):
+        trader = load_trader(trader_path, module_name="indicators_trader")
+        self.defaults = {name: {param: getattr(trader, constant) for param, constant in params.items()} for name, params in LIVE_DEFAULTS.items()}
+        self.book = BookArrays(data)
+        self.products = self.book.products
+        self.timestamps = np.asarray(data.timestamps)
+
+        # a one sided book keeps the last popular average
+        popular = (self.book.popular_ask + self.book.popular_bid) / 2
+        self.popular_average = pd.DataFrame(popular).ffill().to_numpy()
+        self.spread = self.book.best_ask - self.book.best_bid
+
+    def ema(self, alphas: Sequence[float]) -> np.ndarray:
+        return ema_series(self.popular_average, alphas, self.book.present)
+
+    # the popular average through one of SMOOTHERS, keyword arguments as that function takes them, the live defaults for the rest
+    def smoothed(self, smoother: str, **params: float) -> np.ndarray:
+        return SMOOTHERS[smoother](self.popular_average, self.book.present, **{**self.defaults[smoother], **params})
+
+    # one of FAIR_VALUES, held through one sided books the way the trader holds popular_average
+    def fair_value(self, estimator: str, **params: float) -> np.ndarray:
+        return pd.DataFrame(FAIR_VALUES[estimator](self.book, **{**self.defaults.get(estimator, {}), **params})).ffill().to_numpy()
+
+    # how well each fair value predicts the next mid, per (estimator, product): rmse, skill against just using
+    # the current mid (1 is perfect, 0 no better, below 0 worse), and correlation of the move it implies with the move that came
+    def fair_value_scores(self, estimators: dict[str, dict[str, float]]) -> pd.DataFrame:
+        mid = pd.DataFrame((self.book.best_bid + self.book.best_ask) / 2).ffill().to_numpy()
+        now, following = mid[:-1], mid[1:]
+        moved = following - now
+        frames = []
+        for estimator, params in estimators.items():
+            predicted = self.fair_value(estimator, **params)[:-1]
+            valid = ~np.isnan(predicted) & ~np.isnan(moved)
+            implied = np.where(valid, predicted - now, np.nan)
+            actual = np.where(valid, moved, np.nan)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mse = np.nanmean((implied - actual) ** 2, axis=0)
+                implied_centred = implied - np.nanmean(implied, axis=0)
+                actual_centred = actual - np.nanmean(actual, axis=0)
+                correlation = np.nanmean(implied_centred * actual_centred, axis=0) / np.sqrt(np.nanmean(implied_centred ** 2, axis=0) * np.nanmean(actual_centred ** 2, axis=0))
+                skill = 1 - mse / np.nanmean(actual ** 2, axis=0)
+            frames.append(pd.DataFrame(
+                {"rmse": np.sqrt(mse), "skill": skill, "correlation": correlation},
+                index=pd.MultiIndex.from_product([[estimator], self.products], names=["estimator", "product"]),
+            ))
+        return pd.concat(frames)
+
+    # how well each ema predicts the next mid price, rmse per (alpha, product)
+    def tracking_error(self, alphas: Sequence[float]) -> pd.DataFrame:
+        errors = self.ema(alphas)[:, :-1] - self.book.mid_price[1:]
+        rmse = np.sqrt(np.nanmean(errors ** 2, axis=1))
+        return pd.DataFrame(rmse, index=pd.Index(list(alphas), name="alpha"), columns=self.products)
+
+    # the same for a smoothed series, one row
+    def smoother_tracking_error(self, smoother: str, **params: float) -> pd.Series:
+        errors = self.smoothed(smoother, **params)[:-1] - self.book.mid_price[1:]
+        return pd.Series(np.sqrt(np.nanmean(errors ** 2, axis=0)), index=self.products, name=smoother)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="whole day indicator series, e.g. to pick exponential_param without a replay")
+    parser.add_argument("log", help="submission log with activities")
+    parser.add_argument("--alphas", default=",".join(str(alpha) for alpha in DEFAULT_ALPHAS), help="comma separated ema alphas")
+    parser.add_argument("--cache", default=None, metavar="DIR", help="keep parsed columns in DIR between runs")
+    parser.add_argument("--trader", default="trader.py", help="trader whose defaults fill in smoother and fair value parameters")
+    parser.add_argument("--smoother", default=None, choices=list(SMOOTHERS), help="also score this smoother of the popular average")
+    parser.add_argument("--smoother-params", default="", metavar="KEY=VALUE,...", help="e.g. window=21,degree=2")
+    parser.add_argument("--fair-values", action="store_true", help="also score every fair value estimator on the next mid")
+    parser.add_argument("--fair-value-depth", type=int, default=None, help="book levels a side for vwap and imbalance, the trader's default if not given")
+    parser.add_argument("--imbalance-weight", type=float, default=None)
+    args = parser.parse_args()
+    alphas = [float(alpha) for alpha in args.alphas.split(",")]
+    smoother_params = {}
+    for pair in filter(None, args.smoother_params.split(",")):
+        key, _, value = pair.partition("=")
+        smoother_params[key] = int(value) if key in ("window", "degree") else float(value)
+
+    data = read_log(args.log, cache_dir=args.cache)
+    start = time.perf_counter()
+    series = IndicatorSeries(data, args.trader)
+    errors = series.tracking_error(alphas)
+    if args.smoother:
+        errors.loc[args.smoother] = series.smoother_tracking_error(args.smoother, **smoother_params)
+    scores = None
+    if args.fair_values:
+        estimators = {estimator: {} for estimator in FAIR_VALUES}
+        if args.fair_value_depth is not None:
+            estimators["vwap"]["depth"] = estimators["imbalance"]["depth"] = args.fair_value_depth
+        if args.imbalance_weight is not None:
+            estimators["imbalance"]["weight"] = args.imbalance_weight
+        scores = series.fair_value_scores(estimators)
+    finished = time.perf_counter()
+
+    print(errors.to_string(float_format=lambda value: f"{value:.3f}"))
+    if scores is not None:
+        print()
+        print(scores.unstack("estimator").to_string(float_format=lambda value: f"{value:.3f}"))
+    print(f"{len(alphas)} alphas x {len(series.products)} products x {len(data)} ticks in {finished - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
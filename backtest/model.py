@@ -0,0 +1,274 @@
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable
+
+from datamodel import Position, Product, Symbol, Time, UserId
+
+# slotted stand-ins for the datamodel classes, same names, constructors and attributes so a trader
+# cannot tell them apart. they have no __dict__, so nothing may serialise them through
+# ProsperityEncoder/jsonpickle, each writes its own json instead (same text as datamodel's toJSON)
+
+
+# json.dumps text of a leaf value, strings and ints are by far the most common so they skip the encoder
+def _scalar(value: Any) -> str:
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value.__class__ is int:
+        return int.__repr__(value)
+    if value is None:
+        return "null"
+    return json.dumps(value)
+
+
+# json.dumps(..., sort_keys=True) text of a dict whose values are model objects
+def _mapping(mapping: dict, encode: Callable[[Any], str]) -> str:
+    return "{" + ", ".join(encode_basestring_ascii(str(key)) + ": " + encode(value) for key, value in sorted(mapping.items())) + "}"
+
+
+# plain dicts (books, positions) go straight to the c encoder, built once rather than per json.dumps call
+_sorted = json.JSONEncoder(sort_keys=True).encode
+
+
+class Listing:
+
+    __slots__ = ("symbol", "product", "denomination")
+
+    def __init__(self, symbol: Symbol, product: Product, denomination: Product):
+        self.symbol = symbol
+        self.product = product
+        self.denomination = denomination
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "Listing":
+        return cls(*values)
+
+    def to_tuple(self) -> tuple:
+        return (self.symbol, self.product, self.denomination)
+
+    def to_json(self) -> str:
+        return '{"denomination": ' + _scalar(self.denomination) + ', "product": ' + _scalar(self.product) + ', "symbol": ' + _scalar(self.symbol) + "}"
+
+
+class ConversionObservation:
+
+    __slots__ = ("bidPrice", "askPrice", "transportFees", "exportTariff", "importTariff", "sugarPrice", "sunlightIndex")
+
+    def __init__(self, bidPrice: float, askPrice: float, transportFees: float, exportTariff: float, importTariff: float, sugarPrice: float, sunlightIndex: float):
+        self.bidPrice = bidPrice
+        self.askPrice = askPrice
+        self.transportFees = transportFees
+        self.exportTariff = exportTariff
+        self.importTariff = importTariff
+        self.sugarPrice = sugarPrice
+        self.sunlightIndex = sunlightIndex
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "ConversionObservation":
+        return cls(*values)
+
+    def to_tuple(self) -> tuple:
+        return (self.bidPrice, self.askPrice, self.transportFees, self.exportTariff, self.importTariff, self.sugarPrice, self.sunlightIndex)
+
+    def to_json(self) -> str:
+        return _sorted({field: getattr(self, field) for field in self.__slots__})
+
+
+class Observation:
+
+    __slots__ = ("plainValueObservations", "conversionObservations")
+
+    def __init__(self, plainValueObservations: dict[Product, int], conversionObservations: dict[Product, ConversionObservation]) -> None:
+        self.plainValueObservations = plainValueObservations
+        self.conversionObservations = conversionObservations
+
+    def __str__(self) -> str:
+        # same text datamodel's jsonpickle output has, tagged with the class the exchange's objects come from
+        conversions = {product: {"py/object": "datamodel.ConversionObservation", **{field: getattr(observation, field) for field in observation.__slots__}} for product, observation in self.conversionObservations.items()}
+        return "(plainValueObservations: " + json.dumps(self.plainValueObservations) + ", conversionObservations: " + json.dumps(conversions) + ")"
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "Observation":
+        plain, conversions = values
+        return cls(dict(plain), {product: ConversionObservation.from_tuple(observation) for product, observation in conversions.items()})
+
+    def to_tuple(self) -> tuple:
+        return (self.plainValueObservations, {product: observation.to_tuple() for product, observation in self.conversionObservations.items()})
+
+    def to_json(self) -> str:
+        conversions = _mapping(self.conversionObservations, ConversionObservation.to_json)
+        return '{"conversionObservations": ' + conversions + ', "plainValueObservations": ' + _sorted(self.plainValueObservations) + "}"
+
+
+class Order:
+
+    __slots__ = ("symbol", "price", "quantity")
+
+    def __init__(self, symbol: Symbol, price: int, quantity: int) -> None:
+        self.symbol = symbol
+        self.price = price
+        self.quantity = quantity
+
+    def __str__(self) -> str:
+        return "(" + self.symbol + ", " + str(self.price) + ", " + str(self.quantity) + ")"
+
+    def __repr__(self) -> str:
+        return "(" + self.symbol + ", " + str(self.price) + ", " + str(self.quantity) + ")"
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "Order":
+        return cls(*values)
+
+    def to_tuple(self) -> tuple:
+        return (self.symbol, self.price, self.quantity)
+
+
+class OrderDepth:
+
+    __slots__ = ("buy_orders", "sell_orders")
+
+    def __init__(self):
+        # pair of price and quantity
+        self.buy_orders: dict[int, int] = {}
+        self.sell_orders: dict[int, int] = {}
+
+    # skips the two empty dicts __init__ would build first
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "OrderDepth":
+        order_depth = cls.__new__(cls)
+        order_depth.buy_orders, order_depth.sell_orders = values
+        return order_depth
+
+    def to_tuple(self) -> tuple:
+        return (self.buy_orders, self.sell_orders)
+
+    def to_json(self) -> str:
+        return '{"buy_orders": ' + _sorted(self.buy_orders) + ', "sell_orders": ' + _sorted(self.sell_orders) + "}"
+
+
+class Trade:
+
+    __slots__ = ("symbol", "price", "quantity", "buyer", "seller", "timestamp")
+
+    def __init__(self, symbol: Symbol, price: int, quantity: int, buyer: UserId = None, seller: UserId = None, timestamp: int = 0) -> None:
+        self.symbol = symbol
+        self.price = price
+        self.quantity = quantity
+        self.buyer = buyer
+        self.seller = seller
+        self.timestamp = timestamp
+
+    def __str__(self) -> str:
+        return "(" + self.symbol + ", " + self.buyer + " << " + self.seller + ", " + str(self.price) + ", " + str(self.quantity) + ", " + str(self.timestamp) + ")"
+
+    def __repr__(self) -> str:
+        return "(" + self.symbol + ", " + self.buyer + " << " + self.seller + ", " + str(self.price) + ", " + str(self.quantity) + ", " + str(self.timestamp) + ")"
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "Trade":
+        return cls(*values)
+
+    def to_tuple(self) -> tuple:
+        return (self.symbol, self.price, self.quantity, self.buyer, self.seller, self.timestamp)
+
+    # the hot one, whole days of market trades go through here. numbers are plain ints or finite floats,
+    # where str() already matches json
+    def to_json(self) -> str:
+        return (
+            f'{{"buyer": {_scalar(self.buyer)}, "price": {self.price}, "quantity": {self.quantity}, '
+            f'"seller": {_scalar(self.seller)}, "symbol": {_scalar(self.symbol)}, "timestamp": {self.timestamp}}}'
+        )
+
+
+class TradingState:
+
+    __slots__ = ("traderData", "timestamp", "listings", "order_depths", "own_trades", "market_trades", "position", "observations")
+
+    def __init__(
+        self,
+        traderData: str,
+        timestamp: Time,
+        listings: dict[Symbol, Listing],
+        order_depths: dict[Symbol, OrderDepth],
+        own_trades: dict[Symbol, list[Trade]],
+        market_trades: dict[Symbol, list[Trade]],
+        position: dict[Product, Position],
+        observations: Observation,
+    ):
+        self.traderData = traderData
+        self.timestamp = timestamp
+        self.listings = listings
+        self.order_depths = order_depths
+        self.own_trades = own_trades
+        self.market_trades = market_trades
+        self.position = position
+        self.observations = observations
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "TradingState":
+        trader_data, timestamp, listings, order_depths, own_trades, market_trades, position, observations = values
+        return cls(
+            trader_data,
+            timestamp,
+            {symbol: Listing.from_tuple(listing) for symbol, listing in listings.items()},
+            {symbol: OrderDepth.from_tuple(order_depth) for symbol, order_depth in order_depths.items()},
+            {symbol: [Trade.from_tuple(trade) for trade in trades] for symbol, trades in own_trades.items()},
+            {symbol: [Trade.from_tuple(trade) for trade in trades] for symbol, trades in market_trades.items()},
+            dict(position),
+            Observation.from_tuple(observations),
+        )
+
+    def to_tuple(self) -> tuple:
+        return (
+            self.traderData,
+            self.timestamp,
+            {symbol: listing.to_tuple() for symbol, listing in self.listings.items()},
+            {symbol: order_depth.to_tuple() for symbol, order_depth in self.order_depths.items()},
+            {symbol: [trade.to_tuple() for trade in trades] for symbol, trades in self.own_trades.items()},
+            {symbol: [trade.to_tuple() for trade in trades] for symbol, trades in self.market_trades.items()},
+            self.position,
+            self.observations.to_tuple(),
+        )
+
+    def to_json(self) -> str:
+        return (
+            '{"listings": ' + _mapping(self.listings, Listing.to_json)
+            + ', "market_trades": ' + _mapping(self.market_trades, _trades)
+            + ', "observations": ' + self.observations.to_json()
+            + ', "order_depths": ' + _mapping(self.order_depths, OrderDepth.to_json)
+            + ', "own_trades": ' + _mapping(self.own_trades, _trades)
+            + ', "position": ' + _sorted(self.position)
+            + ', "timestamp": ' + _scalar(self.timestamp)
+            + ', "traderData": ' + _scalar(self.traderData) + "}"
+        )
+
+    # same name as datamodel so callers need not care which one they hold
+    def toJSON(self) -> str:
+        return self.to_json()
+
+
+def _trades(trades: list[Trade]) -> str:
+    return "[" + ", ".join([trade.to_json() for trade in trades]) + "]"
+
+
+def state_from_json(text: str) -> TradingState:
+    raw = json.loads(text)
+    observations = raw["observations"]
+    return TradingState(
+        raw["traderData"],
+        raw["timestamp"],
+        {symbol: Listing(listing["symbol"], listing["product"], listing["denomination"]) for symbol, listing in raw["listings"].items()},
+        {
+            symbol: OrderDepth.from_tuple((
+                {int(price): volume for price, volume in order_depth["buy_orders"].items()},
+                {int(price): volume for price, volume in order_depth["sell_orders"].items()},
+            ))
+            for symbol, order_depth in raw["order_depths"].items()
+        },
+        {symbol: [Trade(**trade) for trade in trades] for symbol, trades in raw["own_trades"].items()},
+        {symbol: [Trade(**trade) for trade in trades] for symbol, trades in raw["market_trades"].items()},
+        raw["position"],
+        Observation(
+            observations["plainValueObservations"],
+            {product: ConversionObservation(**observation) for product, observation in observations["conversionObservations"].items()},
+        ),
+    )
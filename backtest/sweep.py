@@ -0,0 +1,249 @@
+import argparse
+import copy
+import itertools
+import math
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.data import MarketData, read_log
+from backtest.engine import MATCH_TRADES_MODES, Backtester, load_trader
+
+SWEEP_KEYS = (
+    "mm_epsilon", "makemm_epsilon", "mr_epsilon", "exponential_param", "liquidation_threshold", "stats_window", "regression_window", "regression_decay",
+    "smoother_window", "smoother_degree", "kalman_process_variance", "kalman_measurement_variance", "one_euro_min_cutoff", "one_euro_beta",
+    "fair_value_depth", "imbalance_weight",
+)
+
+# worker globals shared by every pool that evaluates points, sweeps and walk-forward alike.
+# logs are parsed before the pool forks so every process shares one copy, or once per worker under spawn
+_DAYS: dict[str, MarketData] = {}
+_LOG_CACHE: Optional[str] = None
+_TRADER_PATH = "trader.py"
+_MATCH_TRADES = "all"
+_TRADER_MODULE = None
+_BASE_PARAMS: dict = {}
+
+
+class SearchSpace:
+
+    # keys are "PRODUCT.param", values are a list of choices or a (low, high) range
+    def __init__(self, space: dict[str, Any]):
+        for key in space:
+            product, _, param = key.partition(".")
+            if not product or param not in SWEEP_KEYS:
+                raise ValueError(f"bad sweep key {key!r}, expected PRODUCT.<one of {', '.join(SWEEP_KEYS)}>")
+        self.space = space
+
+    @property
+    def keys(self) -> list[str]:
+        return list(self.space)
+
+    def grid(self) -> list[dict[str, Any]]:
+        choices = []
+        for key, values in self.space.items():
+            if isinstance(values, tuple):
+                raise ValueError(f"{key} is a range, grid search needs explicit values")
+            choices.append(values)
+        return [dict(zip(self.keys, combination)) for combination in itertools.product(*choices)]
+
+    def sample(self, rng: random.Random) -> dict[str, Any]:
+        point = {}
+        for key, values in self.space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                point[key] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+            else:
+                point[key] = rng.choice(values)
+        return point
+
+    def random(self, samples: int, seed: int = 0) -> list[dict[str, Any]]:
+        rng = random.Random(seed)
+        return [self.sample(rng) for _ in range(samples)]
+
+    # map a point onto the unit cube for the surrogate model
+    def normalise(self, point: dict[str, Any]) -> list[float]:
+        coords = []
+        for key, values in self.space.items():
+            if isinstance(values, tuple):
+                low, high = values
+            else:
+                low, high = min(values), max(values)
+            coords.append(0.0 if high == low else (point[key] - low) / (high - low))
+        return coords
+
+
+def apply_overrides(params: dict, overrides: dict[str, Any]) -> dict:
+    params = copy.deepcopy(params)
+    for key, value in overrides.items():
+        product, _, param = key.partition(".")
+        params[product][param] = value
+    return params
+
+
+def init_worker(trader_path: str, match_trades: str, log_cache: Optional[str] = None) -> None:
+    global _TRADER_PATH, _MATCH_TRADES, _LOG_CACHE
+    _TRADER_PATH = trader_path
+    _MATCH_TRADES = match_trades
+    _LOG_CACHE = log_cache
+
+
+def worker_data(log_path: str) -> MarketData:
+    if log_path not in _DAYS:
+        _DAYS[log_path] = read_log(log_path, cache_dir=_LOG_CACHE)
+    return _DAYS[log_path]
+
+
+# a pool whose workers evaluate points on these logs
+def worker_pool(workers: int, log_paths: list[str], trader_path: str, match_trades: str, log_cache: Optional[str] = None) -> ProcessPoolExecutor:
+    init_worker(trader_path, match_trades, log_cache)
+    if "fork" in multiprocessing.get_all_start_methods():
+        # parse in the parent, children see the same pages copy-on-write
+        for log_path in log_paths:
+            worker_data(log_path)
+        context = multiprocessing.get_context("fork")
+    else:
+        # nothing is inherited, each worker parses a log the first time one of its jobs needs it
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(trader_path, match_trades, log_cache))
+
+
+# one backtest of a loaded trader module with overrides on top of its base params, as a result row
+def evaluate(module: Any, base_params: dict, overrides: dict[str, Any], data: MarketData, match_trades: str = "all") -> dict[str, Any]:
+    # Product reads PRODUCT_PARAMS when constructed, so patch the module dict in place
+    params = apply_overrides(base_params, overrides)
+    module.PRODUCT_PARAMS.clear()
+    module.PRODUCT_PARAMS.update(params)
+
+    limits = {product: product_params["position_limit"] for product, product_params in params.items()}
+    result = Backtester(data, limits, match_trades=match_trades).run(module.Trader())
+
+    row = dict(overrides)
+    row.update({f"pnl_{product}": pnl for product, pnl in result.pnl.items()})
+    row["total_pnl"] = result.total_pnl
+    row["rejected_orders"] = result.rejected_orders
+    return row
+
+
+# one (log path, overrides) job inside a worker_pool, the trader is loaded once per worker
+def run_job(job: tuple[str, dict[str, Any]]) -> dict[str, Any]:
+    global _TRADER_MODULE, _BASE_PARAMS
+    log_path, overrides = job
+    if _TRADER_MODULE is None:
+        _TRADER_MODULE = load_trader(_TRADER_PATH)
+        _BASE_PARAMS = copy.deepcopy(_TRADER_MODULE.PRODUCT_PARAMS)
+    return evaluate(_TRADER_MODULE, _BASE_PARAMS, overrides, worker_data(log_path), _MATCH_TRADES)
+
+
+# gaussian process with an rbf kernel, small enough that numpy alone is fine
+def _expected_improvement(observed: np.ndarray, scores: np.ndarray, candidates: np.ndarray, length_scale: float = 0.2, noise: float = 1e-6) -> np.ndarray:
+    mean, std = scores.mean(), scores.std() or 1.0
+    y = (scores - mean) / std
+
+    def kernel(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        distances = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+        return np.exp(-0.5 * distances / length_scale ** 2)
+
+    k = kernel(observed, observed) + noise * np.eye(len(observed))
+    k_star = kernel(candidates, observed)
+    cholesky = np.linalg.cholesky(k)
+    alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y))
+    mu = k_star @ alpha
+    v = np.linalg.solve(cholesky, k_star.T)
+    sigma = np.sqrt(np.clip(1.0 - (v ** 2).sum(axis=0), 1e-12, None))
+
+    improvement = mu - y.max()
+    z = improvement / sigma
+    cdf = 0.5 * (1 + np.vectorize(math.erf)(z / np.sqrt(2)))
+    pdf = np.exp(-0.5 * z ** 2) / np.sqrt(2 * np.pi)
+    return improvement * cdf + sigma * pdf
+
+
+class Sweep:
+
+    def __init__(self, log_path: str, space: SearchSpace, trader_path: str = "trader.py", match_trades: str = "all", workers: Optional[int] = None):
+        self.log_path = log_path
+        self.space = space
+        self.trader_path = trader_path
+        self.match_trades = match_trades
+        self.workers = workers or os.cpu_count() or 1
+
+    def _executor(self) -> ProcessPoolExecutor:
+        return worker_pool(self.workers, [self.log_path], self.trader_path, self.match_trades)
+
+    def _jobs(self, points: list[dict[str, Any]]) -> list[tuple[str, dict[str, Any]]]:
+        return [(self.log_path, point) for point in points]
+
+    def run(self, points: list[dict[str, Any]]) -> pd.DataFrame:
+        with self._executor() as executor:
+            rows = list(executor.map(run_job, self._jobs(points)))
+        return self.table(rows)
+
+    # batches of candidates picked by expected improvement, one batch per pool round
+    def run_bayesian(self, iterations: int, initial: int = 0, seed: int = 0, candidates: int = 2000) -> pd.DataFrame:
+        rng = random.Random(seed)
+        initial = initial or self.workers
+        rows = []
+        with self._executor() as executor:
+            rows.extend(executor.map(run_job, self._jobs([self.space.sample(rng) for _ in range(initial)])))
+            while len(rows) < iterations:
+                observed = np.array([self.space.normalise(row) for row in rows])
+                scores = np.array([row["total_pnl"] for row in rows])
+                pool = [self.space.sample(rng) for _ in range(candidates)]
+                gains = _expected_improvement(observed, scores, np.array([self.space.normalise(point) for point in pool]))
+                batch = [pool[i] for i in np.argsort(-gains)[: min(self.workers, iterations - len(rows))]]
+                rows.extend(executor.map(run_job, self._jobs(batch)))
+        return self.table(rows)
+
+    def table(self, rows: list[dict[str, Any]]) -> pd.DataFrame:
+        frame = pd.DataFrame(rows)
+        return frame.sort_values("total_pnl", ascending=False, ignore_index=True)
+
+
+# "KELP.mm_epsilon=0,1,2" gives choices, "SQUID_INK.exponential_param=0.01:0.5" a range
+def parse_param(text: str) -> tuple[str, Any]:
+    key, _, values = text.partition("=")
+
+    def number(value: str):
+        return float(value) if any(c in value for c in ".eE") else int(value)
+
+    if ":" in values:
+        low, high = values.split(":")
+        return key, (number(low), number(high))
+    return key, [number(value) for value in values.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="sweep PRODUCT_PARAMS over a backtest in parallel")
+    parser.add_argument("log")
+    parser.add_argument("--param", action="append", required=True, help="PRODUCT.key=v1,v2,... or PRODUCT.key=low:high")
+    parser.add_argument("--mode", default="grid", choices=["grid", "random", "bayes"])
+    parser.add_argument("--samples", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--trader", default="trader.py")
+    parser.add_argument("--match-trades", default="all", choices=MATCH_TRADES_MODES)
+    parser.add_argument("--out", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    space = SearchSpace(dict(parse_param(text) for text in args.param))
+    sweep = Sweep(args.log, space, trader_path=args.trader, match_trades=args.match_trades, workers=args.workers)
+
+    if args.mode == "grid":
+        table = sweep.run(space.grid())
+    elif args.mode == "random":
+        table = sweep.run(space.random(args.samples, args.seed))
+    else:
+        table = sweep.run_bayesian(args.samples, seed=args.seed)
+
+    table.to_csv(args.out, index=False)
+    print(table.head(20).to_string())
+
+
+if __name__ == "__main__":
+    main()
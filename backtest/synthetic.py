@@ -0,0 +1,226 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest.data import CONVERSION_FIELDS, MarketData
+
+DEFAULT_TICKS = 10000
+DEFAULT_DEPTH = 3
+TICK_INTERVAL = 100
+BOTS = ("Amelia", "Caesar", "Camilla", "Charlie", "Gary", "Gina", "Olivia", "Paris", "Penelope", "Pablo")
+
+MEAN_REVERTING = "mean_reverting"
+TRENDING = "trending"
+RANDOM_WALK = "random_walk"
+
+
+class ProductSpec:
+
+    # price process and book shape of one product, prices in whole ticks
+    def __init__(
+        self,
+        name: str,
+        start: float,
+        kind: str = RANDOM_WALK,
+        volatility: float = 1.0,
+        reversion: float = 0.01,
+        drift: float = 0.0,
+        half_spread: int = 2,
+        depth: int = DEFAULT_DEPTH,
+        max_volume: int = 30,
+        trade_rate: float = 0.05,
+    ):
+        if kind not in (MEAN_REVERTING, TRENDING, RANDOM_WALK):
+            raise ValueError(f"unknown price process {kind!r}")
+        self.name = name
+        self.start = start
+        self.kind = kind
+        self.volatility = volatility
+        # pull towards start per tick, mean_reverting only
+        self.reversion = reversion
+        # expected move per tick, trending only
+        self.drift = drift
+        self.half_spread = half_spread
+        self.depth = depth
+        self.max_volume = max_volume
+        # expected bot trades per tick
+        self.trade_rate = trade_rate
+
+
+# a mix of processes like the real round, SQUID_INK style mean reversion included
+def default_specs(count: int, depth: int = DEFAULT_DEPTH, seed: int = 0) -> list[ProductSpec]:
+    rng = np.random.default_rng(seed)
+    kinds = (MEAN_REVERTING, TRENDING, RANDOM_WALK)
+    specs = []
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        specs.append(ProductSpec(
+            f"SYNTH_{i:03d}",
+            start=float(rng.integers(1000, 20000)),
+            kind=kind,
+            volatility=float(rng.uniform(0.5, 3.0)),
+            reversion=float(rng.uniform(0.005, 0.05)),
+            drift=float(rng.choice((-1, 1)) * rng.uniform(0.005, 0.02)),
+            half_spread=int(rng.integers(1, 4)),
+            depth=depth,
+        ))
+    return specs
+
+
+class SyntheticMarket:
+
+    # conversion_products get a ConversionObservation every tick priced off their own mid
+    def __init__(self, specs: list[ProductSpec], ticks: int = DEFAULT_TICKS, seed: int = 0, conversion_products: tuple[str, ...] = ()):
+        self.specs = specs
+        self.ticks = ticks
+        self.rng = np.random.default_rng(seed)
+        self.conversion_products = conversion_products
+        self.timestamps = np.arange(ticks, dtype=np.int64) * TICK_INTERVAL
+
+        self.mids = self.generate_mids()
+        self.activities = self.generate_activities()
+        self.trades = self.generate_trades()
+        self.observations = self.generate_observations()
+
+    @property
+    def products(self) -> list[str]:
+        return [spec.name for spec in self.specs]
+
+    # [tick, product] fair prices, every product stepped together
+    def generate_mids(self) -> np.ndarray:
+        specs = self.specs
+        start = np.array([spec.start for spec in specs])
+        volatility = np.array([spec.volatility for spec in specs])
+        reversion = np.array([spec.reversion if spec.kind == MEAN_REVERTING else 0.0 for spec in specs])
+        drift = np.array([spec.drift if spec.kind == TRENDING else 0.0 for spec in specs])
+
+        shocks = self.rng.standard_normal((self.ticks, len(specs))) * volatility + drift
+        if not reversion.any():
+            return start + np.cumsum(shocks, axis=0)
+        # ornstein-uhlenbeck needs the previous value, so step through time with every product at once
+        mids = np.empty((self.ticks, len(specs)))
+        mid = start.copy()
+        for tick in range(self.ticks):
+            mid = mid + reversion * (start - mid) + shocks[tick]
+            mids[tick] = mid
+        return mids
+
+    def generate_activities(self) -> pd.DataFrame:
+        ticks, count = self.mids.shape
+        depth = max(spec.depth for spec in self.specs)
+        half_spread = np.array([spec.half_spread for spec in self.specs])
+        max_volume = np.array([spec.max_volume for spec in self.specs])
+        spec_depth = np.array([spec.depth for spec in self.specs])
+
+        centre = np.round(self.mids)
+        best_bid = centre - half_spread
+        best_ask = centre + half_spread
+        # levels quoted per side this tick, at least one
+        bid_levels = self.rng.integers(1, spec_depth + 1, size=(ticks, count))
+        ask_levels = self.rng.integers(1, spec_depth + 1, size=(ticks, count))
+
+        columns = {
+            "day": np.zeros(ticks * count, dtype=np.int64),
+            "timestamp": np.repeat(self.timestamps, count),
+            "product": np.tile(np.array(self.products, dtype=object), ticks),
+        }
+        for side, best, levels, step in (("bid", best_bid, bid_levels, -1), ("ask", best_ask, ask_levels, 1)):
+            for level in range(depth):
+                quoted = level < levels
+                # deeper levels carry a little more size
+                volumes = self.rng.integers(1, max_volume + 1, size=(ticks, count)) + (depth - level)
+                columns[f"{side}_price_{level + 1}"] = np.where(quoted, best + step * level, np.nan).ravel()
+                columns[f"{side}_volume_{level + 1}"] = np.where(quoted, volumes, np.nan).ravel()
+        columns["mid_price"] = ((best_bid + best_ask) / 2).ravel()
+        columns["profit_and_loss"] = np.zeros(ticks * count)
+        return pd.DataFrame(columns)
+
+    # bots hit the touch, buyers lift the ask and sellers hit the bid
+    def generate_trades(self) -> pd.DataFrame:
+        rates = np.array([spec.trade_rate for spec in self.specs])
+        counts = self.rng.poisson(rates, size=self.mids.shape)
+        tick_index, column_index = np.nonzero(counts)
+        repeats = counts[tick_index, column_index]
+        ticks = np.repeat(tick_index, repeats)
+        columns = np.repeat(column_index, repeats)
+        half_spread = np.array([spec.half_spread for spec in self.specs])[columns]
+        buying = self.rng.random(len(ticks)) < 0.5
+        centre = np.round(self.mids[ticks, columns])
+        buyers = self.rng.choice(BOTS, size=len(ticks))
+        sellers = self.rng.choice(BOTS, size=len(ticks))
+        return pd.DataFrame({
+            "timestamp": self.timestamps[ticks],
+            "buyer": buyers,
+            "seller": sellers,
+            "symbol": np.array(self.products, dtype=object)[columns],
+            "currency": "SEASHELLS",
+            "price": np.where(buying, centre + half_spread, centre - half_spread),
+            "quantity": self.rng.integers(1, 6, size=len(ticks)),
+        })
+
+    # the foreign market quotes around our own mid, fees and tariffs wander slowly
+    def generate_observations(self) -> pd.DataFrame:
+        frames = []
+        for product in self.conversion_products:
+            column = self.products.index(product)
+            mid = self.mids[:, column]
+
+            def walk(start: float, scale: float) -> np.ndarray:
+                return start + np.cumsum(self.rng.standard_normal(self.ticks) * scale)
+
+            spread = np.abs(walk(1.5, 0.01)) + 0.5
+            offset = walk(0.0, 0.05)
+            frames.append(pd.DataFrame({
+                "timestamp": self.timestamps,
+                "product": product,
+                "bidPrice": np.round(mid + offset - spread, 1),
+                "askPrice": np.round(mid + offset + spread, 1),
+                "transportFees": np.round(np.abs(walk(1.0, 0.01)), 1),
+                "exportTariff": np.round(walk(9.0, 0.02), 1),
+                "importTariff": np.round(walk(-3.0, 0.02), 1),
+                "sugarPrice": np.round(walk(200.0, 0.2), 4),
+                "sunlightIndex": np.round(np.clip(walk(60.0, 0.1), 0, 100), 2),
+            }, columns=["timestamp", "product", *CONVERSION_FIELDS]))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def to_market_data(self) -> MarketData:
+        return MarketData.from_frames(self.activities, self.trades, self.observations)
+
+    # same layout as an exchange log, so logparser, LogCache and the backtester read it unchanged
+    def write_log(self, path: str) -> None:
+        with open(path, "w") as file:
+            file.write("Sandbox logs:\n")
+            for timestamp in self.timestamps.tolist():
+                file.write(json.dumps({"sandboxLog": "", "lambdaLog": "", "timestamp": timestamp}, indent=2) + "\n")
+            file.write("\n\n\nActivities log:\n")
+            self.activities.to_csv(file, sep=";", index=False, float_format="%.10g")
+            if len(self.observations):
+                file.write("\n\n\nObservations log:\n")
+                self.observations.to_csv(file, sep=";", index=False)
+            file.write("\n\n\n\nTrade History:\n")
+            # numpy scalars can slip through to_dict, item() turns them into plain numbers
+            file.write(json.dumps(self.trades.astype({"price": float}).to_dict("records"), indent=2, default=lambda value: value.item()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="write a synthetic prosperity log for load testing")
+    parser.add_argument("output")
+    parser.add_argument("--products", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="book levels per side")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--conversions", default="", help="comma separated products that get conversion observations")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conversions = tuple(product for product in args.conversions.split(",") if product)
+    market = SyntheticMarket(default_specs(args.products, args.depth, args.seed), args.ticks, args.seed, conversions)
+    market.write_log(args.output)
+    print(f"{args.ticks} ticks, {args.products} products, depth {args.depth} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
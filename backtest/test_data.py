@@ -0,0 +1,18 @@
+import pandas as pd
+
+from backtest.data import MarketData
+
+
+def test_empty_books_keep_the_last_mid():
+    # the exchange logs a mid of 0 once a book empties, KELP has no quote at all on the first tick
+    activities = pd.DataFrame({
+        "timestamp": [0, 0, 100, 100, 200, 200],
+        "product": ["KELP", "SQUID_INK", "KELP", "SQUID_INK", "KELP", "SQUID_INK"],
+        "mid_price": [0.0, 1999.5, 2001.0, 0.0, 2002.5, float("nan")],
+        "bid_price_1": [float("nan"), 1999, 2000, float("nan"), 2002, float("nan")],
+        "bid_volume_1": [float("nan"), 5, 5, float("nan"), 5, float("nan")],
+        "ask_price_1": [float("nan"), 2000, 2002, float("nan"), 2003, float("nan")],
+        "ask_volume_1": [float("nan"), 5, 5, float("nan"), 5, float("nan")],
+    })
+    data = MarketData.from_frames(activities, pd.DataFrame())
+    assert data.mid_prices == [{"SQUID_INK": 1999.5}, {"KELP": 2001.0, "SQUID_INK": 1999.5}, {"KELP": 2002.5, "SQUID_INK": 1999.5}]
@@ -0,0 +1,61 @@
+import pytest
+
+from datamodel import Order
+from backtest.data import SUBMISSION
+from backtest.fills import QueueFillModel
+from backtest.model import OrderDepth, Trade
+
+
+def book(buy_orders: dict[int, int], sell_orders: dict[int, int]) -> OrderDepth:
+    order_depth = OrderDepth()
+    order_depth.buy_orders = buy_orders
+    order_depth.sell_orders = sell_orders
+    return order_depth
+
+
+def fills(priority: str, orders: list[Order], order_depth: OrderDepth, prints: list[tuple[int, int]]) -> list[tuple]:
+    trades = [Trade("KELP", price, quantity, "BUYER", "SELLER", 100) for price, quantity in prints]
+    matched = QueueFillModel(priority).match("KELP", [(order, abs(order.quantity)) for order in orders], order_depth, trades, 100)
+    return [(trade.price, trade.quantity, trade.buyer, trade.seller) for trade in matched]
+
+
+def test_queue_waits_behind_the_displayed_volume():
+    order_depth = book({100: 10}, {})
+    # the first print only eats into the 10 ahead of us, the second reaches us with what is left over
+    assert fills("queue", [Order("KELP", 100, 5)], order_depth, [(100, 8), (100, 6)]) == [(100, 4, SUBMISSION, "SELLER")]
+
+
+def test_queue_on_the_ask_side():
+    order_depth = book({}, {101: -4})
+    assert fills("queue", [Order("KELP", 101, -5)], order_depth, [(101, 6)]) == [(101, 2, "BUYER", SUBMISSION)]
+
+
+def test_prints_through_our_price_fill_us_first():
+    order_depth = book({100: 10}, {})
+    # a print below our bid means the seller went through us, whatever was displayed at our price
+    assert fills("queue", [Order("KELP", 100, 5)], order_depth, [(99, 3)]) == [(100, 3, SUBMISSION, "SELLER")]
+    assert fills("pro_rata", [Order("KELP", 100, 5)], order_depth, [(99, 3)]) == [(100, 3, SUBMISSION, "SELLER")]
+
+
+def test_pro_rata_shares_the_print_by_size():
+    order_depth = book({100: 30}, {})
+    # 10 of the 40 resting at 100 is ours, so a quarter of the print
+    assert fills("pro_rata", [Order("KELP", 100, 10)], order_depth, [(100, 8)]) == [(100, 2, SUBMISSION, "SELLER")]
+    # the queue would have given us nothing
+    assert fills("queue", [Order("KELP", 100, 10)], order_depth, [(100, 8)]) == []
+
+
+def test_better_prices_fill_first():
+    order_depth = book({}, {})
+    orders = [Order("KELP", 99, 4), Order("KELP", 100, 5)]
+    assert fills("queue", orders, order_depth, [(99, 7)]) == [(100, 5, SUBMISSION, "SELLER"), (99, 2, SUBMISSION, "SELLER")]
+
+
+def test_fills_never_exceed_the_order():
+    order_depth = book({100: 2}, {})
+    assert fills("pro_rata", [Order("KELP", 100, 3)], order_depth, [(100, 50), (99, 50)]) == [(100, 3, SUBMISSION, "SELLER")]
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        QueueFillModel("fifo")
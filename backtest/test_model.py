@@ -0,0 +1,10 @@
+import datamodel
+from backtest import model
+
+
+def test_observation_prints_like_datamodel():
+    values = (1.5, 2.0, 1, 2, -3, 50.25, 60)
+    expected = datamodel.Observation({"SQUID_INK": 3}, {"MAGNIFICENT_MACARONS": datamodel.ConversionObservation(*values)})
+    observation = model.Observation({"SQUID_INK": 3}, {"MAGNIFICENT_MACARONS": model.ConversionObservation(*values)})
+    assert str(observation) == str(expected)
+    assert str(model.Observation({}, {})) == str(datamodel.Observation({}, {}))
@@ -0,0 +1,221 @@
+import argparse
+import copy
+import hashlib
+import json
+import math
+import os
+import tempfile
+from typing import Any, Optional
+
+import pandas as pd
+
+from backtest.engine import MATCH_TRADES_MODES, load_trader
+from backtest.sweep import SearchSpace, apply_overrides, parse_param, run_job, worker_pool
+from logcache import file_hash
+
+DEFAULT_RESULT_DIR = ".evalcache"
+# part of every result key, bump when the row layout changes
+RESULT_VERSION = 1
+# days the parameters are tuned on before each test day
+DEFAULT_TRAIN_DAYS = 2
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_PACKAGE_DIR)
+
+
+# modules that turn a log and its orders into pnl, model and datamodel being the types the engine and trader trade in
+CODE_FILES = (
+    os.path.join(_PACKAGE_DIR, "engine.py"),
+    os.path.join(_PACKAGE_DIR, "data.py"),
+    os.path.join(_PACKAGE_DIR, "fills.py"),
+    os.path.join(_PACKAGE_DIR, "model.py"),
+    os.path.join(_ROOT_DIR, "datamodel.py"),
+    os.path.join(_ROOT_DIR, "logparser.py"),
+    os.path.join(_ROOT_DIR, "logcache.py"),
+    os.path.join(_ROOT_DIR, "logdecoder.py"),
+)
+
+
+# the trader plus CODE_FILES, any edit there invalidates every result. tooling, tests and benchmarks are left out
+def code_hash(trader_path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    paths = [trader_path, *CODE_FILES]
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def params_hash(params: dict, match_trades: str) -> str:
+    payload = json.dumps({"params": params, "match_trades": match_trades, "version": RESULT_VERSION}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+
+    # one small json per (day, params, code), day being the log's content hash
+    def __init__(self, directory: str = DEFAULT_RESULT_DIR):
+        self.directory = directory
+
+    def path(self, day: str, params: str, code: str) -> str:
+        return os.path.join(self.directory, day, f"{params}-{code}.json")
+
+    def get(self, day: str, params: str, code: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.path(day, params, code)) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, day: str, params: str, code: str, row: dict[str, Any]) -> None:
+        path = self.path(day, params, code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, a killed run never leaves half a result behind
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(handle, "w") as file:
+            json.dump(row, file)
+        os.replace(temporary, path)
+
+
+# several points on one day in a single task, so the worker that runs it only needs that day
+def _run_day(job: tuple[str, list[dict[str, Any]]]) -> list[dict[str, Any]]:
+    log_path, points = job
+    return [run_job((log_path, point)) for point in points]
+
+
+class WalkForward:
+
+    # days in order. each fold tunes on the train_days before a day (or all of them when expanding)
+    # and reports the best point's pnl on that day, which it never saw
+    def __init__(
+        self,
+        log_paths: list[str],
+        trader_path: str = "trader.py",
+        match_trades: str = "all",
+        train_days: int = DEFAULT_TRAIN_DAYS,
+        expanding: bool = False,
+        workers: Optional[int] = None,
+        result_dir: str = DEFAULT_RESULT_DIR,
+        log_cache: Optional[str] = None,
+    ):
+        if not 0 < train_days < len(log_paths):
+            raise ValueError(f"need more than train_days={train_days} days, got {len(log_paths)}")
+        self.log_paths = log_paths
+        self.trader_path = trader_path
+        self.match_trades = match_trades
+        self.train_days = train_days
+        self.expanding = expanding
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = ResultCache(result_dir)
+        self.log_cache = log_cache
+
+        self.days = [file_hash(path) for path in log_paths]
+        self.code = code_hash(trader_path)
+        self.base_params = copy.deepcopy(load_trader(trader_path, module_name="walkforward_trader").PRODUCT_PARAMS)
+        # (day index, point key) -> row, everything evaluated or loaded so far
+        self.results: dict[tuple[int, str], dict[str, Any]] = {}
+        self.computed = 0
+
+    def folds(self) -> list[tuple[list[int], int]]:
+        return [
+            (list(range(0 if self.expanding else test - self.train_days, test)), test)
+            for test in range(self.train_days, len(self.log_paths))
+        ]
+
+    @staticmethod
+    def point_key(point: dict[str, Any]) -> str:
+        return json.dumps(point, sort_keys=True)
+
+    # every (day, point) pair not known yet, from the disk cache when possible, the rest in parallel
+    def evaluate(self, pairs: list[tuple[int, dict[str, Any]]]) -> None:
+        missing = []
+        for day, point in pairs:
+            key = (day, self.point_key(point))
+            if key in self.results:
+                continue
+            digest = params_hash(apply_overrides(self.base_params, point), self.match_trades)
+            row = self.cache.get(self.days[day], digest, self.code)
+            if row is None:
+                missing.append((day, point, digest))
+            else:
+                self.results[key] = row
+        # one job per pair even if listed twice
+        missing = list({(day, self.point_key(point)): (day, point, digest) for day, point, digest in missing}.values())
+        if not missing:
+            return
+
+        # one task per day, each day's points only split further while there are fewer tasks than workers
+        by_day: dict[int, list[tuple[int, dict[str, Any], str]]] = {}
+        for job in missing:
+            by_day.setdefault(job[0], []).append(job)
+        splits = math.ceil(self.workers / len(by_day))
+        tasks = [day_jobs[i::splits] for day_jobs in by_day.values() for i in range(min(splits, len(day_jobs)))]
+
+        log_paths = [self.log_paths[day] for day in by_day]
+        with worker_pool(min(self.workers, len(tasks)), log_paths, self.trader_path, self.match_trades, self.log_cache) as executor:
+            results = executor.map(_run_day, [(self.log_paths[task[0][0]], [point for _, point, _ in task]) for task in tasks])
+            for task, rows in zip(tasks, results):
+                for (day, point, digest), row in zip(task, rows):
+                    self.cache.put(self.days[day], digest, self.code, row)
+                    self.results[(day, self.point_key(point))] = row
+                    self.computed += 1
+
+    def run(self, points: list[dict[str, Any]]) -> pd.DataFrame:
+        folds = self.folds()
+        train_days = sorted({day for train, _ in folds for day in train})
+        self.evaluate([(day, point) for day in train_days for point in points])
+
+        chosen = []
+        for train, test in folds:
+            scores = [sum(self.results[(day, self.point_key(point))]["total_pnl"] for day in train) / len(train) for point in points]
+            best = max(range(len(points)), key=scores.__getitem__)
+            chosen.append((train, test, points[best], scores[best]))
+        # untouched params on every test day too, the out of sample number has to beat that
+        self.evaluate([(test, point) for _, test, point, _ in chosen] + [(test, {}) for _, test in folds])
+
+        rows = []
+        for train, test, point, train_pnl in chosen:
+            rows.append({
+                "test_day": os.path.basename(self.log_paths[test]),
+                "train_days": ",".join(os.path.basename(self.log_paths[day]) for day in train),
+                **point,
+                "train_pnl": train_pnl,
+                "test_pnl": self.results[(test, self.point_key(point))]["total_pnl"],
+                "baseline_pnl": self.results[(test, self.point_key({}))]["total_pnl"],
+            })
+        return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="walk-forward evaluation of PRODUCT_PARAMS over several days")
+    parser.add_argument("logs", nargs="+", help="one log per day, oldest first")
+    parser.add_argument("--param", action="append", required=True, help="PRODUCT.key=v1,v2,... or PRODUCT.key=low:high")
+    parser.add_argument("--mode", default="grid", choices=["grid", "random"])
+    parser.add_argument("--samples", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--train-days", type=int, default=DEFAULT_TRAIN_DAYS)
+    parser.add_argument("--expanding", action="store_true", help="train on every earlier day rather than a fixed window")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--trader", default="trader.py")
+    parser.add_argument("--match-trades", default="all", choices=MATCH_TRADES_MODES)
+    parser.add_argument("--results", default=DEFAULT_RESULT_DIR, metavar="DIR", help="per day result cache")
+    parser.add_argument("--cache", default=None, metavar="DIR", help="keep parsed columns in DIR between runs")
+    parser.add_argument("--out", default="walkforward_results.csv")
+    args = parser.parse_args()
+
+    space = SearchSpace(dict(parse_param(text) for text in args.param))
+    points = space.grid() if args.mode == "grid" else space.random(args.samples, args.seed)
+    walk = WalkForward(
+        args.logs, trader_path=args.trader, match_trades=args.match_trades, train_days=args.train_days,
+        expanding=args.expanding, workers=args.workers, result_dir=args.results, log_cache=args.cache,
+    )
+    table = walk.run(points)
+
+    table.to_csv(args.out, index=False)
+    print(table.to_string())
+    print(f"out of sample: {table['test_pnl'].sum():,.1f} tuned vs {table['baseline_pnl'].sum():,.1f} untouched, "
+          f"{walk.computed} backtests run, {len(walk.results) - walk.computed} from cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from logparser import parse_log
+
+DEFAULT_CACHE_DIR = ".logcache"
+CACHE_VERSION = 2
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# columns stored as raw utf-8 blobs with offsets rather than categories
+TEXT_COLUMNS = {"sandboxLog", "lambdaLog", "traderData", "logs"}
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_column(directory: str, name: str, values: Any) -> dict[str, Any]:
+    path = os.path.join(directory, name)
+    if name in TEXT_COLUMNS:
+        encoded = [value.encode() for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(path + ".offsets.npy", offsets)
+        np.save(path + ".npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        return {"kind": "text"}
+
+    array = np.asarray(values)
+    if array.dtype.kind in "biuf":
+        np.save(path + ".npy", array)
+        return {"kind": "numeric"}
+
+    # low cardinality strings (products, bot names) become integer codes
+    categorical = pd.Categorical(values)
+    np.save(path + ".npy", categorical.codes.astype(np.int32))
+    return {"kind": "category", "categories": [str(category) for category in categorical.categories]}
+
+
+class _TextColumn:
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+    def tolist(self) -> list[str]:
+        blob = bytes(self.data)
+        offsets = self.offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+
+
+class CachedLog:
+
+    def __init__(self, directory: str, meta: dict[str, Any]):
+        self.directory = directory
+        self.meta = meta
+        self._frames: dict[str, pd.DataFrame] = {}
+
+    @property
+    def tables(self) -> list[str]:
+        return list(self.meta["tables"])
+
+    # raw memory-mapped arrays: numeric columns as is, category columns as int32 codes
+    def columns(self, table: str) -> dict[str, Any]:
+        result = {}
+        for name, info in self.meta["tables"][table]["columns"].items():
+            path = os.path.join(self.directory, table, name)
+            if info["kind"] == "text":
+                result[name] = _TextColumn(np.load(path + ".npy", mmap_mode="r"), np.load(path + ".offsets.npy", mmap_mode="r"))
+            else:
+                result[name] = np.load(path + ".npy", mmap_mode="r")
+        return result
+
+    def categories(self, table: str, column: str) -> list[str]:
+        return self.meta["tables"][table]["columns"][column]["categories"]
+
+    def frame(self, table: str) -> pd.DataFrame:
+        if table not in self._frames:
+            data = {}
+            for name, values in self.columns(table).items():
+                info = self.meta["tables"][table]["columns"][name]
+                if info["kind"] == "category":
+                    data[name] = pd.Categorical.from_codes(values, info["categories"])
+                elif info["kind"] == "text":
+                    data[name] = values.tolist()
+                else:
+                    data[name] = values
+            self._frames[table] = pd.DataFrame(data)
+        return self._frames[table]
+
+    @property
+    def sandbox(self) -> pd.DataFrame:
+        return self.frame("sandbox")
+
+    @property
+    def activities(self) -> pd.DataFrame:
+        return self.frame("activities")
+
+    @property
+    def trades(self) -> pd.DataFrame:
+        return self.frame("trades")
+
+    @property
+    def observations(self) -> pd.DataFrame:
+        return self.frame("observations")
+
+
+class LogCache:
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+    # hashing a big log still costs a full read, so remember it per (path, size, mtime)
+    def log_key(self, path: str) -> str:
+        stat = os.stat(path)
+        stamp = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        index = self._read_index()
+        if stamp not in index:
+            index[stamp] = file_hash(path)
+            self._write_index(index)
+        return index[stamp]
+
+    def _read_index(self) -> dict[str, str]:
+        try:
+            with open(self.index_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict[str, str]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(index, file)
+        os.replace(temporary, self.index_path)
+
+    def directory(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, path: str) -> Optional[CachedLog]:
+        directory = self.directory(self.log_key(path))
+        try:
+            with open(os.path.join(directory, "meta.json")) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION:
+            return None
+        return CachedLog(directory, meta)
+
+    def load(self, path: str) -> CachedLog:
+        cached = self.get(path)
+        if cached is not None:
+            return cached
+        parsed = parse_log(path)
+        return self.store(path, {"sandbox": parsed.sandbox, "activities": parsed.activities, "trades": parsed.trades, "observations": parsed.observations})
+
+    # extra tables (e.g. decoded logger output) can be added to an existing entry
+    def store(self, path: str, tables: dict[str, Any]) -> CachedLog:
+        key = self.log_key(path)
+        directory = self.directory(key)
+        existing = self.get(path)
+        meta = existing.meta if existing is not None else {"version": CACHE_VERSION, "source": os.path.abspath(path), "tables": {}}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for table, frame in tables.items():
+            # write next to the cache and rename, so readers never see half a table
+            staging = tempfile.mkdtemp(dir=self.cache_dir)
+            columns = {}
+            for name in frame:
+                columns[name] = _write_column(staging, name, frame[name])
+            target = os.path.join(directory, table)
+            os.makedirs(directory, exist_ok=True)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.replace(staging, target)
+            meta["tables"][table] = {"rows": len(next(iter(frame.values())) if isinstance(frame, dict) else frame), "columns": columns}
+
+        temporary = os.path.join(directory, "meta.json.tmp")
+        with open(temporary, "w") as file:
+            json.dump(meta, file)
+        os.replace(temporary, os.path.join(directory, "meta.json"))
+        return CachedLog(directory, meta)
+
+
+if __name__ == "__main__":
+    cached = LogCache().load(sys.argv[1])
+    for table in cached.tables:
+        print(table, cached.meta["tables"][table]["rows"], "rows")
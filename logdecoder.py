@@ -0,0 +1,253 @@
+import gc
+import json
+import sys
+from itertools import chain
+from typing import Iterable
+
+import numpy as np
+
+from logcache import DEFAULT_CACHE_DIR, LogCache
+from logger import ORDER_TAGS_RECORD
+from logparser import decode_strings, parse_log
+
+# field order matches Logger.compress_observations
+CONVERSION_FIELDS = ("bidPrice", "askPrice", "transportFees", "exportTariff", "importTariff", "sugarPrice", "sunlightIndex")
+
+BID = 1
+ASK = -1
+OWN = 0
+MARKET = 1
+
+TICK_DTYPE = np.dtype([("timestamp", np.int64), ("conversions", np.int64)])
+DEPTH_DTYPE = np.dtype([("tick", np.int32), ("symbol", np.int16), ("side", np.int8), ("price", np.int64), ("volume", np.int64)])
+TRADE_DTYPE = np.dtype([("tick", np.int32), ("kind", np.int8), ("symbol", np.int16), ("price", np.float64), ("quantity", np.int64), ("buyer", np.int16), ("seller", np.int16), ("timestamp", np.int64)])
+POSITION_DTYPE = np.dtype([("tick", np.int32), ("symbol", np.int16), ("position", np.int64)])
+ORDER_DTYPE = np.dtype([("tick", np.int32), ("symbol", np.int16), ("price", np.int64), ("quantity", np.int64), ("tag", np.int16)])
+PLAIN_OBSERVATION_DTYPE = np.dtype([("tick", np.int32), ("product", np.int16), ("value", np.float64)])
+CONVERSION_OBSERVATION_DTYPE = np.dtype([("tick", np.int32), ("product", np.int16)] + [(field, np.float64) for field in CONVERSION_FIELDS])
+
+# DecodedLogs attributes that are plain structured arrays
+ARRAY_TABLES = ("ticks", "depths", "trades", "positions", "orders", "plain_observations", "conversion_observations")
+
+
+class DecodedLogs:
+
+    def __init__(self):
+        self.ticks = np.empty(0, dtype=TICK_DTYPE)
+        self.depths = np.empty(0, dtype=DEPTH_DTYPE)
+        self.trades = np.empty(0, dtype=TRADE_DTYPE)
+        self.positions = np.empty(0, dtype=POSITION_DTYPE)
+        self.orders = np.empty(0, dtype=ORDER_DTYPE)
+        self.plain_observations = np.empty(0, dtype=PLAIN_OBSERVATION_DTYPE)
+        self.conversion_observations = np.empty(0, dtype=CONVERSION_OBSERVATION_DTYPE)
+        # codes used by the symbol/product and buyer/seller columns
+        self.symbols: list[str] = []
+        self.traders: list[str] = []
+        # codes of the orders' tag column, "" for orders logged without one
+        self.tags: list[str] = []
+        self.trader_data: list[str] = []
+        self.logs: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def symbol_code(self, symbol: str) -> int:
+        return self.symbols.index(symbol)
+
+    # best bid/ask per (tick, symbol), nan where a side is empty
+    def best_prices(self) -> tuple[np.ndarray, np.ndarray]:
+        shape = (len(self.ticks), len(self.symbols))
+        best_bid = np.full(shape, -np.inf)
+        best_ask = np.full(shape, np.inf)
+        bids = self.depths[self.depths["side"] == BID]
+        asks = self.depths[self.depths["side"] == ASK]
+        np.maximum.at(best_bid, (bids["tick"], bids["symbol"]), bids["price"])
+        np.minimum.at(best_ask, (asks["tick"], asks["symbol"]), asks["price"])
+        best_bid[np.isinf(best_bid)] = np.nan
+        best_ask[np.isinf(best_ask)] = np.nan
+        return best_bid, best_ask
+
+    # each emitted order next to the book it was sent into
+    def orders_vs_book(self) -> np.ndarray:
+        best_bid, best_ask = self.best_prices()
+        ticks, symbols = self.orders["tick"], self.orders["symbol"]
+        bid, ask = best_bid[ticks, symbols], best_ask[ticks, symbols]
+        buying = self.orders["quantity"] > 0
+        price = self.orders["price"]
+
+        result = np.empty(len(self.orders), dtype=ORDER_DTYPE.descr + [("best_bid", np.float64), ("best_ask", np.float64), ("mid", np.float64), ("crossing", np.bool_), ("edge", np.float64)])
+        for field in ORDER_DTYPE.names:
+            result[field] = self.orders[field]
+        result["best_bid"] = bid
+        result["best_ask"] = ask
+        result["mid"] = (bid + ask) / 2
+        # crossing orders take liquidity, the rest rest in the book
+        result["crossing"] = np.where(buying, price >= ask, price <= bid)
+        # positive edge means the order is priced better than mid for us
+        result["edge"] = np.where(buying, result["mid"] - price, price - result["mid"])
+        return result
+
+
+# code of every name in first seen order, new names get the next free code
+def _encode(names: list, codes: dict[str, int]) -> list[int]:
+    for name in dict.fromkeys(names):
+        codes.setdefault(name, len(codes))
+    return list(map(codes.__getitem__, names))
+
+
+# tags of one tick's orders from the Logger.print_order_tags line, "" for each when the line is missing or does not fit
+def _order_tags(logs: str, count: int) -> list[str]:
+    start = ("\n" + logs).find("\n" + ORDER_TAGS_RECORD)
+    if start != -1:
+        end = logs.find("\n", start)
+        tags = logs[start + len(ORDER_TAGS_RECORD):end if end != -1 else len(logs)].split()
+        if len(tags) == count:
+            return tags
+    return [""] * count
+
+
+def decode_lines(lines: Iterable[str]) -> DecodedLogs:
+    # the cyclic collector would otherwise walk the growing result again and again while the
+    # hundreds of thousands of containers of a day are made, nothing here builds a cycle
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode_lines(lines)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _decode_lines(lines: Iterable[str]) -> DecodedLogs:
+    lines = [line for line in lines if line and line.startswith("[")]
+    if lines:
+        # listings repeat verbatim every tick and are never decoded, so cut them before parsing
+        listings = json.dumps(json.loads(lines[0])[0][2], separators=(",", ":"))
+        lines = [line.replace(listings, "[]", 1) for line in lines]
+    # one C-level parse for every tick instead of one json.loads per line
+    rows = json.loads("[" + ",".join(lines) + "]") if lines else []
+
+    # setdefault hands out the next code the first time a name is seen
+    symbol_codes: dict[str, int] = {}
+    trader_codes: dict[str, int] = {}
+    tag_codes: dict[str, int] = {}
+    decoded = DecodedLogs()
+    if not rows:
+        return decoded
+
+    # every table is flattened with zip and chain, which stay in C, instead of a python loop per tick
+    states, orders, conversions, trader_data, logs = zip(*rows)
+    timestamps, _, _, order_depths, own_trades, market_trades, positions, observations = zip(*states)
+    decoded.trader_data = list(trader_data)
+    decoded.logs = list(logs)
+    ticks = np.arange(len(rows), dtype=np.int32)
+
+    decoded.ticks = np.empty(len(rows), dtype=TICK_DTYPE)
+    decoded.ticks["timestamp"] = timestamps
+    decoded.ticks["conversions"] = conversions
+
+    # one bid group and one ask group per (tick, symbol), each a {price: volume} dict
+    depth_symbols = _encode(list(chain.from_iterable(order_depths)), symbol_codes)
+    sides = list(chain.from_iterable(chain.from_iterable(map(dict.values, order_depths))))
+    counts = np.fromiter(map(len, sides), dtype=np.int64, count=len(sides))
+    depths = np.empty(int(counts.sum()), dtype=DEPTH_DTYPE)
+    depths["tick"] = np.repeat(np.repeat(np.repeat(ticks, list(map(len, order_depths))), 2), counts)
+    depths["symbol"] = np.repeat(np.repeat(np.array(depth_symbols, dtype=np.int16), 2), counts)
+    depths["side"] = np.repeat(np.resize(np.array([BID, ASK], dtype=np.int8), len(sides)), counts)
+    # prices are json object keys
+    depths["price"] = list(map(int, chain.from_iterable(sides)))
+    depths["volume"] = list(chain.from_iterable(map(dict.values, sides)))
+    decoded.depths = depths
+
+    trade_tables = []
+    for kind, trades_by_tick in ((OWN, own_trades), (MARKET, market_trades)):
+        flat = list(chain.from_iterable(trades_by_tick))
+        table = np.empty(len(flat), dtype=TRADE_DTYPE)
+        table["tick"] = np.repeat(ticks, list(map(len, trades_by_tick)))
+        table["kind"] = kind
+        if flat:
+            symbols, prices, quantities, buyers, sellers, trade_timestamps = zip(*flat)
+            table["symbol"] = _encode(list(symbols), symbol_codes)
+            table["price"] = prices
+            table["quantity"] = quantities
+            table["buyer"] = _encode([buyer or "" for buyer in buyers], trader_codes)
+            table["seller"] = _encode([seller or "" for seller in sellers], trader_codes)
+            table["timestamp"] = trade_timestamps
+        trade_tables.append(table)
+    trades = np.concatenate(trade_tables)
+    # own before market within a tick, as they were logged
+    decoded.trades = trades[np.argsort(trades["tick"], kind="stable")]
+
+    decoded.positions = np.empty(sum(map(len, positions)), dtype=POSITION_DTYPE)
+    decoded.positions["tick"] = np.repeat(ticks, list(map(len, positions)))
+    decoded.positions["symbol"] = _encode(list(chain.from_iterable(positions)), symbol_codes)
+    decoded.positions["position"] = list(chain.from_iterable(map(dict.values, positions)))
+
+    flat_orders = list(chain.from_iterable(orders))
+    decoded.orders = np.empty(len(flat_orders), dtype=ORDER_DTYPE)
+    decoded.orders["tick"] = np.repeat(ticks, list(map(len, orders)))
+    if flat_orders:
+        decoded.orders["symbol"] = _encode([order[0] for order in flat_orders], symbol_codes)
+        decoded.orders["price"] = [order[1] for order in flat_orders]
+        decoded.orders["quantity"] = [order[2] for order in flat_orders]
+        tags = chain.from_iterable(map(_order_tags, decoded.logs, map(len, orders)))
+        decoded.orders["tag"] = _encode(list(tags), tag_codes)
+
+    # a handful of products at most, a plain loop is fine
+    plain_rows, conversion_rows = [], []
+    for tick, (plain, conversion) in enumerate(observations):
+        for product, value in plain.items():
+            plain_rows.append((tick, symbol_codes.setdefault(product, len(symbol_codes)), value))
+        for product, values in conversion.items():
+            conversion_rows.append((tick, symbol_codes.setdefault(product, len(symbol_codes)), *values))
+    decoded.plain_observations = np.array(plain_rows, dtype=PLAIN_OBSERVATION_DTYPE)
+    decoded.conversion_observations = np.array(conversion_rows, dtype=CONVERSION_OBSERVATION_DTYPE)
+
+    decoded.symbols = list(symbol_codes)
+    decoded.traders = list(trader_codes)
+    decoded.tags = list(tag_codes)
+    return decoded
+
+
+def decode_log(path: str) -> DecodedLogs:
+    sandbox = parse_log(path, decode=False).sandbox
+    if sandbox.empty:
+        return decode_lines([])
+    # the escaped lambda logs of the whole day go through one json.loads instead of one per entry
+    return decode_lines(decode_strings(sandbox["lambdaLog"].tolist()))
+
+
+# decoded arrays live next to the parsed tables of the same log in the column cache
+def decode_cached(path: str, cache_dir: str = DEFAULT_CACHE_DIR) -> DecodedLogs:
+    cache = LogCache(cache_dir)
+    cached = cache.load(path)
+    # caches from before order tags were decoded lack decoded_tags and are rebuilt
+    if "decoded_tags" not in cached.tables:
+        decoded = decode_lines(cached.columns("sandbox")["lambdaLog"].tolist())
+        tables = {f"decoded_{name}": {field: getattr(decoded, name)[field] for field in getattr(decoded, name).dtype.names} for name in ARRAY_TABLES}
+        tables["decoded_ticks"]["traderData"] = decoded.trader_data
+        tables["decoded_ticks"]["logs"] = decoded.logs
+        tables["decoded_symbols"] = {"name": np.array(decoded.symbols, dtype=object)}
+        tables["decoded_traders"] = {"name": np.array(decoded.traders, dtype=object)}
+        tables["decoded_tags"] = {"name": np.array(decoded.tags, dtype=object)}
+        cached = cache.store(path, tables)
+
+    decoded = DecodedLogs()
+    for name in ARRAY_TABLES:
+        columns = cached.columns(f"decoded_{name}")
+        array = np.empty(cached.meta["tables"][f"decoded_{name}"]["rows"], dtype=getattr(decoded, name).dtype)
+        for field in array.dtype.names:
+            array[field] = columns[field]
+        setattr(decoded, name, array)
+    ticks = cached.columns("decoded_ticks")
+    decoded.trader_data = ticks["traderData"].tolist()
+    decoded.logs = ticks["logs"].tolist()
+    decoded.symbols = [cached.categories("decoded_symbols", "name")[code] for code in cached.columns("decoded_symbols")["name"]]
+    decoded.traders = [cached.categories("decoded_traders", "name")[code] for code in cached.columns("decoded_traders")["name"]]
+    decoded.tags = [cached.categories("decoded_tags", "name")[code] for code in cached.columns("decoded_tags")["name"]]
+    return decoded
+
+
+if __name__ == "__main__":
+    decoded = decode_log(sys.argv[1])
+    print(f"{len(decoded)} ticks, {len(decoded.depths)} book levels, {len(decoded.trades)} trades, {len(decoded.orders)} orders")
@@ -1,4 +1,5 @@
-import json
+from itertools import chain
+from json.encoder import encode_basestring_ascii
 from typing import Any, List
 import numpy as np
 
@@ -6,49 +7,102 @@ import numpy as np
 
 from datamodel import Listing, Observation, Order, OrderDepth, ProsperityEncoder, Symbol, Trade, TradingState
 
+# log priorities, lower numbers survive truncation longer and higher ones are dropped first
+LOG_ERROR = 0
+LOG_INFO = 1
+LOG_DEBUG = 2
+
+# stands in for the free-text fields while the rest of a flush is serialized, nothing real contains a NUL
+LOG_PLACEHOLDER = "\x00"
+ENCODED_LOG_PLACEHOLDER = encode_basestring_ascii(LOG_PLACEHOLDER)[1:-1]
+# starts the log line naming the step behind each logged order, the orders themselves keep the visualizer's layout
+ORDER_TAGS_RECORD = "order tags:"
+
+
 class Logger:
-    def __init__(self) -> None:
-        self.logs = ""
+    def __init__(self, verbosity: int = LOG_DEBUG) -> None:
+        # parallel lists of printed lines and their priorities, total length kept as they come in
+        self.lines: list[str] = []
+        self.priorities: list[int] = []
+        self.logs_length = 0
         self.max_log_length = 3750
-
-    def print(self, *objects: Any, sep: str = " ", end: str = "\n") -> None:
-        self.logs += sep.join(map(str, objects)) + end
+        self.verbosity = verbosity
+        # built once, json.dumps(cls=...) would construct a new encoder on every call. the compressed
+        # state is plain nested lists and dicts, so the circular reference bookkeeping is wasted work
+        self.encoder = ProsperityEncoder(separators=(",", ":"), check_circular=False)
+        # listings are fixed for a whole round, encoded again only when the symbols change
+        self.listing_symbols: tuple[Symbol, ...] = ()
+        self.encoded_listings = "[]"
+        # the traderData a tick starts with is normally what the trader returned the tick before
+        self.escaped_trader_data = ("", "")
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", priority: int = LOG_INFO) -> None:
+        if priority > self.verbosity:
+            return
+        line = sep.join(map(str, objects)) + end
+        self.lines.append(line)
+        self.priorities.append(priority)
+        self.logs_length += len(line)
 
     def flush(self, state: TradingState, orders: dict[Symbol, list[Order]], conversions: int, trader_data: str) -> None:
-        base_length = len(
-            self.to_json(
-                [
-                    self.compress_state(state, ""),
-                    self.compress_orders(orders),
-                    conversions,
-                    "",
-                    "",
-                ]
-            )
-        )
-
-        # We truncate state.traderData, trader_data, and self.logs to the same max. length to fit the log limit
-        max_item_length = (self.max_log_length - base_length) // 3
-
-        print(
-            self.to_json(
-                [
-                    self.compress_state(state, self.truncate(state.traderData, max_item_length)),
-                    self.compress_orders(orders),
-                    conversions,
-                    self.truncate(trader_data, max_item_length),
-                    self.truncate(self.logs, max_item_length),
-                ]
-            )
-        )
-
-        self.logs = ""
-
-    def compress_state(self, state: TradingState, trader_data: str) -> list[Any]:
+        # serialize once with placeholders where the listings and the three free-text fields go, then splice them in
+        head, listings_gap, state_tail, middle, tail = self.to_json(
+            [
+                self.compress_state(state, LOG_PLACEHOLDER, LOG_PLACEHOLDER),
+                self.compress_orders(orders),
+                conversions,
+                LOG_PLACEHOLDER,
+                LOG_PLACEHOLDER,
+            ]
+        ).split(ENCODED_LOG_PLACEHOLDER)
+        # unlike the free-text fields the listings are not a string, so the placeholder's quotes go too
+        state_tail = listings_gap[:-1] + self.encode_listings(state.listings) + state_tail[1:]
+        base_length = len(head) + len(state_tail) + len(middle) + len(tail)
+
+        # state.traderData and trader_data get at most a third each, the logs get whatever is left
+        budget = self.max_log_length - base_length
+        last_trader_data, last_escaped = self.escaped_trader_data
+        escaped = last_escaped if state.traderData == last_trader_data else self.escape(state.traderData)
+        state_trader_data = self.truncate(escaped, budget // 3)
+        escaped = self.escape(trader_data)
+        self.escaped_trader_data = (trader_data, escaped)
+        own_trader_data = self.truncate(escaped, budget // 3)
+        logs = self.select_logs(budget - len(state_trader_data) - len(own_trader_data))
+
+        print(head + state_trader_data + state_tail + own_trader_data + middle + logs + tail)
+
+        self.lines = []
+        self.priorities = []
+        self.logs_length = 0
+
+    # json string body without the surrounding quotes
+    def escape(self, value: str) -> str:
+        return encode_basestring_ascii(value)[1:-1]
+
+    # keep the most important records that fit, in the order they were printed
+    def select_logs(self, max_length: int) -> str:
+        # escaping never shortens text, so this cheap check rules out most ticks
+        if self.logs_length <= max_length:
+            logs = self.escape("".join(self.lines))
+            if len(logs) <= max_length:
+                return logs
+
+        marker = "..."
+        remaining = max_length - len(marker)
+        # one escape call for every line, the placeholder marks where one line ends and the next starts
+        escaped = self.escape(LOG_PLACEHOLDER.join(self.lines)).split(ENCODED_LOG_PLACEHOLDER)
+        keep = [False] * len(escaped)
+        for i in sorted(range(len(escaped)), key=self.priorities.__getitem__):
+            if len(escaped[i]) <= remaining:
+                keep[i] = True
+                remaining -= len(escaped[i])
+        return "".join(line for i, line in enumerate(escaped) if keep[i]) + marker
+
+    def compress_state(self, state: TradingState, trader_data: str, listings: Any) -> list[Any]:
         return [
             state.timestamp,
             trader_data,
-            self.compress_listings(state.listings),
+            listings,
             self.compress_order_depths(state.order_depths),
             self.compress_trades(state.own_trades),
             self.compress_trades(state.market_trades),
@@ -56,6 +110,13 @@ class Logger:
             self.compress_observations(state.observations),
         ]
 
+    def encode_listings(self, listings: dict[Symbol, Listing]) -> str:
+        symbols = tuple(listings)
+        if symbols != self.listing_symbols:
+            self.listing_symbols = symbols
+            self.encoded_listings = self.to_json(self.compress_listings(listings))
+        return self.encoded_listings
+
     def compress_listings(self, listings: dict[Symbol, Listing]) -> list[list[Any]]:
         compressed = []
         for listing in listings.values():
@@ -110,11 +171,29 @@ class Logger:
 
         return compressed
 
+    # one tag per order, in the order compress_orders lays them out. at error priority, so truncation drops it last
+    def print_order_tags(self, tags: dict[Symbol, list[str]]) -> None:
+        flat = list(chain.from_iterable(tags.values()))
+        if flat:
+            self.print(ORDER_TAGS_RECORD, *flat, priority=LOG_ERROR)
+
     def to_json(self, value: Any) -> str:
-        return json.dumps(value, cls=ProsperityEncoder, separators=(",", ":"))
+        return self.encoder.encode(value)
 
+    # value is already json-escaped, never cut an escape sequence in half
     def truncate(self, value: str, max_length: int) -> str:
         if len(value) <= max_length:
             return value
 
-        return value[: max_length - 3] + "..."
+        cut = max(max_length - 3, 0)
+        escape = value.rfind("\\", max(cut - 5, 0), cut)
+        if escape != -1:
+            # count the run of backslashes ending at escape, an odd run means escape starts a sequence
+            run_start = escape
+            while run_start > 0 and value[run_start - 1] == "\\":
+                run_start -= 1
+            if (escape - run_start) % 2 == 0:
+                length = 6 if value[escape + 1:escape + 2] == "u" else 2
+                if escape + length > cut:
+                    cut = escape
+        return value[:cut] + "..."
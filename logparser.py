@@ -1,34 +1,403 @@
 import json
+import mmap
+import os
+import re
+import sys
+from io import BytesIO
+from typing import Any, BinaryIO, Callable, Iterator, Optional, TextIO, Union
+
+import numpy as np
 import pandas as pd
-# hi team hihihihihihihihi
-from io import StringIO
-import csv
 
-LOG_FILE = r"61c9d3b3-794f-4e18-8e2f-ba1645ff73c0.log"
-LOG_FILE = r"C:\Users\SHArdow\Projects\github projects\prosperity 14032025\prosperity\61c9d3b3-794f-4e18-8e2f-ba1645ff73c0.log"
+SANDBOX = "sandbox"
+ACTIVITIES = "activities"
+TRADES = "trades"
+OBSERVATIONS = "observations"
+
+SECTION_HEADERS = {
+    "Sandbox logs:": SANDBOX,
+    "Activities log:": ACTIVITIES,
+    "Trade History:": TRADES,
+    # not in exchange logs, written by backtest.synthetic for conversion products
+    "Observations log:": OBSERVATIONS,
+}
+
+# the file is scanned as raw bytes, text is only decoded where a section needs it
+HEADER_SECTIONS = {header.encode(): section for header, section in SECTION_HEADERS.items()}
+
+# headers always start a line. anchoring on the newline keeps the scan of a block to one fast pass
+SECTION_HEADER = re.compile(b"|".join(map(re.escape, HEADER_SECTIONS)))
+LINE_SECTION_HEADER = re.compile(b"\n(" + SECTION_HEADER.pattern + b")")
+
+# semicolon separated sections, parsed the same way
+CSV_SECTIONS = (ACTIVITIES, OBSERVATIONS)
+
+ACTIVITY_DTYPES = {
+    "day": "int64",
+    "timestamp": "int64",
+    "product": "str",
+    **{f"{side}_{kind}_{level}": "float64" for side in ("bid", "ask") for kind in ("price", "volume") for level in range(1, 4)},
+    "mid_price": "float64",
+    "profit_and_loss": "float64",
+}
+
+OBSERVATION_DTYPES = {
+    "timestamp": "int64",
+    "product": "str",
+    **{field: "float64" for field in ("bidPrice", "askPrice", "transportFees", "exportTariff", "importTariff", "sugarPrice", "sunlightIndex")},
+}
+
+TRADE_DTYPES = {
+    "timestamp": "int64",
+    "buyer": "str",
+    "seller": "str",
+    "symbol": "str",
+    "currency": "str",
+    "price": "float64",
+    "quantity": "int64",
+}
+
+# bytes of text handled per step, this is what bounds memory
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+
+# raw newlines never appear inside json strings, so every entry sits on exactly five lines
+SANDBOX_ENTRY = re.compile(r'^\{\n  "sandboxLog": "(.*)",\n  "lambdaLog": "(.*)",\n  "timestamp": (-?\d+)\n\}$', re.M)
+
+Source = Union[str, TextIO, BinaryIO]
+
+
+class ParsedLog:
+
+    # sandbox may be a callable building the frame, it is then only called the first time the sandbox is read
+    def __init__(self, sandbox: Union[pd.DataFrame, Callable[[], pd.DataFrame]], activities: pd.DataFrame, trades: pd.DataFrame, observations: Optional[pd.DataFrame] = None):
+        self._sandbox = sandbox
+        self.activities = activities
+        self.trades = trades
+        self.observations = observations if observations is not None else pd.DataFrame()
+
+    @property
+    def sandbox(self) -> pd.DataFrame:
+        if not isinstance(self._sandbox, pd.DataFrame):
+            self._sandbox = self._sandbox()
+        return self._sandbox
+
+
+def _iter_blocks(source: Source, block_size: int) -> Iterator[Union[bytes, memoryview]]:
+    if isinstance(source, str):
+        with open(source, "rb") as file:
+            # a log given by path is mapped and cut into views, text is only copied out by the parsers that keep it
+            if os.fstat(file.fileno()).st_size == 0 or file.readline().endswith(b"\r\n"):
+                file.seek(0)
+                yield from _iter_blocks(file, block_size)
+                return
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(mapped)
+        start = 0
+        while start < len(data):
+            # always end on a full line so headers and csv rows are never split
+            end = mapped.find(b"\n", start + block_size - 1) + 1 or len(data)
+            yield data[start:end]
+            start = end
+        return
+
+    crlf = None
+    while True:
+        block = source.read(block_size)
+        if not block:
+            return
+        # always end on a full line so headers and csv rows are never split
+        if isinstance(block, str):
+            if not block.endswith("\n"):
+                block += source.readline()
+            block = block.encode()
+        elif not block.endswith(b"\n"):
+            block += source.readline()
+        # binary reads skip newline translation, a log saved with windows line endings is converted here
+        if crlf is None:
+            crlf = block.find(b"\r\n", 0, block.find(b"\n") + 1) != -1
+        if crlf:
+            block = block.replace(b"\r\n", b"\n")
+        yield block
+
+
+# split blocks into (section, text) runs, sections are found by their header line
+def _iter_section_text(source: Source, block_size: int) -> Iterator[tuple[Optional[str], Union[bytes, memoryview]]]:
+    section = None
+    for block in _iter_blocks(source, block_size):
+        first = SECTION_HEADER.match(block)
+        headers = [(0, first.group())] if first else []
+        headers += [(match.start(1), match.group(1)) for match in LINE_SECTION_HEADER.finditer(block)]
+
+        position = 0
+        for index, header in headers:
+            if index > position:
+                yield section, block[position:index]
+            section = HEADER_SECTIONS[header]
+            position = index + len(header)
+        if position < len(block):
+            yield section, block[position:]
+
+
+def decode_strings(raw: list[str]) -> list[str]:
+    # one C-level decode for the whole batch instead of one per entry
+    return json.loads('["' + '","'.join(raw) + '"]') if raw else []
+
+
+# sandboxLog and lambdaLog still json-escaped, plus the timestamp, of every entry in text
+def _sandbox_columns(text: bytes) -> tuple[list[str], list[str], list[int]]:
+    text = text.decode()
+    matches = SANDBOX_ENTRY.findall(text)
+    # every entry closes with a brace on its own line, anything the pattern missed is an unexpected layout
+    if len(matches) != text.count("\n}"):
+        records = json.loads("[" + re.sub(r"\}\s*\{", "},{", text.strip()) + "]")
+        return (
+            [json.dumps(record["sandboxLog"])[1:-1] for record in records],
+            [json.dumps(record["lambdaLog"])[1:-1] for record in records],
+            [record["timestamp"] for record in records],
+        )
+    if not matches:
+        return [], [], []
+    sandbox_logs, lambda_logs, timestamps = zip(*matches)
+    return list(sandbox_logs), list(lambda_logs), list(map(int, timestamps))
+
+
+class _SandboxParser:
+
+    def __init__(self, decode: bool):
+        self.decode = decode
+        self.pending = b""
+
+    def feed(self, text: Union[bytes, memoryview]) -> list[dict[str, Any]]:
+        return self.parse(self.complete(text))
+
+    def finish(self) -> list[dict[str, Any]]:
+        text, self.pending = self.pending, b""
+        return self.parse(text) if text and not text.isspace() else []
+
+    # the entries text completes, an entry cut off at the end of a block waits for the next one
+    def complete(self, text: Union[bytes, memoryview]) -> bytes:
+        text = self.pending + text
+        end = text.rfind(b"\n}")
+        if end == -1:
+            self.pending = text
+            return b""
+        end += 2
+        self.pending = text[end:]
+        return text[:end]
+
+    def parse(self, text: bytes) -> list[dict[str, Any]]:
+        sandbox_logs, lambda_logs, timestamps = _sandbox_columns(text)
+        if self.decode:
+            sandbox_logs = decode_strings(sandbox_logs)
+            lambda_logs = decode_strings(lambda_logs)
+        return [
+            {"sandboxLog": sandbox_log, "lambdaLog": lambda_log, "timestamp": timestamp}
+            for sandbox_log, lambda_log, timestamp in zip(sandbox_logs, lambda_logs, timestamps)
+        ]
+
+
+# what parse_log does with the sandbox section: entries are only pulled out (and decoded) when ParsedLog.sandbox
+# is first read, most callers never look at it. a log given by path is read again then instead of holding
+# the text, which would be most of the file
+class _SandboxText:
+
+    def __init__(self, source: Source, block_size: int):
+        self.source = source if isinstance(source, str) else None
+        self.block_size = block_size
+        self.parts: list[Union[bytes, memoryview]] = []
+
+    def feed(self, text: Union[bytes, memoryview]) -> None:
+        if self.source is None:
+            self.parts.append(text)
+
+    def finish(self) -> None:
+        return None
+
+    def frame(self, decode: bool) -> pd.DataFrame:
+        if self.source is not None:
+            self.parts = (text for section, text in _iter_section_text(self.source, self.block_size) if section == SANDBOX)
+        # block by block, so the text is never held twice
+        parser = _SandboxParser(decode)
+        sandbox_logs, lambda_logs, timestamps = [], [], []
+
+        def add(text: bytes) -> None:
+            for column, values in zip((sandbox_logs, lambda_logs, timestamps), _sandbox_columns(text)):
+                column.extend(values)
+
+        for text in self.parts:
+            add(parser.complete(text))
+        add(parser.pending)
+        self.parts = []
+        if not timestamps:
+            return pd.DataFrame()
+        if decode:
+            sandbox_logs = decode_strings(sandbox_logs)
+            lambda_logs = decode_strings(lambda_logs)
+        return pd.DataFrame({"sandboxLog": sandbox_logs, "lambdaLog": lambda_logs, "timestamp": np.array(timestamps, dtype=np.int64)})
+
+
+class _TradeParser:
+
+    def __init__(self):
+        self.pending = b""
+
+    def feed(self, text: Union[bytes, memoryview]) -> list[dict[str, Any]]:
+        text = self.pending + text
+        # trade objects are flat, so the last closing brace ends a complete object
+        end = text.rfind(b"}")
+        if end == -1:
+            self.pending = text
+            return []
+        self.pending = text[end + 1:]
+        return self.parse(text[: end + 1])
+
+    def finish(self) -> list[dict[str, Any]]:
+        text, self.pending = self.pending, b""
+        return self.parse(text)
+
+    def parse(self, text: bytes) -> list[dict[str, Any]]:
+        text = text.strip().lstrip(b"[").lstrip(b",").rstrip(b"]").strip()
+        return json.loads(b"[" + text + b"]") if text else []
+
+
+class _CsvParser:
+
+    # whole keeps the blocks and reads the section in one go when it ends, for parse_log which holds it all anyway
+    def __init__(self, dtypes: dict[str, str], whole: bool = False):
+        self.dtypes = dtypes
+        self.whole = whole
+        self.header: Optional[bytes] = None
+        self.pending = b""
+        self.parts: list[Union[bytes, memoryview]] = []
+
+    def feed(self, text: Union[bytes, memoryview]) -> Optional[pd.DataFrame]:
+        if self.whole:
+            self.parts.append(text)
+            return None
+        text = (self.pending + text).lstrip(b"\n")
+        self.pending = b""
+        if self.header is None:
+            newline = text.find(b"\n")
+            if newline == -1:
+                self.pending = text
+                return None
+            self.header, text = text[: newline + 1], text[newline + 1:]
+        if not text or text.isspace():
+            return None
+        return self.parse(self.header + text)
+
+    # every section carries its own header line
+    def finish(self) -> Optional[pd.DataFrame]:
+        text, self.parts = b"".join(self.parts), []
+        self.header, self.pending = None, b""
+        # the reader skips the blank lines before the header
+        return self.parse(text) if text and not text.isspace() else None
+
+    def parse(self, text: bytes) -> pd.DataFrame:
+        # the reader types the columns as it goes, dtypes of columns a log does not have are ignored
+        return pd.read_csv(BytesIO(text), sep=";", dtype=self.dtypes)
+
+
+# built column by column, converting the records row by row costs more than decoding them
+def _trades_frame(records: list[dict[str, Any]]) -> pd.DataFrame:
+    columns = {column: [record.get(column) for record in records] for column in records[0]}
+    return pd.DataFrame({column: pd.array(values, dtype=TRADE_DTYPES[column]) if column in TRADE_DTYPES else values for column, values in columns.items()})
+
+
+# raw payloads per section: lists of dicts for sandbox/trades, typed frames for the csv sections.
+# parsers replaces the default parser of a section, a parser returning None keeps its section out of the payloads
+def _iter_payloads(source: Source, block_size: int, decode: bool, parsers: Optional[dict[str, Any]] = None) -> Iterator[tuple[str, Any]]:
+    parsers = {SANDBOX: _SandboxParser(decode), ACTIVITIES: _CsvParser(ACTIVITY_DTYPES), TRADES: _TradeParser(), OBSERVATIONS: _CsvParser(OBSERVATION_DTYPES), **(parsers or {})}
+    current = None
+
+    for section, text in _iter_section_text(source, block_size):
+        if section != current:
+            if current is not None:
+                payload = parsers[current].finish()
+                if payload is not None and len(payload):
+                    yield current, payload
+            current = section
+        if section is None:
+            continue
+        payload = parsers[section].feed(text)
+        if payload is not None and len(payload):
+            yield section, payload
+
+    if current is not None:
+        payload = parsers[current].finish()
+        if payload is not None and len(payload):
+            yield current, payload
+
+
+# single pass over the file, yields (section, record) in file order
+def iter_records(source: Source, block_size: int = DEFAULT_BLOCK_SIZE, decode: bool = True) -> Iterator[tuple[str, dict[str, Any]]]:
+    for section, payload in _iter_payloads(source, block_size, decode):
+        if section in CSV_SECTIONS:
+            for record in payload.to_dict("records"):
+                yield section, record
+        else:
+            for record in payload:
+                yield section, record
+
+
+def iter_sandbox_logs(source: Source, block_size: int = DEFAULT_BLOCK_SIZE, decode: bool = True) -> Iterator[dict[str, Any]]:
+    for section, record in iter_records(source, block_size, decode):
+        if section == SANDBOX:
+            yield record
+
 
-with open(LOG_FILE) as file:
-    file_lines = [line for line in file]
+def iter_activities(source: Source, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[dict[str, Any]]:
+    for section, record in iter_records(source, block_size, decode=False):
+        if section == ACTIVITIES:
+            yield record
 
-program_output_list = []
-for i in range(1, 10000, 5):
-    program_output_list.append(json.loads("\n".join(file_lines[i:i+5])))
 
-program_output_dataframe = pd.DataFrame([list(row.values()) for row in program_output_list], columns=list((program_output_list[0]).keys()))
+def iter_observations(source: Source, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[dict[str, Any]]:
+    for section, record in iter_records(source, block_size, decode=False):
+        if section == OBSERVATIONS:
+            yield record
 
 
+def iter_trades(source: Source, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[dict[str, Any]]:
+    for section, record in iter_records(source, block_size, decode=False):
+        if section == TRADES:
+            yield record
 
-activity_log = [row for row in csv.reader(StringIO("".join(file_lines[10005:14006])), delimiter=";")]
-activity_log_dataframe = pd.DataFrame(activity_log[1:], columns=activity_log[0])
 
+# bounded memory: each chunk covers at most one block of the file
+def iter_chunks(source: Source, block_size: int = DEFAULT_BLOCK_SIZE, decode: bool = True) -> Iterator[tuple[str, pd.DataFrame]]:
+    for section, payload in _iter_payloads(source, block_size, decode):
+        if section in CSV_SECTIONS:
+            yield section, payload
+        elif section == TRADES:
+            yield section, _trades_frame(payload)
+        else:
+            yield section, pd.DataFrame.from_records(payload)
 
-trade_data = json.loads("\n".join(file_lines[14011:]))
 
-trade_data_dataframe = pd.DataFrame([list(row.values()) for row in trade_data], columns=list((trade_data[0]).keys()))
+# decode=False leaves sandboxLog/lambdaLog json-escaped, decode them later with json.loads('"' + raw + '"').
+# the sandbox frame is built the first time ParsedLog.sandbox is read, so either way only callers that read it pay
+def parse_log(source: Source, block_size: int = DEFAULT_BLOCK_SIZE, decode: bool = True) -> ParsedLog:
+    sandbox = _SandboxText(source, block_size)
+    chunks: dict[str, list[pd.DataFrame]] = {ACTIVITIES: [], OBSERVATIONS: []}
+    trades: list[dict[str, Any]] = []
+    parsers = {SANDBOX: sandbox, ACTIVITIES: _CsvParser(ACTIVITY_DTYPES, whole=True), OBSERVATIONS: _CsvParser(OBSERVATION_DTYPES, whole=True)}
+    for section, payload in _iter_payloads(source, block_size, decode, parsers):
+        if section == TRADES:
+            trades.extend(payload)
+        else:
+            chunks[section].append(payload)
 
+    def combine(section: str) -> pd.DataFrame:
+        if not chunks[section]:
+            return pd.DataFrame()
+        return pd.concat(chunks[section], ignore_index=True) if len(chunks[section]) > 1 else chunks[section][0]
 
+    return ParsedLog(lambda: sandbox.frame(decode), combine(ACTIVITIES), _trades_frame(trades) if trades else pd.DataFrame(), combine(OBSERVATIONS))
 
 
-print(program_output_dataframe)
-print(activity_log_dataframe)
-print(trade_data_dataframe)
+if __name__ == "__main__":
+    parsed = parse_log(sys.argv[1])
+    print(parsed.sandbox)
+    print(parsed.activities)
+    print(parsed.trades)
@@ -0,0 +1,53 @@
+import math
+from itertools import product
+
+import numpy as np
+import pytest
+
+from arbitrage import MANUAL_ROUND_RATES, top_paths
+
+
+def brute_force(rates, hops, start, end, count):
+    walks = []
+    for middle in product(range(len(rates)), repeat=hops - 1):
+        path = (start, *middle, end)
+        multiplier = math.prod(rates[a][b] for a, b in zip(path, path[1:]))
+        if multiplier > 0:
+            walks.append((path, multiplier))
+    walks.sort(key=lambda walk: -walk[1])
+    return walks[:count]
+
+
+def check(rates, hops, start, end, count):
+    paths = top_paths(rates, hops, start, end, count)
+    expected = brute_force(rates, hops, start, end, count)
+    # ties can come back in any order, so the multipliers are compared and every path is checked on its own
+    assert [multiplier for _, multiplier in paths] == pytest.approx([multiplier for _, multiplier in expected])
+    assert len(set(path for path, _ in paths)) == len(paths)
+    for path, multiplier in paths:
+        assert len(path) == hops + 1 and path[0] == start and path[-1] == end
+        assert multiplier == pytest.approx(math.prod(rates[a][b] for a, b in zip(path, path[1:])))
+
+
+def test_manual_round():
+    check(MANUAL_ROUND_RATES, 5, 3, 3, 10)
+    assert top_paths(MANUAL_ROUND_RATES, 5, 3)[0] == ((3, 0, 2, 1, 0, 3), pytest.approx(1.08868, abs=1e-5))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_rates_match_brute_force(seed):
+    generator = np.random.default_rng(seed)
+    size = 5
+    rates = generator.uniform(0.5, 1.5, (size, size))
+    # some conversions missing
+    rates[generator.random((size, size)) < 0.2] = 0
+    rates = rates.tolist()
+    for hops in (1, 2, 4):
+        check(rates, hops, start=seed % size, end=(seed * 3) % size, count=7)
+
+
+def test_more_walks_asked_than_exist():
+    rates = [[0, 2], [0.5, 0]]
+    # only the back and forth walk exists
+    assert top_paths(rates, 2, 0, 0, 10) == [((0, 1, 0), 1.0)]
+    check(rates, 3, 0, 1, 10)
@@ -0,0 +1,140 @@
+import json
+import math
+from base64 import b64decode, b64encode
+
+import pytest
+
+from datamodel import Listing, Observation, OrderDepth, TradingState
+from logdecoder import decode_lines
+from trader import INDICATORS, PRIORITY_BASKET, PRIORITY_MAKE, PRIORITY_TAKE, PRODUCT_PARAMS, SERIES_QUANTUM, SMOOTHERS, OrderIntents, StateCodec, Trader
+
+
+def test_state_codec_round_trip():
+    codec = StateCodec()
+    states = [
+        # every value on the half tick grid, stored as int16 deltas
+        ([1.5, -2.25, math.pi], [[10000.0, 10000.5, 9999.0, 10001.5], [2015.5]]),
+        # off the grid and a jump too large for an int16 delta, both stored raw
+        ([], [[0.1, 0.2, 0.3], [0.0, 40000.0, 0.5]]),
+        # empty series and a product without any series
+        ([7.0], [[], []]),
+        ([], []),
+    ]
+    assert codec.decode(codec.encode(states)) == states
+
+
+def test_state_codec_quantized_series_is_smaller():
+    codec = StateCodec()
+    on_grid = [[2000.0 + SERIES_QUANTUM * (i % 7) for i in range(200)]]
+    off_grid = [[value + 0.01 for value in on_grid[0]]]
+    assert len(codec.encode([([], on_grid)])) < len(codec.encode([([], off_grid)])) / 2
+    assert codec.decode(codec.encode([([], on_grid)])) == [([], on_grid)]
+    assert codec.decode(codec.encode([([], off_grid)])) == [([], off_grid)]
+
+
+def test_state_codec_ignores_other_versions():
+    codec = StateCodec()
+    payload = bytearray(b64decode(codec.encode([([1.0], [[1.0, 2.0]])])))
+    payload[0] += 1
+    assert codec.decode(b64encode(bytes(payload)).decode()) == []
+
+
+def with_every_indicator() -> Trader:
+    trader = Trader()
+    for product in trader.products:
+        product.set_indicators(frozenset(INDICATORS))
+    return trader
+
+
+def test_trader_state_survives_a_restore():
+    trader = with_every_indicator()
+    for index, product in enumerate(trader.products):
+        product.popular_average, product.exponential_moving_average = 1000.0 + index, 1000.25 + index
+        for tick in range(50):
+            product.update_indicators(1000.0 + index + SERIES_QUANTUM * (tick % 5))
+    trader_data = trader.save_state()
+
+    restored = with_every_indicator()
+    restored.restore_state(trader_data)
+    assert restored.save_state() == trader_data
+
+
+def test_rolling_windows_only_for_strategies_that_read_them():
+    trader = Trader()
+    for product in trader.products:
+        assert (product.stats is not None) == ("rolling" in trader.strategies[product.name].indicators)
+        if product.stats is None and product.smoother is None:
+            assert product.history.capacity == 0
+
+
+def test_one_sided_books_do_not_break_quoting():
+    trader = Trader()
+    # only bids: no popular average or ema yet, every strategy has to sit the tick out
+    depths = {}
+    for name in ("KELP", "SQUID_INK", "CROISSANTS"):
+        depth = OrderDepth()
+        depth.buy_orders = {100: 5, 99: 3}
+        depths[name] = depth
+    state = TradingState("", 0, {name: Listing(name, name, "SEASHELLS") for name in depths}, depths, {}, {}, {}, Observation({}, {}))
+    orders, _, _ = trader.run(state)
+    assert not any(orders.values())
+
+
+@pytest.mark.parametrize("smoother", SMOOTHERS)
+def test_every_smoother_runs_live_and_survives_a_restore(smoother, monkeypatch):
+    monkeypatch.setitem(PRODUCT_PARAMS, "SQUID_INK", {**PRODUCT_PARAMS["SQUID_INK"], "smoother": smoother})
+    trader = Trader()
+    for tick in range(5):
+        depth = OrderDepth()
+        depth.buy_orders = {1999 + tick: 10}
+        depth.sell_orders = {2001 + 2 * tick: -10}
+        state = TradingState("", 100 * tick, {"SQUID_INK": Listing("SQUID_INK", "SQUID_INK", "SEASHELLS")}, {"SQUID_INK": depth}, {}, {}, {}, Observation({}, {}))
+        _, _, trader_data = trader.run(state)
+
+    restored = Trader()
+    restored.restore_state(trader_data)
+    assert restored.save_state() == trader_data
+    smoothed = [product.smoothed for product in trader.products if product.name == "SQUID_INK"]
+    assert [product.smoothed for product in restored.products if product.name == "SQUID_INK"] == smoothed
+    assert not math.isnan(smoothed[0])
+
+
+def test_allocate_nets_intents_that_would_cross():
+    intents = OrderIntents("KELP")
+    # a basket leg sold into the bid while market making bids above it
+    intents.add(100, -5, PRIORITY_BASKET, "basket")
+    intents.add(101, 3, PRIORITY_TAKE, "take")
+    intents.add(98, 4, PRIORITY_MAKE, "make")
+    intents.add(103, -2, PRIORITY_MAKE, "make")
+    orders = intents.allocate(position=0, limit=50)
+
+    assert sorted((order.price, order.quantity, tag) for order, tag in zip(orders, intents.tags)) == [(98, 4, "make"), (100, -2, "basket"), (103, -2, "make")]
+    buys = [order.price for order in orders if order.quantity > 0]
+    sells = [order.price for order in orders if order.quantity < 0]
+    assert max(buys) < min(sells)
+
+
+def test_allocate_caps_each_side_after_netting():
+    intents = OrderIntents("KELP")
+    intents.add(105, 30, PRIORITY_TAKE, "take")
+    intents.add(104, -10, PRIORITY_TAKE, "take")
+    intents.add(110, -40, PRIORITY_MAKE, "make")
+    orders = intents.allocate(position=15, limit=20)
+
+    # 20 left to buy after netting, capped at 5 more, and at most 35 to sell
+    assert [(order.price, order.quantity) for order in orders] == [(105, 5), (110, -35)]
+
+
+def test_logged_orders_keep_three_fields_and_tags_decode(capsys):
+    trader = Trader()
+    depth = OrderDepth()
+    depth.buy_orders = {1995: 10}
+    depth.sell_orders = {2005: -10}
+    state = TradingState("", 0, {"KELP": Listing("KELP", "KELP", "SEASHELLS")}, {"KELP": depth}, {}, {}, {}, Observation({}, {}))
+    orders, _, _ = trader.run(state)
+    line = capsys.readouterr().out.strip().splitlines()[-1]
+
+    assert orders["KELP"]
+    assert all(len(order) == 3 for order in json.loads(line)[1])
+    decoded = decode_lines([line])
+    assert [decoded.tags[code] for code in decoded.orders["tag"]] == trader.order_tags["KELP"]
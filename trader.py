@@ -1,52 +1,113 @@
-from typing import Any, List
+from typing import Any, Optional
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
+from collections import deque
+from time import perf_counter
+from base64 import b64decode, b64encode
+import math
+import struct
 import string
 import numpy as np
-import json
+from json.encoder import encode_basestring_ascii
 from datamodel import Listing, Observation, Order, OrderDepth, ProsperityEncoder, Symbol, Trade, TradingState
 
-class Logger:
-    def __init__(self) -> None:
-        self.logs = ""
-        self.max_log_length = 3750
+# log priorities, lower numbers survive truncation longer and higher ones are dropped first
+LOG_ERROR = 0
+LOG_INFO = 1
+LOG_DEBUG = 2
 
-    def print(self, *objects: Any, sep: str = " ", end: str = "\n") -> None:
-        self.logs += sep.join(map(str, objects)) + end
+# stands in for the free-text fields while the rest of a flush is serialized, nothing real contains a NUL
+LOG_PLACEHOLDER = "\x00"
+ENCODED_LOG_PLACEHOLDER = encode_basestring_ascii(LOG_PLACEHOLDER)[1:-1]
+# starts the log line naming the step behind each logged order, the orders themselves keep the visualizer's layout
+ORDER_TAGS_RECORD = "order tags:"
 
-    def flush(self, state: TradingState, orders: dict[Symbol, list[Order]], conversions: int, trader_data: str) -> None:
-        base_length = len(
-            self.to_json(
-                [
-                    self.compress_state(state, ""),
-                    self.compress_orders(orders),
-                    conversions,
-                    "",
-                    "",
-                ]
-            )
-        )
 
-        # We truncate state.traderData, trader_data, and self.logs to the same max. length to fit the log limit
-        max_item_length = (self.max_log_length - base_length) // 3
-
-        print(
-            self.to_json(
-                [
-                    self.compress_state(state, self.truncate(state.traderData, max_item_length)),
-                    self.compress_orders(orders),
-                    conversions,
-                    self.truncate(trader_data, max_item_length),
-                    self.truncate(self.logs, max_item_length),
-                ]
-            )
-        )
-
-        self.logs = ""
+class Logger:
+    def __init__(self, verbosity: int = LOG_DEBUG) -> None:
+        # parallel lists of printed lines and their priorities, total length kept as they come in
+        self.lines: list[str] = []
+        self.priorities: list[int] = []
+        self.logs_length = 0
+        self.max_log_length = 3750
+        self.verbosity = verbosity
+        # built once, json.dumps(cls=...) would construct a new encoder on every call. the compressed
+        # state is plain nested lists and dicts, so the circular reference bookkeeping is wasted work
+        self.encoder = ProsperityEncoder(separators=(",", ":"), check_circular=False)
+        # listings are fixed for a whole round, encoded again only when the symbols change
+        self.listing_symbols: tuple[Symbol, ...] = ()
+        self.encoded_listings = "[]"
+        # the traderData a tick starts with is normally what the trader returned the tick before
+        self.escaped_trader_data = ("", "")
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", priority: int = LOG_INFO) -> None:
+        if priority > self.verbosity:
+            return
+        line = sep.join(map(str, objects)) + end
+        self.lines.append(line)
+        self.priorities.append(priority)
+        self.logs_length += len(line)
 
-    def compress_state(self, state: TradingState, trader_data: str) -> list[Any]:
+    def flush(self, state: TradingState, orders: dict[Symbol, list[Order]], conversions: int, trader_data: str) -> None:
+        # serialize once with placeholders where the listings and the three free-text fields go, then splice them in
+        head, listings_gap, state_tail, middle, tail = self.to_json(
+            [
+                self.compress_state(state, LOG_PLACEHOLDER, LOG_PLACEHOLDER),
+                self.compress_orders(orders),
+                conversions,
+                LOG_PLACEHOLDER,
+                LOG_PLACEHOLDER,
+            ]
+        ).split(ENCODED_LOG_PLACEHOLDER)
+        # unlike the free-text fields the listings are not a string, so the placeholder's quotes go too
+        state_tail = listings_gap[:-1] + self.encode_listings(state.listings) + state_tail[1:]
+        base_length = len(head) + len(state_tail) + len(middle) + len(tail)
+
+        # state.traderData and trader_data get at most a third each, the logs get whatever is left
+        budget = self.max_log_length - base_length
+        last_trader_data, last_escaped = self.escaped_trader_data
+        escaped = last_escaped if state.traderData == last_trader_data else self.escape(state.traderData)
+        state_trader_data = self.truncate(escaped, budget // 3)
+        escaped = self.escape(trader_data)
+        self.escaped_trader_data = (trader_data, escaped)
+        own_trader_data = self.truncate(escaped, budget // 3)
+        logs = self.select_logs(budget - len(state_trader_data) - len(own_trader_data))
+
+        print(head + state_trader_data + state_tail + own_trader_data + middle + logs + tail)
+
+        self.lines = []
+        self.priorities = []
+        self.logs_length = 0
+
+    # json string body without the surrounding quotes
+    def escape(self, value: str) -> str:
+        return encode_basestring_ascii(value)[1:-1]
+
+    # keep the most important records that fit, in the order they were printed
+    def select_logs(self, max_length: int) -> str:
+        # escaping never shortens text, so this cheap check rules out most ticks
+        if self.logs_length <= max_length:
+            logs = self.escape("".join(self.lines))
+            if len(logs) <= max_length:
+                return logs
+
+        marker = "..."
+        remaining = max_length - len(marker)
+        # one escape call for every line, the placeholder marks where one line ends and the next starts
+        escaped = self.escape(LOG_PLACEHOLDER.join(self.lines)).split(ENCODED_LOG_PLACEHOLDER)
+        keep = [False] * len(escaped)
+        for i in sorted(range(len(escaped)), key=self.priorities.__getitem__):
+            if len(escaped[i]) <= remaining:
+                keep[i] = True
+                remaining -= len(escaped[i])
+        return "".join(line for i, line in enumerate(escaped) if keep[i]) + marker
+
+    def compress_state(self, state: TradingState, trader_data: str, listings: Any) -> list[Any]:
         return [
             state.timestamp,
             trader_data,
-            self.compress_listings(state.listings),
+            listings,
             self.compress_order_depths(state.order_depths),
             self.compress_trades(state.own_trades),
             self.compress_trades(state.market_trades),
@@ -54,6 +115,13 @@ class Logger:
             self.compress_observations(state.observations),
         ]
 
+    def encode_listings(self, listings: dict[Symbol, Listing]) -> str:
+        symbols = tuple(listings)
+        if symbols != self.listing_symbols:
+            self.listing_symbols = symbols
+            self.encoded_listings = self.to_json(self.compress_listings(listings))
+        return self.encoded_listings
+
     def compress_listings(self, listings: dict[Symbol, Listing]) -> list[list[Any]]:
         compressed = []
         for listing in listings.values():
@@ -108,25 +176,95 @@ class Logger:
 
         return compressed
 
+    # one tag per order, in the order compress_orders lays them out. at error priority, so truncation drops it last
+    def print_order_tags(self, tags: dict[Symbol, list[str]]) -> None:
+        flat = list(chain.from_iterable(tags.values()))
+        if flat:
+            self.print(ORDER_TAGS_RECORD, *flat, priority=LOG_ERROR)
+
     def to_json(self, value: Any) -> str:
-        return json.dumps(value, cls=ProsperityEncoder, separators=(",", ":"))
+        return self.encoder.encode(value)
 
+    # value is already json-escaped, never cut an escape sequence in half
     def truncate(self, value: str, max_length: int) -> str:
         if len(value) <= max_length:
             return value
 
-        return value[: max_length - 3] + "..."
+        cut = max(max_length - 3, 0)
+        escape = value.rfind("\\", max(cut - 5, 0), cut)
+        if escape != -1:
+            # count the run of backslashes ending at escape, an odd run means escape starts a sequence
+            run_start = escape
+            while run_start > 0 and value[run_start - 1] == "\\":
+                run_start -= 1
+            if (escape - run_start) % 2 == 0:
+                length = 6 if value[escape + 1:escape + 2] == "u" else 2
+                if escape + length > cut:
+                    cut = escape
+        return value[:cut] + "..."
 
 DEFAULT_LIQUIDATION_THRESHOLD = 0
 DEFAULT_LQ_PRICE_EPSILON = 0
 DEFAULT_EXPONENT_PARAM = 1
 DEFAULT_MM_EPSILON = 1
 DEFAULT_MR_EPSILON = 3.5
-
-logger = Logger()
+# basket price minus its constituents that we treat as fair, and the extra edge wanted per basket traded
+DEFAULT_BASKET_PREMIUM = 0
+DEFAULT_BASKET_EDGE = 5
+# rolling indicator windows, in ticks
+DEFAULT_STATS_WINDOW = 100
+DEFAULT_REGRESSION_WINDOW = 100
+# per tick weight decay of the regression, 1 is a plain least squares fit over the window
+DEFAULT_REGRESSION_DECAY = 1.0
+# causal smoothers of the popular average, picked per product with "smoother": "savgol" | "kalman" | "one_euro"
+DEFAULT_SMOOTHER_WINDOW = 21
+DEFAULT_SMOOTHER_DEGREE = 2
+DEFAULT_KALMAN_PROCESS_VARIANCE = 1.0
+DEFAULT_KALMAN_MEASUREMENT_VARIANCE = 4.0
+DEFAULT_ONE_EURO_MIN_CUTOFF = 0.05
+DEFAULT_ONE_EURO_BETA = 0.1
+# book levels a side the depth aware fair values read, and how far a full imbalance moves the mid, in half spreads
+DEFAULT_FAIR_VALUE_DEPTH = 3
+DEFAULT_IMBALANCE_WEIGHT = 1.0
+# margin a local trade must clear over the all-in foreign price, and units the exchange converts per tick
+DEFAULT_CONVERSION_EDGE = 1
+DEFAULT_CONVERSION_LIMIT = 10
+# ticks after a bot's trade its price impact is read, and impact samples a bot needs before it can count as informed
+DEFAULT_IMPACT_HORIZON = 10
+DEFAULT_INFORMED_MIN_TRADES = 10
+# our own name in Trade.buyer and Trade.seller
+SUBMISSION = "SUBMISSION"
+
+# report timing percentiles through the logger every this many ticks, 0 turns profiling off
+PROFILE_TICKS = 0
+# samples kept per timed section
+PROFILE_WINDOW = 1000
+# allocation order when intents compete for capacity, lowest first
+PRIORITY_BASKET = 0
+PRIORITY_TAKE = 1
+PRIORITY_LIQUIDATE = 2
+PRIORITY_MAKE = 3
+
+# optional OrderBook views and per product indicators a strategy can ask for
+BOOK_VIEWS = ("cumulative",)
+INDICATORS = ("popular_average", "rolling")
+
+# bump whenever the traderData layout changes, older payloads are then ignored
+TRADER_DATA_VERSION = 1
+# traderData is carried between calls by the exchange, stay well inside what it will store
+TRADER_DATA_LIMIT = 20000
+# series are delta encoded on this grid when every value sits on it (prices move in half ticks)
+SERIES_QUANTUM = 0.5
+
+# highest log priority that is recorded at all, LOG_INFO skips the per-tick debug lines
+LOG_VERBOSITY = LOG_DEBUG
+
+logger = Logger(LOG_VERBOSITY)
 
 PRODUCT_PARAMS = {
     "RAINFOREST_RESIN": {
+        "strategy": "fixed_fair_value",
+        "fair_value": 10000,
         "position_limit": 50,
         "exponential_param": DEFAULT_EXPONENT_PARAM,
         "liquidation_threshold": 50,
@@ -136,6 +274,7 @@ PRODUCT_PARAMS = {
     },
 
     "KELP": {
+        "strategy": "market_making",
         "position_limit": 50,
         "exponential_param": 1,
         "liquidation_threshold": 50,
@@ -145,6 +284,7 @@ PRODUCT_PARAMS = {
     },
 
     "SQUID_INK": {
+        "strategy": "mean_reversion",
         "position_limit": 50,
         "exponential_param": 0.01,
         "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
@@ -154,6 +294,7 @@ PRODUCT_PARAMS = {
     },
     
     "CROISSANTS": {
+        "strategy": "ema_market_making",
         "position_limit": 250,
         "exponential_param": DEFAULT_EXPONENT_PARAM,
         "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
@@ -162,6 +303,7 @@ PRODUCT_PARAMS = {
     },
     
     "JAMS": {
+        "strategy": "ema_market_making",
         "position_limit": 350,
         "exponential_param": DEFAULT_EXPONENT_PARAM,
         "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
@@ -170,6 +312,7 @@ PRODUCT_PARAMS = {
     },
     
     "DJEMBES": {
+        "strategy": "ema_market_making",
         "position_limit": 60,
         "exponential_param": DEFAULT_EXPONENT_PARAM,
         "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
@@ -178,30 +321,602 @@ PRODUCT_PARAMS = {
     },
     
     "PICNIC_BASKET1": {
+        "strategy": "basket_arbitrage",
         "position_limit": 60,
         "exponential_param": DEFAULT_EXPONENT_PARAM,
         "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
         "mm_epsilon": DEFAULT_MM_EPSILON,
         "mr_epsilon": DEFAULT_MR_EPSILON,
+        "basket_premium": DEFAULT_BASKET_PREMIUM,
+        "basket_edge": DEFAULT_BASKET_EDGE,
     },
         
     "PICNIC_BASKET2": {
+        "strategy": "basket_arbitrage",
         "position_limit": 60,
         "exponential_param": DEFAULT_EXPONENT_PARAM,
         "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
         "mm_epsilon": DEFAULT_MM_EPSILON,
         "mr_epsilon": DEFAULT_MR_EPSILON,
+        "basket_premium": DEFAULT_BASKET_PREMIUM,
+        "basket_edge": DEFAULT_BASKET_EDGE,
     },
+
+    "MAGNIFICENT_MACARONS": {
+        "strategy": "conversion_arbitrage",
+        "position_limit": 75,
+        "exponential_param": DEFAULT_EXPONENT_PARAM,
+        "liquidation_threshold": DEFAULT_LIQUIDATION_THRESHOLD,
+        "mm_epsilon": DEFAULT_MM_EPSILON,
+        "mr_epsilon": DEFAULT_MR_EPSILON,
+        "conversion_edge": DEFAULT_CONVERSION_EDGE,
+        "conversion_limit": DEFAULT_CONVERSION_LIMIT,
+    },
+}
+
+# constituents and units per basket
+BASKETS = {
+    "PICNIC_BASKET1": {"CROISSANTS": 6, "JAMS": 3, "DJEMBES": 1},
+    "PICNIC_BASKET2": {"CROISSANTS": 4, "JAMS": 2},
 }
 
+class Profiler:
+
+    def __init__(self, report_every: int = PROFILE_TICKS, window: int = PROFILE_WINDOW):
+        self.enabled = report_every > 0
+        self.report_every = report_every
+        self.window = window
+        self.samples: dict[str, deque] = {}
+        self.ticks = 0
+
+    # cheap enough to leave in the hot path, the clock is only read when enabled
+    def start(self) -> float:
+        return perf_counter() if self.enabled else 0.0
+
+    def stop(self, name: str, started: float) -> None:
+        if self.enabled:
+            elapsed = perf_counter() - started
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(elapsed)
+
+    # swap a bound method for a timed one, only ever called when enabled so disabled runs pay nothing
+    def wrap(self, name: str, function):
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            result = function(*args, **kwargs)
+            self.stop(name, started)
+            return result
+        return timed
+
+    # (p50, p99, max) in seconds per section
+    def stats(self) -> dict[str, tuple[float, float, float]]:
+        stats = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats[name] = (ordered[len(ordered) // 2], ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], ordered[-1])
+        return stats
+
+    # one line, microseconds as p50/p99/max, slowest section first
+    def summary(self) -> str:
+        stats = sorted(self.stats().items(), key=lambda item: -item[1][1])
+        return "prof " + " ".join(f"{name}:{p50 * 1e6:.0f}/{p99 * 1e6:.0f}/{worst * 1e6:.0f}" for name, (p50, p99, worst) in stats)
+
+    def tick(self) -> None:
+        if self.enabled:
+            self.ticks += 1
+            if self.ticks % self.report_every == 0:
+                logger.print(self.summary())
+
+
+class StateCodec:
+
+    # payload: version, product count, then per product its index, float64 scalars and series.
+    # a series is stored as its first value plus int16 deltas on the SERIES_QUANTUM grid,
+    # falling back to raw float64 when a value is off the grid or a jump does not fit
+    HEADER = struct.Struct("<BH")
+    PRODUCT = struct.Struct("<HBB")
+    SERIES = struct.Struct("<HBd")
+
+    def encode(self, states: list[tuple[list[float], list[list[float]]]]) -> str:
+        series_values = [values for _, series in states for values in series]
+        encoded_series = iter(self.encode_series(series_values))
+        parts = [self.HEADER.pack(TRADER_DATA_VERSION, len(states))]
+        for index, (scalars, series) in enumerate(states):
+            parts.append(self.PRODUCT.pack(index, len(scalars), len(series)))
+            parts.append(struct.pack(f"<{len(scalars)}d", *scalars))
+            for _ in series:
+                parts.append(next(encoded_series))
+        return b64encode(b"".join(parts)).decode()
+
+    # every series is checked and differenced in one numpy pass, the loop below only slices bytes
+    def encode_series(self, series_values: list[list[float]]) -> list[bytes]:
+        lengths = [len(values) for values in series_values]
+        starts = list(accumulate(lengths, initial=0))
+        flat = np.fromiter(chain.from_iterable(series_values), dtype=np.float64, count=starts[-1])
+        steps = flat / SERIES_QUANTUM
+        deltas = np.diff(steps, prepend=0.0)
+        # the first value of a series is stored whole, every later one as a delta that has to fit an int16
+        in_range = np.abs(deltas) <= 32767
+        nonempty = [start for start, length in zip(starts, lengths) if length]
+        in_range[nonempty] = True
+        quantized = dict(zip(nonempty, np.logical_and.reduceat((steps == np.round(steps)) & in_range, nonempty).tolist())) if nonempty else {}
+        packed_deltas = np.where(in_range, deltas, 0).astype("<i2").tobytes()
+        raw = flat.astype("<f8").tobytes()
+
+        encoded = []
+        for values, start, length in zip(series_values, starts, lengths):
+            if length == 0:
+                encoded.append(self.SERIES.pack(0, 0, 0.0))
+            elif quantized[start]:
+                encoded.append(self.SERIES.pack(length, 1, values[0]) + packed_deltas[2 * (start + 1):2 * (start + length)])
+            else:
+                encoded.append(self.SERIES.pack(length, 0, values[0]) + raw[8 * (start + 1):8 * (start + length)])
+        return encoded
+
+    def decode(self, data: str) -> list[tuple[list[float], list[list[float]]]]:
+        raw = b64decode(data)
+        version, count = self.HEADER.unpack_from(raw, 0)
+        if version != TRADER_DATA_VERSION:
+            return []
+        offset = self.HEADER.size
+        states = []
+        for _ in range(count):
+            _, scalar_count, series_count = self.PRODUCT.unpack_from(raw, offset)
+            offset += self.PRODUCT.size
+            scalars = list(struct.unpack_from(f"<{scalar_count}d", raw, offset))
+            offset += 8 * scalar_count
+            series = []
+            for _ in range(series_count):
+                length, quantized, first = self.SERIES.unpack_from(raw, offset)
+                offset += self.SERIES.size
+                if length == 0:
+                    series.append([])
+                elif quantized:
+                    deltas = np.frombuffer(raw, dtype="<i2", count=length - 1, offset=offset)
+                    offset += 2 * (length - 1)
+                    steps = np.concatenate(([first / SERIES_QUANTUM], deltas)).cumsum()
+                    series.append((steps * SERIES_QUANTUM).tolist())
+                else:
+                    series.append([first] + np.frombuffer(raw, dtype="<f8", count=length - 1, offset=offset).tolist())
+                    offset += 8 * (length - 1)
+            states.append((scalars, series))
+        return states
+
+
+# fixed size history, appending past capacity overwrites the oldest value
+class RingBuffer:
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values: list[float] = [0.0] * capacity
+        self.start = 0
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    # negative indices count back from the newest value, like a list
+    def __getitem__(self, index: int) -> float:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("ring buffer index out of range")
+        return self.values[(self.start + index) % self.capacity]
+
+    def append(self, value: float) -> None:
+        if self.length < self.capacity:
+            self.values[(self.start + self.length) % self.capacity] = value
+            self.length += 1
+        else:
+            self.values[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+
+    def tolist(self) -> list[float]:
+        end = self.start + self.length
+        if end <= self.capacity:
+            return self.values[self.start:end]
+        return self.values[self.start:] + self.values[:end - self.capacity]
+
+
+# mean and variance over the last `window` values, updated with welford's method
+# expired is the value falling out of the window this tick, None while it is still filling
+class RollingWindow:
+
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value: float, expired: float = None) -> None:
+        if expired is None:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        else:
+            old_mean = self.mean
+            self.mean += (value - expired) / self.count
+            self.m2 += (value - expired) * (value - self.mean + expired - old_mean)
+
+    @property
+    def variance(self) -> float:
+        return max(self.m2, 0.0) / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def zscore(self, value: float) -> float:
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+
+# weighted least squares line through the last `window` values, the newest sits at x = 0
+# and a value `age` ticks old at x = -age with weight decay ** age
+class RollingRegression:
+
+    def __init__(self, window: int, decay: float = 1.0):
+        self.window = window
+        self.decay = decay
+        self.expired_weight = decay ** window
+        self.count = 0
+        # weighted sums of 1, x, y, x^2 and xy
+        self.s0 = self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def update(self, value: float, expired: float = None) -> None:
+        decay = self.decay
+        # every existing point moves one step back, then ages by one tick
+        self.sxx = (self.sxx - 2 * self.sx + self.s0) * decay
+        self.sx = (self.sx - self.s0) * decay
+        self.sxy = (self.sxy - self.sy) * decay
+        self.s0 = self.s0 * decay + 1
+        self.sy = self.sy * decay + value
+
+        if expired is None:
+            self.count += 1
+        else:
+            weight = self.expired_weight
+            self.s0 -= weight
+            self.sx += weight * self.window
+            self.sxx -= weight * self.window * self.window
+            self.sy -= weight * expired
+            self.sxy += weight * self.window * expired
+
+    @property
+    def slope(self) -> float:
+        denominator = self.s0 * self.sxx - self.sx * self.sx
+        if self.count < 2 or denominator <= 0:
+            return 0.0
+        return (self.s0 * self.sxy - self.sx * self.sy) / denominator
+
+    @property
+    def intercept(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return (self.sy - self.slope * self.sx) / self.s0
+
+    # fitted value `offset` ticks after the newest point
+    def value_at(self, offset: float = 0) -> float:
+        return self.intercept + self.slope * offset
+
+
+# causal savitzky-golay: a degree `degree` least squares polynomial through the last `window` values,
+# read off at the newest one. the moments sum(age^k * value) are shifted one tick back binomially,
+# so an update costs O(degree^2) whatever the window
+class SavitzkyGolaySmoother:
+
+    def __init__(self, window: int, degree: int):
+        self.window = window
+        self.degree = degree
+        self.values = RingBuffer(window)
+        self.moments = [0.0] * (degree + 1)
+        # (age + 1)^k expanded over age^m
+        self.binomials = [[math.comb(k, m) for m in range(k + 1)] for k in range(degree + 1)]
+        self.expired_powers = [float(window ** k) for k in range(degree + 1)]
+        # fit weights over the moments, per number of values held (they only differ while filling)
+        self.weights: dict[int, list[float]] = {}
+        self.updates = 0
+        self.value = math.nan
+
+    @classmethod
+    def from_params(cls, params: dict) -> "SavitzkyGolaySmoother":
+        return cls(params.get("smoother_window", DEFAULT_SMOOTHER_WINDOW), params.get("smoother_degree", DEFAULT_SMOOTHER_DEGREE))
+
+    # first row of the inverse normal matrix, solved on ages scaled to [0, 1) to keep it well conditioned
+    def fit_weights(self, count: int) -> list[float]:
+        weights = self.weights.get(count)
+        if weights is None:
+            degree = min(self.degree, count - 1)
+            powers = np.arange(degree + 1)
+            scaled = (np.arange(count) / count)[:, None] ** powers
+            weights = (np.linalg.inv(scaled.T @ scaled)[0] / float(count) ** powers).tolist()
+            weights += [0.0] * (self.degree - degree)
+            self.weights[count] = weights
+        return weights
+
+    def update(self, value: float) -> float:
+        moments = self.moments
+        self.moments = moments = [sum(binomial * moments[m] for m, binomial in enumerate(row)) for row in self.binomials]
+        moments[0] += value
+        if len(self.values) == self.window:
+            expired = self.values[0]
+            for k, power in enumerate(self.expired_powers):
+                moments[k] -= power * expired
+        self.values.append(value)
+
+        # rounding creeps into the shifted sums, rebuild them exactly once per window
+        self.updates += 1
+        if self.updates % self.window == 0:
+            newest_first = self.values.tolist()[::-1]
+            self.moments = moments = [math.fsum(age ** k * held for age, held in enumerate(newest_first)) for k in range(self.degree + 1)]
+
+        self.value = sum(weight * moment for weight, moment in zip(self.fit_weights(len(self.values)), moments))
+        return self.value
+
+    # nothing to carry, Product replays its history through update instead
+    def save_state(self) -> list[float]:
+        return []
+
+    def load_state(self, scalars: list[float]) -> None:
+        pass
+
+
+# scalar kalman filter for a price that random walks under observation noise, the gain settles
+# to a constant so this ends up an ema whose alpha comes from the two variances
+class KalmanSmoother:
+
+    def __init__(self, process_variance: float, measurement_variance: float):
+        self.process_variance = process_variance
+        self.measurement_variance = measurement_variance
+        self.variance = math.nan
+        self.value = math.nan
+
+    @classmethod
+    def from_params(cls, params: dict) -> "KalmanSmoother":
+        return cls(
+            params.get("kalman_process_variance", DEFAULT_KALMAN_PROCESS_VARIANCE),
+            params.get("kalman_measurement_variance", DEFAULT_KALMAN_MEASUREMENT_VARIANCE),
+        )
+
+    def update(self, value: float) -> float:
+        if math.isnan(self.value):
+            self.value = value
+            self.variance = self.measurement_variance
+            return self.value
+        predicted = self.variance + self.process_variance
+        gain = predicted / (predicted + self.measurement_variance)
+        self.value += gain * (value - self.value)
+        self.variance = (1 - gain) * predicted
+        return self.value
+
+    # the filter has no window to replay, so its estimate is carried through traderData as is
+    def save_state(self) -> list[float]:
+        return [self.value, self.variance]
+
+    def load_state(self, scalars: list[float]) -> None:
+        self.value, self.variance = scalars
+
+
+# one euro filter: an ema whose cutoff rises with the smoothed speed of the price, steady prices are
+# smoothed hard and fast moves come through with little lag. frequencies are per tick
+class OneEuroSmoother:
+
+    def __init__(self, min_cutoff: float, beta: float, derivative_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_alpha = self.alpha(derivative_cutoff)
+        self.derivative = 0.0
+        self.value = math.nan
+
+    @classmethod
+    def from_params(cls, params: dict) -> "OneEuroSmoother":
+        return cls(params.get("one_euro_min_cutoff", DEFAULT_ONE_EURO_MIN_CUTOFF), params.get("one_euro_beta", DEFAULT_ONE_EURO_BETA))
+
+    @staticmethod
+    def alpha(cutoff: float) -> float:
+        return 1 / (1 + 1 / (2 * math.pi * cutoff))
+
+    def update(self, value: float) -> float:
+        if math.isnan(self.value):
+            self.value = value
+            return self.value
+        self.derivative += self.derivative_alpha * (value - self.value - self.derivative)
+        alpha = self.alpha(self.min_cutoff + self.beta * abs(self.derivative))
+        self.value += alpha * (value - self.value)
+        return self.value
+
+    def save_state(self) -> list[float]:
+        return [self.value, self.derivative]
+
+    def load_state(self, scalars: list[float]) -> None:
+        self.value, self.derivative = scalars
+
+
+SMOOTHERS = {"savgol": SavitzkyGolaySmoother, "kalman": KalmanSmoother, "one_euro": OneEuroSmoother}
+
+
+# fair values read straight off the sorted OrderBook arrays, nan while a side is empty.
+# each walks at most `depth` levels a side once, selected per product by "fair_value_estimator"
+
+# price times volume and volume over the best `depth` levels of one side of the book
+def depth_sums(prices: list[int], volumes: list[int], depth: int) -> tuple[float, int]:
+    value, volume = 0.0, 0
+    for price, level_volume in zip(prices[:depth], volumes[:depth]):
+        value += price * level_volume
+        volume += level_volume
+    return value, volume
+
+
+# best bid and ask weighted by the volume across from them, leans towards the side about to be taken out
+class Microprice:
+
+    @classmethod
+    def from_params(cls, params: dict) -> "Microprice":
+        return cls()
+
+    def estimate(self, book: "OrderBook") -> float:
+        if book.best_bid is None or book.best_ask is None:
+            return math.nan
+        bid_volume, ask_volume = book.bid_volumes[0], book.ask_volumes[0]
+        return (book.best_bid * ask_volume + book.best_ask * bid_volume) / (bid_volume + ask_volume)
+
+
+# midpoint of the volume weighted bid and ask over the top `depth` levels
+class VolumeWeightedMid:
+
+    def __init__(self, depth: int):
+        self.depth = depth
+
+    @classmethod
+    def from_params(cls, params: dict) -> "VolumeWeightedMid":
+        return cls(params.get("fair_value_depth", DEFAULT_FAIR_VALUE_DEPTH))
+
+    def estimate(self, book: "OrderBook") -> float:
+        if book.best_bid is None or book.best_ask is None:
+            return math.nan
+        bid_value, bid_volume = depth_sums(book.bid_prices, book.bid_volumes, self.depth)
+        ask_value, ask_volume = depth_sums(book.ask_prices, book.ask_volumes, self.depth)
+        return (bid_value / bid_volume + ask_value / ask_volume) / 2
+
+
+# mid moved towards the thinner side by the volume imbalance of the top `depth` levels,
+# with depth 1 and weight 1 this is the microprice
+class ImbalanceMid:
+
+    def __init__(self, depth: int, weight: float):
+        self.depth = depth
+        self.weight = weight
+
+    @classmethod
+    def from_params(cls, params: dict) -> "ImbalanceMid":
+        return cls(params.get("fair_value_depth", DEFAULT_FAIR_VALUE_DEPTH), params.get("imbalance_weight", DEFAULT_IMBALANCE_WEIGHT))
+
+    def estimate(self, book: "OrderBook") -> float:
+        if book.best_bid is None or book.best_ask is None:
+            return math.nan
+        _, bid_volume = depth_sums(book.bid_prices, book.bid_volumes, self.depth)
+        _, ask_volume = depth_sums(book.ask_prices, book.ask_volumes, self.depth)
+        imbalance = (bid_volume - ask_volume) / (bid_volume + ask_volume)
+        return (book.best_bid + book.best_ask) / 2 + self.weight * imbalance * (book.best_ask - book.best_bid) / 2
+
+
+# what find_popular_sum_length sets out to do: per side the mean price of the levels showing the most volume
+class MaxVolumePrice:
+
+    @classmethod
+    def from_params(cls, params: dict) -> "MaxVolumePrice":
+        return cls()
+
+    @staticmethod
+    def side(prices: list[int], volumes: list[int]) -> float:
+        most, total, count = 0, 0, 0
+        for price, volume in zip(prices, volumes):
+            if volume > most:
+                most, total, count = volume, price, 1
+            elif volume == most:
+                total += price
+                count += 1
+        return total / count
+
+    def estimate(self, book: "OrderBook") -> float:
+        if book.best_bid is None or book.best_ask is None:
+            return math.nan
+        return (self.side(book.bid_prices, book.bid_volumes) + self.side(book.ask_prices, book.ask_volumes)) / 2
+
+
+# the popular price of Product.popular_sides stays the default when a product names none of these
+FAIR_VALUES = {"microprice": Microprice, "vwap": VolumeWeightedMid, "imbalance": ImbalanceMid, "max_volume": MaxVolumePrice}
+
+
+class OrderBook:
+
+    # built once per tick from OrderDepth, every helper reads the same sorted arrays.
+    # cumulative volumes (and the bisect helpers built on them) only when a strategy asked for them
+    def __init__(self, order_depth: OrderDepth, cumulative: bool = True):
+        # high to low
+        self.bid_prices = sorted(order_depth.buy_orders, reverse=True)
+        self.bid_volumes = [order_depth.buy_orders[price] for price in self.bid_prices]
+        # low to high, volumes kept positive
+        self.ask_prices = sorted(order_depth.sell_orders)
+        self.ask_volumes = [-order_depth.sell_orders[price] for price in self.ask_prices]
+
+        if cumulative:
+            # running totals from the top of each side
+            self.bid_cumulative = list(accumulate(self.bid_volumes))
+            self.ask_cumulative = list(accumulate(self.ask_volumes))
+            # negated bids are ascending so bisect works on them
+            self._negated_bid_prices = [-price for price in self.bid_prices]
+
+        self.best_bid = self.bid_prices[0] if self.bid_prices else None
+        self.best_ask = self.ask_prices[0] if self.ask_prices else None
+
+    # number of ask levels priced strictly below price
+    def asks_below(self, price: float) -> int:
+        return bisect_left(self.ask_prices, price)
+
+    # number of ask levels priced at or below price
+    def asks_at_or_below(self, price: float) -> int:
+        return bisect_right(self.ask_prices, price)
+
+    # number of bid levels priced strictly above price
+    def bids_above(self, price: float) -> int:
+        return bisect_left(self._negated_bid_prices, -price)
+
+    # number of bid levels priced at or above price
+    def bids_at_or_above(self, price: float) -> int:
+        return bisect_right(self._negated_bid_prices, -price)
+
+    # volume we could buy sweeping the asks up to and including price
+    def ask_volume_through(self, price: float) -> int:
+        levels = self.asks_at_or_below(price)
+        return self.ask_cumulative[levels - 1] if levels else 0
+
+    # volume we could sell sweeping the bids down to and including price
+    def bid_volume_through(self, price: float) -> int:
+        levels = self.bids_at_or_above(price)
+        return self.bid_cumulative[levels - 1] if levels else 0
+
+
 class Product:
 
     def __init__(self, name: str):
         self.name = name
         self.params = PRODUCT_PARAMS[self.name]
 
-        self.popular_average: float
-        self.exponential_moving_average: float
+        # what the product's strategy reads, filled in when the Trader resolves strategies
+        self.book_views: frozenset[str] = frozenset(BOOK_VIEWS)
+
+        # optional depth aware estimator standing in for the popular price
+        estimator = self.params.get("fair_value_estimator")
+        self.estimator = FAIR_VALUES[estimator].from_params(self.params) if estimator else None
+
+        # written by update_fair_values every tick, nan until the book has been seen.
+        # popular_average is whatever fair_value returns, the popular price unless an estimator is set
+        self.popular_average = math.nan
+        self.exponential_moving_average = math.nan
+        self.spread = math.nan
+
+        # optional causal smoother of the popular average, nan until it has seen a value
+        smoother = self.params.get("smoother")
+        self.smoother = SMOOTHERS[smoother].from_params(self.params) if smoother else None
+        self.smoothed = math.nan
+        self.set_indicators(frozenset(INDICATORS))
+
+    # rolling indicators over the popular average, all updated in O(1) per tick. they and their history
+    # are only kept when the strategy reads them, otherwise every tick would pay for windows nobody uses
+    def set_indicators(self, indicators: frozenset[str]) -> None:
+        self.indicators = indicators
+        if "rolling" in indicators:
+            self.stats: Optional[RollingWindow] = RollingWindow(self.params.get("stats_window", DEFAULT_STATS_WINDOW))
+            self.trend: Optional[RollingRegression] = RollingRegression(self.params.get("regression_window", DEFAULT_REGRESSION_WINDOW), self.params.get("regression_decay", DEFAULT_REGRESSION_DECAY))
+            windows = [self.stats.window, self.trend.window]
+        else:
+            self.stats = self.trend = None
+            windows = []
+        # long enough to know what falls out of every window, and to warm the smoother back up
+        self.history = RingBuffer(max(windows + [getattr(self.smoother, "window", 0)]))
 
     def __str__(self) -> str:
         return self.name
@@ -210,250 +925,705 @@ class Product:
         return self.name
 
 
-    # update historical data, sort and return sell/buy orders, print info
-    def product_header(self, state: TradingState) -> tuple[dict, OrderDepth]:
+    # build the book and return it with our position, historical data is updated by update_fair_values
+    def product_header(self, state: TradingState) -> tuple[OrderBook, int]:
         # current orders in market
-        order_depth = state.order_depths[self.name]
-
-        # add to historical data
-        self.calculate_average(order_depth)
-        self.calculate_exp_moving_average()
-
-        # sorting items
-        # low to high
-        sorted_sell_orders = dict(sorted(order_depth.sell_orders.items()))
-        # high to low
-        sorted_buy_orders = dict(reversed(sorted(order_depth.buy_orders.items())))
+        book = OrderBook(state.order_depths[self.name], cumulative="cumulative" in self.book_views)
 
         if self.name in state.position:
             position = state.position[self.name]
         else:
             position = 0
 
-        return (sorted_sell_orders, sorted_buy_orders, position)
+        return (book, position)
 
-    # helper func
-    def find_popular_sum_length(self, orders, ask_mode: bool):
-        prices = []
+    # helper func. ask_volume never moves off 0, so every level passes the comparison and this ends up on
+    # the deepest price of the side, which the popular price has always been. MaxVolumePrice is the intended version
+    def find_popular_sum_length(self, prices, volumes, ask_mode: bool):
+        popular_prices = []
         ask_volume = 0
-        for price, volume in list(orders):
+        for price, volume in zip(prices, volumes):
             if ((volume < ask_volume) and ask_mode) or ((volume > ask_volume) and not ask_mode):
-                prices = [price]
+                popular_prices = [price]
             elif volume == ask_volume:
-                prices.append(price)
+                popular_prices.append(price)
 
-        # prices_sum = sum(prices)
-        # prices_length = len(prices)
-        return sum(prices), len(prices)
-    # find averages based from volume for one instance
-    def calculate_average(self, order_depth: OrderDepth) -> float:
-        ask_price_sum, ask_prices_length = self.find_popular_sum_length(order_depth.sell_orders.items(), ask_mode=True)
-        bid_sum, bid_prices_length = self.find_popular_sum_length(order_depth.buy_orders.items(), ask_mode=False)
+        return sum(popular_prices), len(popular_prices)
+    # popular ask and bid price for one instance, nan when a side is empty
+    def popular_sides(self, book: OrderBook) -> tuple[float, float]:
+        # ask volumes are signed the exchange way here
+        ask_price_sum, ask_prices_length = self.find_popular_sum_length(book.ask_prices, [-volume for volume in book.ask_volumes], ask_mode=True)
+        bid_sum, bid_prices_length = self.find_popular_sum_length(book.bid_prices, book.bid_volumes, ask_mode=False)
 
         if (bid_prices_length != 0 and ask_prices_length != 0):
-            ask_average = ask_price_sum / ask_prices_length
-            bid_average = bid_sum / bid_prices_length
-            self.popular_average = (ask_average + bid_average) / 2
-        
-        return self.popular_average
-
-    # calculate exp regression line
-    def calculate_exp_moving_average(self):
-        if hasattr(self, 'exponential_moving_average'):
-            self.exponential_moving_average = self.params["exponential_param"] * self.popular_average + (1 - self.params["exponential_param"]) * self.exponential_moving_average
-        else:
+            return ask_price_sum / ask_prices_length, bid_sum / bid_prices_length
+        return math.nan, math.nan
+
+    # one tick's fair value, nan when a side is empty
+    def fair_value(self, book: OrderBook) -> float:
+        if self.estimator is not None:
+            return self.estimator.estimate(book)
+        ask_average, bid_average = self.popular_sides(book)
+        return (ask_average + bid_average) / 2
+
+    # popular average, ema and spread from this tick's book, then the rolling windows.
+    # a one sided book keeps the last popular average
+    def update_fair_values(self, book: OrderBook) -> None:
+        popular_average = self.fair_value(book) if "popular_average" in self.indicators else math.nan
+        if not math.isnan(popular_average):
+            self.popular_average = popular_average
+        alpha = self.params["exponential_param"]
+        if math.isnan(self.exponential_moving_average):
             self.exponential_moving_average = self.popular_average
-        return self.exponential_moving_average
-
-
-class Trader:
+        else:
+            self.exponential_moving_average = alpha * self.popular_average + (1 - alpha) * self.exponential_moving_average
+        self.spread = math.nan if book.best_bid is None or book.best_ask is None else book.best_ask - book.best_bid
+        if ("rolling" in self.indicators or self.smoother is not None) and not math.isnan(self.popular_average):
+            self.update_indicators(self.popular_average)
+
+    # rolling state carried through traderData, nan marks a value we have not seen yet
+    def save_state(self) -> tuple[list[float], list[list[float]]]:
+        scalars = [self.popular_average, self.exponential_moving_average]
+        if self.smoother is not None:
+            scalars += self.smoother.save_state()
+        return scalars, [self.history.tolist()]
+
+    def load_state(self, scalars: list[float], series: list[list[float]]) -> None:
+        self.popular_average, self.exponential_moving_average = scalars[:2]
+        # windowed indicators are rebuilt by replaying the saved history, if there are any to rebuild
+        if self.history.capacity:
+            for value in series[0] if series else []:
+                self.update_indicators(value)
+        # a smoother without a window overrides whatever the replay left it with
+        if self.smoother is not None:
+            if len(scalars) > 2:
+                self.smoother.load_state(scalars[2:])
+            self.smoothed = self.smoother.value
+
+    def update_indicators(self, value: float) -> None:
+        history = self.history
+        if self.stats is not None:
+            for indicator in (self.stats, self.trend):
+                indicator.update(value, history[-indicator.window] if len(history) >= indicator.window else None)
+        if self.smoother is not None:
+            self.smoothed = self.smoother.update(value)
+        # empty when neither the rolling windows nor the smoother look back
+        if history.capacity:
+            history.append(value)
+
+
+class ConversionEngine:
+
+    # all-in foreign prices of every conversion product, moved in one numpy step per tick.
+    # edges and limits never change, so they are laid out once next to the price arrays
+    def __init__(self, products: list[Product]):
+        self.names = [product.name for product in products]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.edges = [float(product.params.get("conversion_edge", DEFAULT_CONVERSION_EDGE)) for product in products]
+        self.limits = [product.params.get("conversion_limit", DEFAULT_CONVERSION_LIMIT) for product in products]
+        # per unit, nan while the product has no observation
+        self.import_cost = [math.nan] * len(products)
+        self.export_value = [math.nan] * len(products)
+        # conversions each product asked for this tick, positive imports
+        self.requests: dict[Symbol, int] = {}
+
+    def update(self, observations: Observation) -> None:
+        self.requests = {}
+        if not self.names:
+            return
+        quoted = observations.conversionObservations
+        rows = []
+        for name in self.names:
+            observation = quoted.get(name)
+            if observation is None:
+                rows.append((math.nan,) * 5)
+            else:
+                rows.append((observation.bidPrice, observation.askPrice, observation.transportFees, observation.exportTariff, observation.importTariff))
+        bids, asks, transport_fees, export_tariffs, import_tariffs = np.array(rows, dtype=np.float64).T
+        # buying abroad pays the ask plus both fees, selling abroad gets the bid minus both
+        self.import_cost = (asks + transport_fees + import_tariffs).tolist()
+        self.export_value = (bids - transport_fees - export_tariffs).tolist()
 
-    def __init__(self):
-        self.products = [Product(product_name) for product_name in PRODUCT_PARAMS.keys()]
+    # the exchange takes a single count, one product per round gets observations
+    def total(self) -> int:
+        return sum(self.requests.values())
 
-    # handle ask tradings, we buy, looking for sell orders, ask
-    def buy_mm(self, product: Product, positions: list, return_orders: List, sorted_sell_orders: dict, price: int) -> List[Order]:
-        worst_price = round(price)
-        # absolute value volume
-        volume = 0
-        for ask_price, ask_volume in sorted_sell_orders.items():
-            if ask_price < price:
-                positions[1] -= abs(ask_volume)
-                if positions[1] <= 0:
-                    positions[1] += abs(ask_volume)
-                    return_orders.append(Order(product.name, worst_price, volume))
-                    return
-                volume += abs(ask_volume)
-                worst_price = ask_price
-        return_orders.append(Order(product.name, worst_price, volume))
-        positions[1] -= volume
 
-    # handle bid tradings, we sell, ask_volume is positive
-    def sell_mm(self, product: Product, positions: list, return_orders: List, sorted_buy_orders: dict, price: int) -> List[Order]:
-        worst_price = round(price)
-        volume = 0
-        for bid_price, bid_volume in sorted_buy_orders.items():
-            if bid_price > price:
-                positions[2] -= abs(bid_volume)
-                if positions[2] <= 0:
-                    positions[2] += abs(bid_volume)
-                    return_orders.append(Order(product.name, worst_price, -volume))
-                    return
-                volume += abs(bid_volume)
-                worst_price = bid_price
-        return_orders.append(Order(product.name, worst_price, -volume))
-        positions[2] -= volume
-                
-    # reliquidates us to be happy and to make more profit YAY
-    def handle_liquidation(self, product: Product, positions: list, return_orders: List[Order], sorted_buy_orders: dict, sorted_sell_orders: dict, fair_price: int) -> List[Order]:
-        updated_position = positions[0] + (product.params['position_limit'] - positions[0] - positions[1]) - (product.params['position_limit'] + positions[0] - positions[2])
-        fair_price = round(fair_price)
-        # buying
-        if updated_position < -product.params["liquidation_threshold"]:
-            for ask_price, ask_volume in sorted_sell_orders.items():
-                if ask_price <= fair_price:
-                    return_orders.append(Order(product.name, fair_price, min(abs(ask_volume), abs(updated_position) - product.params["liquidation_threshold"], positions[1], 0)))
-                    positions[1] -= min(-ask_volume, -updated_position - product.params["liquidation_threshold"], positions[1])
+class CounterpartyFlow:
 
-            # return_orders.append(Order(product.name, fair_price, min(-updated_position - product.params["liquidation_threshold"], positions[1])))
-            # positions[1] -= min(-updated_position - product.params["liquidation_threshold"], positions[1])
-        # selling
-        if updated_position > product.params["liquidation_threshold"]:
-            for bid_price, bid_volume in sorted_sell_orders.items():
-                if bid_price >= fair_price:
-                    return_orders.append(Order(product.name, fair_price, -min(abs(bid_volume), abs(updated_position) - product.params["liquidation_threshold"], positions[2], 0)))
-                    positions[2] -= min(bid_volume, updated_position - product.params["liquidation_threshold"], positions[2])
+    # what one bot did in one product: signed flow, how big its trades are, and where the mid went afterwards
+    __slots__ = ("trades", "volume", "net", "sizes", "impact", "impact_volume", "impact_trades")
 
-            # return_orders.append(Order(product.name, fair_price, -min(updated_position - product.params["liquidation_threshold"], positions[2])))
-            # positions[2] -= min(updated_position - product.params["liquidation_threshold"], positions[2])
+    def __init__(self):
+        self.trades = 0
+        self.volume = 0
+        # positive when the bot bought
+        self.net = 0
+        # trade size -> count
+        self.sizes: dict[int, int] = {}
+        # sum over resolved trades of signed quantity times the mid move, positive when the bot traded ahead of it
+        self.impact = 0.0
+        self.impact_volume = 0
+        self.impact_trades = 0
+
+    def record(self, signed: int) -> None:
+        size = abs(signed)
+        self.trades += 1
+        self.volume += size
+        self.net += signed
+        self.sizes[size] = self.sizes.get(size, 0) + 1
+
+    def resolve(self, signed: int, move: float) -> None:
+        self.impact += signed * move
+        self.impact_volume += abs(signed)
+        self.impact_trades += 1
+
+    @property
+    def mean_size(self) -> float:
+        return self.volume / self.trades if self.trades else math.nan
+
+    # mid move in the bot's favour per unit it traded
+    @property
+    def impact_per_unit(self) -> float:
+        return self.impact / self.impact_volume if self.impact_volume else math.nan
+
+
+class CounterpartyIndex:
+
+    # CounterpartyFlow per (bot, product), fed every tick's new own and market trades.
+    # a trade's impact is read impact_horizon ticks after it printed, from a queue per product,
+    # so an update costs O(new trades + trades resolving) however long the day has run
+    def __init__(self, horizon: int = DEFAULT_IMPACT_HORIZON):
+        self.horizon = horizon
+        self.tick = 0
+        self.flows: dict[Symbol, dict[str, CounterpartyFlow]] = {}
+        # (tick printed, flow, signed quantity, mid when it printed), oldest first
+        self.pending: dict[Symbol, deque] = {}
+        # latest mid per product, which is the book the next tick's trades printed into
+        self.mids: dict[Symbol, float] = {}
+        # newest trade timestamp indexed per product, anything not newer was already seen
+        self.seen: dict[Symbol, int] = {}
+
+    def flow(self, bot: str, symbol: Symbol) -> Optional[CounterpartyFlow]:
+        return self.flows.get(symbol, {}).get(bot)
+
+    def counterparties(self, symbol: Symbol) -> dict[str, CounterpartyFlow]:
+        return self.flows.get(symbol, {})
+
+    # bots whose trades the mid has followed by at least min_impact per unit, strongest first
+    def informed(self, symbol: Symbol, min_impact: float = 0.0, min_trades: int = DEFAULT_INFORMED_MIN_TRADES) -> list[str]:
+        bots = [
+            (flow.impact_per_unit, bot) for bot, flow in self.counterparties(symbol).items()
+            if flow.impact_trades >= min_trades and flow.impact_per_unit > min_impact
+        ]
+        return [bot for _, bot in sorted(bots, reverse=True)]
+
+    # mids is this tick's mid per product, trades are what the state reports as printed during the last tick
+    def update(self, market_trades: dict[Symbol, list[Trade]], own_trades: dict[Symbol, list[Trade]], mids: dict[Symbol, float]) -> None:
+        printed = self.tick - 1
+        newest: dict[Symbol, int] = {}
+        for trades_by_symbol in (market_trades, own_trades):
+            for symbol, trades in trades_by_symbol.items():
+                seen = self.seen.get(symbol, -1)
+                # the book they printed into, mids are only moved on below
+                mid = self.mids.get(symbol, math.nan)
+                flows = self.flows.setdefault(symbol, {})
+                for trade in trades:
+                    if trade.timestamp <= seen:
+                        continue
+                    newest[symbol] = max(newest.get(symbol, -1), trade.timestamp)
+                    for bot, signed in ((trade.buyer, trade.quantity), (trade.seller, -trade.quantity)):
+                        if not bot or bot == SUBMISSION:
+                            continue
+                        flow = flows.get(bot)
+                        if flow is None:
+                            flow = flows[bot] = CounterpartyFlow()
+                        flow.record(signed)
+                        if not math.isnan(mid):
+                            self.pending.setdefault(symbol, deque()).append((printed, flow, signed, mid))
+        self.seen.update(newest)
+
+        self.mids.update(mids)
+        for symbol, queue in self.pending.items():
+            mid = self.mids.get(symbol, math.nan)
+            if math.isnan(mid):
+                continue
+            while queue and queue[0][0] + self.horizon <= self.tick:
+                _, flow, signed, then = queue.popleft()
+                flow.resolve(signed, mid - then)
+        self.tick += 1
+
+
+class OrderIntents:
+
+    # what every strategy step of one product wants to trade this tick, before netting and limits
+    def __init__(self, symbol: Symbol):
+        self.symbol = symbol
+        self.entries: list[tuple[int, int, int, str]] = []
+        # tag of every order allocate returned, by index. Order has no field for it
+        self.tags: list[str] = []
+
+    def add(self, price: int, quantity: int, priority: int, tag: str) -> None:
+        if quantity:
+            self.entries.append((price, quantity, priority, tag))
+
+    # one order per price, never crossing each other, buys and sells each cut to the capacity the exchange allows, most urgent first
+    def allocate(self, position: int, limit: int) -> list[Order]:
+        levels: dict[int, list] = {}
+        for price, quantity, priority, tag in self.entries:
+            level = levels.get(price)
+            if level is None:
+                levels[price] = [quantity, priority, tag]
+            else:
+                level[0] += quantity
+                if priority < level[1]:
+                    level[1], level[2] = priority, tag
+
+        # a buy at or above one of our own sells would trade against it, so opposing intents are netted
+        # across prices, highest buy against lowest sell, until what is left no longer crosses
+        buy_prices = sorted((price for price, level in levels.items() if level[0] > 0), reverse=True)
+        sell_prices = sorted(price for price, level in levels.items() if level[0] < 0)
+        buy_index = sell_index = 0
+        while buy_index < len(buy_prices) and sell_index < len(sell_prices) and buy_prices[buy_index] >= sell_prices[sell_index]:
+            buy, sell = levels[buy_prices[buy_index]], levels[sell_prices[sell_index]]
+            matched = min(buy[0], -sell[0])
+            buy[0] -= matched
+            sell[0] += matched
+            if buy[0] == 0:
+                buy_index += 1
+            if sell[0] == 0:
+                sell_index += 1
+
+        # better prices first within a priority
+        buys = sorted((priority, -price, price, quantity, tag) for price, (quantity, priority, tag) in levels.items() if quantity > 0)
+        sells = sorted((priority, price, price, quantity, tag) for price, (quantity, priority, tag) in levels.items() if quantity < 0)
+
+        orders = []
+        self.tags = []
+        for side, capacity in ((buys, limit - position), (sells, limit + position)):
+            for _, _, price, quantity, tag in side:
+                if capacity <= 0:
+                    break
+                quantity = max(quantity, -capacity) if quantity < 0 else min(quantity, capacity)
+                capacity -= abs(quantity)
+                orders.append(Order(self.symbol, price, quantity))
+                self.tags.append(tag)
+        return orders
+
+
+class Strategy(ABC):
+
+    # PRODUCT_PARAMS "strategy" value this class answers to
+    name = ""
+    # lower stages run first, cross product strategies take capacity before single product ones
+    stage = 1
+    # views and indicators read by run, anything no strategy asks for is never computed
+    book_views: frozenset[str] = frozenset(("cumulative",))
+    indicators: frozenset[str] = frozenset(("popular_average",))
+
+    def __init__(self, trader: "Trader", product: Product):
+        self.trader = trader
+        self.product = product
+        self.params = product.params
+
+    @abstractmethod
+    def run(self, book: OrderBook, positions: list, orders: "OrderIntents") -> None:
+        pass
+
+    def log_averages(self) -> None:
+        logger.print(self.product.name, "ema:", self.product.exponential_moving_average, priority=LOG_DEBUG)
+        logger.print(self.product.name, "pa:", self.product.popular_average, priority=LOG_DEBUG)
+        if self.product.smoother is not None:
+            logger.print(self.product.name, "smoothed:", self.product.smoothed, priority=LOG_DEBUG)
+
+
+# take anything through fair value, liquidate back towards it, then quote both sides for the rest
+class MarketMakingStrategy(Strategy):
+
+    name = "market_making"
+
+    # nan until a two sided book has been seen
+    def fair_price(self) -> float:
+        self.log_averages()
+        popular_average = self.product.popular_average
+        return popular_average if math.isnan(popular_average) else int(popular_average)
+
+    def run(self, book: OrderBook, positions: list, orders: "OrderIntents") -> None:
+        trader, product = self.trader, self.product
+        mm_price = self.fair_price()
+        # nothing to quote around yet
+        if math.isnan(mm_price):
+            return
+        lq_price = mm_price
+
+        trader.buy_mm(product, positions, orders, book, mm_price - self.params["mm_epsilon"])
+        trader.sell_mm(product, positions, orders, book, mm_price + self.params["mm_epsilon"])
+        logger.print(product.name, "positions after mm:", positions, priority=LOG_DEBUG)
+
+        trader.handle_liquidation(product, positions, orders, book, lq_price)
+        logger.print(product.name, "positions after lq:", positions, priority=LOG_DEBUG)
+
+        # quote whatever capacity is left
+        orders.add(round(mm_price - self.params["makemm_epsilon"]), positions[1], PRIORITY_MAKE, "make")
+        orders.add(round(mm_price + self.params["makemm_epsilon"]), -positions[2], PRIORITY_MAKE, "make")
+
+
+# market making around a known constant price
+class FixedFairValueStrategy(MarketMakingStrategy):
+
+    name = "fixed_fair_value"
+    indicators = frozenset()
+
+    def fair_price(self) -> float:
+        return self.params["fair_value"]
+
+
+# trade back towards the ema once the price strays more than mr_epsilon away
+class MeanReversionStrategy(Strategy):
+
+    name = "mean_reversion"
+
+    def run(self, book: OrderBook, positions: list, orders: "OrderIntents") -> None:
+        trader, product = self.trader, self.product
+        self.log_averages()
+        ema = product.exponential_moving_average
+        # a configured smoother stands in for the raw popular average as the fair value
+        fair_price = product.popular_average if product.smoother is None else product.smoothed
+        # no two sided book seen yet
+        if math.isnan(fair_price) or math.isnan(ema):
+            return
 
+        if fair_price < ema - self.params["mr_epsilon"]:
+            trader.buy_mm(product, positions, orders, book, ema - 2 * self.params["mr_epsilon"])
 
+        elif fair_price > ema + self.params["mr_epsilon"]:
+            trader.sell_mm(product, positions, orders, book, ema + 2 * self.params["mr_epsilon"])
 
+        else:
+            trader.handle_liquidation(product, positions, orders, book, int(fair_price))
 
 
-    def run(self, state: TradingState) -> tuple[dict[Symbol, list[Order]], int, str]:
+# take liquidity either side of the ema
+class EmaMarketMakingStrategy(Strategy):
 
-        result: dict[str, list[Order]] = {}
-        conversions = 0
-        trader_data = ""
+    name = "ema_market_making"
 
-        for product in self.products:
-            if product.name not in state.order_depths.keys():
-                logger.print(product.name, "broken")
-                continue
+    def run(self, book: OrderBook, positions: list, orders: "OrderIntents") -> None:
+        trader, product = self.trader, self.product
+        self.log_averages()
+        mm_price = product.exponential_moving_average
+        if math.isnan(mm_price):
+            return
 
-            # update data, give sell and buy orders
-            sell_orders, buy_orders, position = product.product_header(state)
+        trader.buy_mm(product, positions, orders, book, mm_price - self.params["mm_epsilon"])
+        trader.sell_mm(product, positions, orders, book, mm_price + self.params["mm_epsilon"])
 
-            long_position_avaliable = product.params['position_limit'] - position
-            short_position_avaliable = product.params['position_limit'] + position
-            positions = [position, long_position_avaliable, short_position_avaliable]
 
-            popular_price = product.popular_average
-            orders: List[Order] = []
-            logger.print(product.name, "positions:", positions)
+# trade the basket against its constituents whenever one side is cheaper than the other by more than basket_edge
+class BasketArbitrageStrategy(Strategy):
 
-            # ========================================================================
-            # UNIVERSAL
-            # ========================================================================
+    name = "basket_arbitrage"
+    stage = 0
+    book_views = frozenset()
+    indicators = frozenset()
 
-            mm_price = int(popular_price)
-            lq_price = int(popular_price)
+    def __init__(self, trader: "Trader", product: Product):
+        super().__init__(trader, product)
+        self.legs = list(BASKETS[product.name].items())
 
-            # ========================================================================
-            # HELP
-            # ========================================================================
-            if product.name == "KELP":
-                logger.print(product.name, "ema:", product.exponential_moving_average)
-                logger.print(product.name, "pa:", product.popular_average)
-                mm_price = int(product.popular_average)
-                lq_price = mm_price
+    # prices of every unit on one side of the book, best first
+    @staticmethod
+    def unit_prices(prices: list[int], volumes: list[int]) -> np.ndarray:
+        return np.repeat(np.asarray(prices, dtype=np.int64), volumes)
 
-                self.buy_mm(product, positions, orders, sell_orders, mm_price - product.params["mm_epsilon"])
-                self.sell_mm(product, positions, orders, buy_orders, mm_price + product.params["mm_epsilon"])
+    def run(self, book: OrderBook, positions: list, orders: "OrderIntents") -> None:
+        books, leg_positions = self.trader.books, self.trader.positions
+        if any(leg not in books for leg, _ in self.legs):
+            return
+        premium, edge = self.params["basket_premium"], self.params["basket_edge"]
 
-                self.handle_liquidation(product, positions, orders, buy_orders, sell_orders, lq_price)
+        # basket cheap: buy it at the asks, sell the legs into their bids
+        self.sweep(
+            book.ask_prices, book.ask_volumes, positions, 1,
+            [(leg, units, books[leg].bid_prices, books[leg].bid_volumes, leg_positions[leg], 2) for leg, units in self.legs],
+            lambda basket, synthetic: synthetic + premium - basket - edge,
+        )
+        # basket rich: sell it into the bids, buy the legs at their asks
+        self.sweep(
+            book.bid_prices, book.bid_volumes, positions, 2,
+            [(leg, units, books[leg].ask_prices, books[leg].ask_volumes, leg_positions[leg], 1) for leg, units in self.legs],
+            lambda basket, synthetic: basket - synthetic - premium - edge,
+        )
 
-                # buy
-                orders.append(Order(product.name, round(mm_price - product.params["makemm_epsilon"]), positions[1]))
-                orders.append(Order(product.name, round(mm_price + product.params["makemm_epsilon"]), -positions[2]))
+    # every basket unit is priced against the leg units it would consume, all levels at once
+    def sweep(self, prices: list[int], volumes: list[int], positions: list, side: int, legs: list, gain) -> None:
+        if not prices or not all(leg_prices for _, _, leg_prices, _, _, _ in legs):
+            return
+        # top of every book bounds the best unit, most ticks stop here before any arrays are built
+        if gain(prices[0], sum(units * leg_prices[0] for _, units, leg_prices, _, _, _ in legs)) < 0:
+            return
+
+        taken = self.trader.legs_taken
+        basket_prices = self.unit_prices(prices, volumes)
+        count = min(len(basket_prices), positions[side])
+        for leg, units, leg_prices, leg_volumes, leg_position, leg_side in legs:
+            available = sum(leg_volumes) - taken.get((leg, leg_side), 0)
+            count = min(count, available // units, leg_position[leg_side] // units)
+        if count <= 0:
+            return
+
+        synthetic = np.zeros(count, dtype=np.int64)
+        leg_units = []
+        for leg, units, leg_prices, leg_volumes, leg_position, leg_side in legs:
+            start = taken.get((leg, leg_side), 0)
+            unit_prices = self.unit_prices(leg_prices, leg_volumes)[start:start + count * units]
+            synthetic += unit_prices.reshape(count, units).sum(axis=1)
+            leg_units.append(unit_prices)
+
+        # per basket gain only falls as we walk deeper, so the profitable units are a prefix
+        count = int(np.count_nonzero(gain(basket_prices[:count], synthetic) >= 0))
+        if count == 0:
+            return
+
+        direction = 1 if side == 1 else -1
+        self.trader.orders[self.product.name].add(int(basket_prices[count - 1]), direction * count, PRIORITY_BASKET, "basket")
+        positions[side] -= count
+        for (leg, units, _, _, leg_position, leg_side), unit_prices in zip(legs, leg_units):
+            self.trader.orders[leg].add(int(unit_prices[count * units - 1]), -direction * count * units, PRIORITY_BASKET, "basket")
+            leg_position[leg_side] -= count * units
+            taken[(leg, leg_side)] = taken.get((leg, leg_side), 0) + count * units
+        logger.print(self.product.name, "basket arb:", direction * count, "at", int(basket_prices[count - 1]), priority=LOG_DEBUG)
+
+
+# sell locally above what the foreign market charges and convert back in, or buy below what it pays and convert out.
+# the conversion and the local orders are sized together so every open unit can be converted next tick
+class ConversionArbitrageStrategy(Strategy):
+
+    name = "conversion_arbitrage"
+    indicators = frozenset()
+
+    def run(self, book: OrderBook, positions: list, orders: "OrderIntents") -> None:
+        engine, name = self.trader.conversion_engine, self.product.name
+        row = engine.index[name]
+        import_cost, export_value = engine.import_cost[row], engine.export_value[row]
+        if math.isnan(import_cost):
+            return
+        limit, edge = engine.limits[row], engine.edges[row]
+        position = positions[0]
+
+        # close what earlier ticks opened, through the local book wherever it beats the conversion
+        remaining = position
+        if position < 0:
+            local = self.take(orders, book.ask_prices, book.ask_cumulative, book.asks_below(import_cost), min(-position, positions[1]), 1)
+            positions[1] -= local
+            engine.requests[name] = min(-position - local, limit)
+            remaining += local + engine.requests[name]
+        elif position > 0:
+            local = self.take(orders, book.bid_prices, book.bid_cumulative, book.bids_above(export_value), min(position, positions[2]), -1)
+            positions[2] -= local
+            engine.requests[name] = -min(position - local, limit)
+            remaining += engine.requests[name] - local
+
+        # open no more than the next conversion can close
+        sell_room = max(min(limit + min(remaining, 0), positions[2]), 0)
+        sell_above = import_cost + edge
+        sold = self.take(orders, book.bid_prices, book.bid_cumulative, book.bids_at_or_above(sell_above), sell_room, -1)
+        orders.add(math.ceil(sell_above), -(sell_room - sold), PRIORITY_MAKE, "convert")
+        positions[2] -= sell_room
+
+        buy_room = max(min(limit - max(remaining, 0), positions[1]), 0)
+        buy_below = export_value - edge
+        bought = self.take(orders, book.ask_prices, book.ask_cumulative, book.asks_at_or_below(buy_below), buy_room, 1)
+        orders.add(math.floor(buy_below), buy_room - bought, PRIORITY_MAKE, "convert")
+        positions[1] -= buy_room
+
+        logger.print(name, "import:", import_cost, "export:", export_value, "conversions:", engine.requests.get(name, 0), priority=LOG_DEBUG)
+
+    # take the first levels up to volume, returns what was taken
+    @staticmethod
+    def take(orders: "OrderIntents", prices: list[int], cumulative: list[int], levels: int, volume: int, direction: int) -> int:
+        volume = min(cumulative[levels - 1], volume) if levels else 0
+        if volume <= 0:
+            return 0
+        orders.add(prices[bisect_left(cumulative, volume, 0, levels)], direction * volume, PRIORITY_TAKE, "convert")
+        return volume
+
+
+STRATEGIES: dict[str, type[Strategy]] = {
+    strategy.name: strategy
+    for strategy in (MarketMakingStrategy, FixedFairValueStrategy, MeanReversionStrategy, EmaMarketMakingStrategy, BasketArbitrageStrategy, ConversionArbitrageStrategy)
+}
 
-                # self.handle_liquidation(product.name, positions, orders, lq_price)
 
-            # ========================================================================
-            # IN REFOREST RAINS
-            # ========================================================================
-            elif product.name == "RAINFOREST_RESIN":
-                mm_price = 10000
-                lq_price = 10000
-                
-                self.buy_mm(product, positions, orders, sell_orders, mm_price - product.params["mm_epsilon"])
-                self.sell_mm(product, positions, orders, buy_orders, mm_price + product.params["mm_epsilon"])
+class Trader:
 
-                logger.print("resin:", positions)
+    def __init__(self, profile_every: int = PROFILE_TICKS):
+        self.products = [Product(product_name) for product_name in PRODUCT_PARAMS.keys()]
+        # resolved once, run only calls straight through this table
+        self.strategies: dict[Symbol, Strategy] = {}
+        for product in self.products:
+            strategy = STRATEGIES[product.params["strategy"]](self, product)
+            product.book_views = strategy.book_views
+            product.set_indicators(strategy.indicators)
+            self.strategies[product.name] = strategy
+        self.dispatch = sorted(self.strategies.values(), key=lambda strategy: strategy.stage)
+        # per tick views shared by cross product strategies
+        self.books: dict[Symbol, OrderBook] = {}
+        self.positions: dict[Symbol, list] = {}
+        self.orders: dict[Symbol, OrderIntents] = {}
+        # tags of the orders run returned, keyed by symbol and then order index
+        self.order_tags: dict[Symbol, list[str]] = {}
+        # book units already claimed this tick, per (product, side)
+        self.legs_taken: dict[tuple[Symbol, int], int] = {}
+        self.conversion_engine = ConversionEngine([strategy.product for strategy in self.strategies.values() if isinstance(strategy, ConversionArbitrageStrategy)])
+        # who has been trading what, for strategies that want to follow or avoid informed bots.
+        # rebuilt from scratch after a cold start, traderData only carries the product state
+        self.counterparties = CounterpartyIndex()
+        self.codec = StateCodec()
+        # a fresh instance picks its state back up from the first traderData it is handed
+        self.restored = False
+
+        self.profiler = Profiler(profile_every)
+        if self.profiler.enabled:
+            self.buy_mm = self.profiler.wrap("buy_mm", self.buy_mm)
+            self.sell_mm = self.profiler.wrap("sell_mm", self.sell_mm)
+            self.handle_liquidation = self.profiler.wrap("handle_liquidation", self.handle_liquidation)
+            for product in self.products:
+                product.product_header = self.profiler.wrap("product_header", product.product_header)
 
-                self.handle_liquidation(product, positions, orders, buy_orders, sell_orders, lq_price)
-                logger.print("post lq resin:", positions)
+    # handle ask tradings, we buy, looking for sell orders, ask
+    def buy_mm(self, product: Product, positions: list, intents: "OrderIntents", book: OrderBook, price: float) -> None:
+        # take every level cheaper than price, the last one only as far as our long capacity goes
+        levels = book.asks_below(price)
+        volume = min(book.ask_cumulative[levels - 1], positions[1]) if levels else 0
+        if volume <= 0:
+            return
+        worst_level = bisect_left(book.ask_cumulative, volume, 0, levels)
+        intents.add(book.ask_prices[worst_level], volume, PRIORITY_TAKE, "take")
+        positions[1] -= volume
 
-                # make these position dynamic
-                orders.append(Order(product.name, round(mm_price - product.params["makemm_epsilon"]), positions[1]))
-                orders.append(Order(product.name, round(mm_price + product.params["makemm_epsilon"]), -positions[2]))
+    # handle bid tradings, we sell, bid volumes are positive
+    def sell_mm(self, product: Product, positions: list, intents: "OrderIntents", book: OrderBook, price: float) -> None:
+        levels = book.bids_above(price)
+        volume = min(book.bid_cumulative[levels - 1], positions[2]) if levels else 0
+        if volume <= 0:
+            return
+        worst_level = bisect_left(book.bid_cumulative, volume, 0, levels)
+        intents.add(book.bid_prices[worst_level], -volume, PRIORITY_TAKE, "take")
+        positions[2] -= volume
 
-            # ========================================================================
-            # SQUID INK
-            # ========================================================================
-            elif product.name == "SQUID_INK":
-                logger.print(product.name, "ema:", product.exponential_moving_average)
-                logger.print(product.name, "pa:", product.popular_average)
+    # reliquidates us to be happy and to make more profit YAY
+    # trades back towards liquidation_threshold at fair price, against whatever the book offers there
+    def handle_liquidation(self, product: Product, positions: list, intents: "OrderIntents", book: OrderBook, fair_price: float) -> None:
+        threshold = product.params["liquidation_threshold"]
+        limit = product.params["position_limit"]
+        # position once everything already asked for this tick fills
+        updated_position = positions[0] + (limit - positions[0] - positions[1]) - (limit + positions[0] - positions[2])
+        fair_price = round(fair_price)
 
-                if product.popular_average < product.exponential_moving_average - product.params["mr_epsilon"]:
-                    self.buy_mm(product, positions, orders, sell_orders, product.exponential_moving_average - 2 * product.params["mr_epsilon"])
+        # buying, we are short
+        if updated_position < -threshold:
+            volume = min(book.ask_volume_through(fair_price), -updated_position - threshold, positions[1])
+            if volume > 0:
+                intents.add(fair_price, volume, PRIORITY_LIQUIDATE, "liquidate")
+                positions[1] -= volume
+
+        # selling, we are long
+        elif updated_position > threshold:
+            volume = min(book.bid_volume_through(fair_price), updated_position - threshold, positions[2])
+            if volume > 0:
+                intents.add(fair_price, -volume, PRIORITY_LIQUIDATE, "liquidate")
+                positions[2] -= volume
+
+    def restore_state(self, trader_data: str) -> None:
+        self.restored = True
+        if not trader_data:
+            return
+        try:
+            states = self.codec.decode(trader_data)
+        except (ValueError, struct.error):
+            logger.print("bad traderData, starting fresh", priority=LOG_ERROR)
+            return
+        if len(states) != len(self.products):
+            return
+        for product, (scalars, series) in zip(self.products, states):
+            product.load_state(scalars, series)
+
+    def save_state(self) -> str:
+        states = [product.save_state() for product in self.products]
+        trader_data = self.codec.encode(states)
+        # over budget: keep halving the history, the scalars alone are tiny
+        while len(trader_data) > TRADER_DATA_LIMIT and any(series for _, product_series in states for series in product_series):
+            states = [(scalars, [series[len(series) // 2:] for series in product_series]) for scalars, product_series in states]
+            trader_data = self.codec.encode(states)
+        return trader_data
 
-                elif product.popular_average > product.exponential_moving_average + product.params["mr_epsilon"]:
-                    self.sell_mm(product, positions, orders, buy_orders, product.exponential_moving_average + 2 * product.params["mr_epsilon"])
+    def run(self, state: TradingState) -> tuple[dict[Symbol, list[Order]], int, str]:
 
-                else:
-                    self.handle_liquidation(product, positions, orders, buy_orders, sell_orders, lq_price)
+        run_started = self.profiler.start()
+        if not self.restored:
+            self.restore_state(state.traderData)
 
-                # buy
-                # orders.append(Order(product.name, mm_price - mm_epsilon, positions[1]))
-                # orders.append(Order(product.name, mm_price + mm_epsilon, -positions[2]))
+        result: dict[str, list[Order]] = {}
 
-                # self.handle_liquidation(product.name, positions, orders, lq_price)
+        # every book and indicator first, cross product strategies read the fair values of their legs
+        headers: dict[Symbol, tuple[OrderBook, int]] = {}
+        for product in self.products:
+            if product.name not in state.order_depths.keys():
+                logger.print(product.name, "broken", priority=LOG_ERROR)
+                continue
+            headers[product.name] = product.product_header(state)
 
-            # ========================================================================
-            # ELSE
-            # ========================================================================
-            else:
-                logger.print(product, "ema:", product.exponential_moving_average)
-                logger.print(product, "pa:", product.popular_average)
-                mm_price = product.exponential_moving_average
-                lq_price = mm_price
-
-                self.buy_mm(product, positions, orders, sell_orders, mm_price - product.params["mm_epsilon"])
-                self.sell_mm(product, positions, orders, buy_orders, mm_price + product.params["mm_epsilon"])
-
-            # ========================================================================
-            # UNIVERSAL
-            # ========================================================================
-            
-            # simplify and update our orders
-            return_orders = {}
-            for order in orders:
-                return_orders[order.price] = 0
-            for order in orders:
-                return_orders[order.price] += order.quantity
-            orders = []
-            for price, amount in return_orders.items():
-                if amount != 0:
-                    orders.append(Order(product.name, price, amount))
-            result[product.name] = orders
+        indicators_started = self.profiler.start()
+        for product in self.products:
+            if product.name in headers:
+                product.update_fair_values(headers[product.name][0])
+        self.conversion_engine.update(state.observations)
+        mids = {name: (book.best_bid + book.best_ask) / 2 for name, (book, _) in headers.items() if book.best_bid is not None and book.best_ask is not None}
+        self.counterparties.update(state.market_trades, state.own_trades, mids)
+        self.profiler.stop("indicators", indicators_started)
+
+        self.books = {name: book for name, (book, _) in headers.items()}
+        self.positions = {}
+        self.orders = {}
+        self.legs_taken = {}
+        for name, (book, position) in headers.items():
+            limit = PRODUCT_PARAMS[name]['position_limit']
+            # position, long capacity left, short capacity left
+            self.positions[name] = [position, limit - position, limit + position]
+            self.orders[name] = OrderIntents(name)
+            logger.print(name, "positions:", self.positions[name], priority=LOG_DEBUG)
+
+        for strategy in self.dispatch:
+            name = strategy.product.name
+            if name not in headers:
+                continue
+            strategy_started = self.profiler.start()
+            strategy.run(self.books[name], self.positions[name], self.orders[name])
+            self.profiler.stop(strategy.name, strategy_started)
+
+        # net every product's intents and fit them inside its limit
+        allocate_started = self.profiler.start()
+        self.order_tags = {}
+        for name, (_, position) in headers.items():
+            result[name] = self.orders[name].allocate(position, PRODUCT_PARAMS[name]["position_limit"])
+            self.order_tags[name] = self.orders[name].tags
+        self.profiler.stop("allocate", allocate_started)
+        conversions = self.conversion_engine.total()
 
         # ========================================================================
         # ENDING
         # ========================================================================
 
+        trader_data = self.save_state()
+
+        self.profiler.stop("run", run_started)
+        self.profiler.tick()
+
+        flush_started = self.profiler.start()
+        logger.print_order_tags(self.order_tags)
         logger.flush(state, result, conversions, trader_data)
+        self.profiler.stop("flush", flush_started)
         return result, conversions, trader_data
 
 